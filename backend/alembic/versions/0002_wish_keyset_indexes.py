@@ -0,0 +1,34 @@
+"""Composite indexes for keyset pagination of wishes
+
+Revision ID: 0002_wish_keyset_indexes
+Revises: 0001_initial
+Create Date: 2026-10-17
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0002_wish_keyset_indexes"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "ix_wishes_wishlist_created_at_id": ["wishlist_id", "created_at", "id"],
+    "ix_wishes_wishlist_updated_at_id": ["wishlist_id", "updated_at", "id"],
+    "ix_wishes_wishlist_priority_id": ["wishlist_id", "priority", "id"],
+    "ix_wishes_wishlist_price_id": ["wishlist_id", "price", "id"],
+    "ix_wishes_wishlist_position_id": ["wishlist_id", "position", "id"],
+}
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES.items():
+        op.create_index(name, "wishes", columns)
+
+
+def downgrade() -> None:
+    for name in INDEXES:
+        op.drop_index(name, table_name="wishes")
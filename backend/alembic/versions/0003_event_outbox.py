@@ -0,0 +1,46 @@
+"""Outbox bookkeeping columns on events
+
+Revision ID: 0003_event_outbox
+Revises: 0002_wish_keyset_indexes
+Create Date: 2026-10-17
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0003_event_outbox"
+down_revision = "0002_wish_keyset_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "events", sa.Column("dispatched_at", sa.DateTime(timezone=True), nullable=True)
+    )
+    op.add_column(
+        "events", sa.Column("processed_at", sa.DateTime(timezone=True), nullable=True)
+    )
+    # Events written before the relay existed were already expanded in-process.
+    op.execute(
+        sa.text(
+            "UPDATE events SET dispatched_at = updated_at, processed_at = updated_at"
+        )
+    )
+    op.create_index(op.f("ix_events_dispatched_at"), "events", ["dispatched_at"])
+    op.create_index(
+        "ix_events_pending",
+        "events",
+        ["id"],
+        postgresql_where=sa.text("dispatched_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_events_pending", table_name="events")
+    op.drop_index(op.f("ix_events_dispatched_at"), table_name="events")
+    op.drop_column("events", "processed_at")
+    op.drop_column("events", "dispatched_at")
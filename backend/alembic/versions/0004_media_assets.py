@@ -0,0 +1,58 @@
+"""Media assets with processed image variants
+
+Revision ID: 0004_media_assets
+Revises: 0003_event_outbox
+Create Date: 2026-10-17
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0004_media_assets"
+down_revision = "0003_event_outbox"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "media_assets",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("url", sa.String(length=512), nullable=False),
+        sa.Column("owner_id", sa.Integer(), nullable=True),
+        sa.Column("width", sa.Integer(), nullable=True),
+        sa.Column("height", sa.Integer(), nullable=True),
+        sa.Column(
+            "variants",
+            postgresql.JSONB(astext_type=sa.Text()),
+            nullable=False,
+            server_default="{}",
+        ),
+        sa.Column("processed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("timezone('utc', now())"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("timezone('utc', now())"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_media_assets_id"), "media_assets", ["id"])
+    op.create_index(op.f("ix_media_assets_url"), "media_assets", ["url"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_media_assets_url"), table_name="media_assets")
+    op.drop_index(op.f("ix_media_assets_id"), table_name="media_assets")
+    op.drop_table("media_assets")
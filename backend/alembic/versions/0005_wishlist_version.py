@@ -0,0 +1,28 @@
+"""Wishlist version counter for HTTP validators
+
+Revision ID: 0005_wishlist_version
+Revises: 0004_media_assets
+Create Date: 2026-10-17
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0005_wishlist_version"
+down_revision = "0004_media_assets"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "wishlists",
+        sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("wishlists", "version")
@@ -0,0 +1,43 @@
+"""Expression indexes for case-insensitive username lookups
+
+Revision ID: 0006_username_lower_indexes
+Revises: 0005_wishlist_version
+Create Date: 2026-10-17
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0006_username_lower_indexes"
+down_revision = "0005_wishlist_version"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "ix_users_tg_username_lower": "lower(tg_username)",
+    "ix_users_custom_username_lower": "lower(custom_username)",
+}
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps the users table writable while the indexes build.
+    with op.get_context().autocommit_block():
+        for name, expression in INDEXES.items():
+            op.create_index(
+                name,
+                "users",
+                [sa.text(expression)],
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.drop_index(
+                name, table_name="users", postgresql_concurrently=True, if_exists=True
+            )
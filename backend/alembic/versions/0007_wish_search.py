@@ -0,0 +1,49 @@
+"""Full-text and trigram search on wishes
+
+Revision ID: 0007_wish_search
+Revises: 0006_username_lower_indexes
+Create Date: 2026-10-17
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0007_wish_search"
+down_revision = "0006_username_lower_indexes"
+branch_labels = None
+depends_on = None
+
+# Titles outrank descriptions; both are stemmed as Russian and as English.
+SEARCH_VECTOR = """
+    setweight(to_tsvector('russian', coalesce(title, '')), 'A')
+    || setweight(to_tsvector('english', coalesce(title, '')), 'A')
+    || setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+    || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+"""
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Rewrites the table once to fill the stored column.
+    op.execute(
+        "ALTER TABLE wishes ADD COLUMN search_vector tsvector "
+        f"GENERATED ALWAYS AS ({SEARCH_VECTOR}) STORED"
+    )
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_wishes_search_vector "
+            "ON wishes USING gin (search_vector)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_wishes_title_trgm "
+            "ON wishes USING gin (title gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_wishes_title_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_wishes_search_vector")
+    op.execute("ALTER TABLE wishes DROP COLUMN search_vector")
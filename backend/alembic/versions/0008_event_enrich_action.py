@@ -0,0 +1,25 @@
+"""Enrich action for outbox events
+
+Revision ID: 0008_event_enrich_action
+Revises: 0007_wish_search
+Create Date: 2026-10-17
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0008_event_enrich_action"
+down_revision = "0007_wish_search"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TYPE event_action ADD VALUE IF NOT EXISTS 'enrich'")
+
+
+def downgrade() -> None:
+    # Postgres can't drop an enum value; only the rows using it go.
+    op.execute("DELETE FROM events WHERE action = 'enrich'")
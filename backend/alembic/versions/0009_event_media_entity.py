@@ -0,0 +1,25 @@
+"""Media entity for outbox events
+
+Revision ID: 0009_event_media_entity
+Revises: 0008_event_enrich_action
+Create Date: 2026-10-17
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0009_event_media_entity"
+down_revision = "0008_event_enrich_action"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TYPE event_entity ADD VALUE IF NOT EXISTS 'media'")
+
+
+def downgrade() -> None:
+    # Postgres can't drop an enum value; only the rows using it go.
+    op.execute("DELETE FROM events WHERE entity = 'media'")
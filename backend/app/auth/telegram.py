@@ -4,13 +4,16 @@ import hashlib
 import hmac
 import json
 from dataclasses import dataclass
-from datetime import datetime, timezone
-from typing import Any, Dict
+from datetime import UTC, datetime
+from typing import Any
 from urllib.parse import parse_qsl
 
 from fastapi import HTTPException, status
 
 from app.config import settings
+from app.utils.ttl_cache import TTLCache
+
+MAX_AUTH_AGE_SECONDS = 24 * 3600
 
 
 @dataclass(slots=True)
@@ -27,7 +30,7 @@ class TelegramUserPayload:
 class TelegramAuthResult:
     user: TelegramUserPayload
     auth_date: datetime
-    raw: Dict[str, Any]
+    raw: dict[str, Any]
 
 
 class TelegramAuthError(HTTPException):
@@ -35,22 +38,50 @@ class TelegramAuthError(HTTPException):
         super().__init__(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail)
 
 
-def _build_data_check_string(data: Dict[str, str]) -> str:
+def _build_data_check_string(data: dict[str, str]) -> str:
     return "\n".join(f"{k}={v}" for k, v in sorted(data.items()))
 
 
-def _secret_key() -> bytes:
+def _derive_secret_key(bot_token: str) -> bytes:
     return hmac.new(
-        key="WebAppData".encode(),
-        msg=settings.bot_token.encode(),
+        key=b"WebAppData",
+        msg=bot_token.encode(),
         digestmod=hashlib.sha256,
     ).digest()
 
 
+# The bot token never changes while the process runs, so neither does the derived key.
+_SECRET_KEY = _derive_secret_key(settings.bot_token)
+
+# Mini-app reopen storms resend the same initData; remember what already verified.
+_verified: TTLCache[bytes, TelegramAuthResult] = TTLCache(
+    maxsize=settings.telegram_replay_cache_size,
+    ttl=settings.telegram_replay_ttl_seconds,
+)
+
+
+def _check_auth_date(auth_date: datetime) -> None:
+    now = datetime.now(UTC)
+    if abs((now - auth_date).total_seconds()) > MAX_AUTH_AGE_SECONDS:
+        raise TelegramAuthError("Auth date too old")
+
+
 def validate_telegram_init_data(init_data: str) -> TelegramAuthResult:
     if not init_data:
         raise TelegramAuthError("Missing initData")
 
+    cache_key = hashlib.sha256(init_data.encode()).digest()
+    cached = _verified.get(cache_key)
+    if cached is not None:
+        _check_auth_date(cached.auth_date)
+        return cached
+
+    result = _verify(init_data)
+    _verified.set(cache_key, result)
+    return result
+
+
+def _verify(init_data: str) -> TelegramAuthResult:
     parsed = dict(parse_qsl(init_data, keep_blank_values=True))
     if "hash" not in parsed:
         raise TelegramAuthError("Missing hash field")
@@ -58,8 +89,9 @@ def validate_telegram_init_data(init_data: str) -> TelegramAuthResult:
     received_hash = parsed.pop("hash")
 
     data_check_string = _build_data_check_string(parsed)
-    secret_key = _secret_key()
-    calculated_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    calculated_hash = hmac.new(
+        _SECRET_KEY, data_check_string.encode(), hashlib.sha256
+    ).hexdigest()
 
     if not hmac.compare_digest(calculated_hash, received_hash):
         raise TelegramAuthError("Hash mismatch")
@@ -89,9 +121,7 @@ def validate_telegram_init_data(init_data: str) -> TelegramAuthResult:
     if not auth_date_raw:
         raise TelegramAuthError("Missing auth date")
 
-    auth_date = datetime.fromtimestamp(int(auth_date_raw), tz=timezone.utc)
-    now = datetime.now(timezone.utc)
-    if abs((now - auth_date).total_seconds()) > 24 * 3600:
-        raise TelegramAuthError("Auth date too old")
+    auth_date = datetime.fromtimestamp(int(auth_date_raw), tz=UTC)
+    _check_auth_date(auth_date)
 
     return TelegramAuthResult(user=tg_user, auth_date=auth_date, raw=parsed)
@@ -20,15 +20,45 @@ class Settings(BaseSettings):
     secret_key: str
     csrf_secret: str
     bot_token: str
+    # Sent as X-Operator-Token to read /debug stats in production; unset locks them.
+    operator_token: str | None = None
     telegram_bot_name: str = "wishlist_bot"
+    telegram_api_base: str = "https://api.telegram.org"
+    # Messages per second for the whole bot, shared by all senders through Redis.
+    telegram_global_rate: float = 25.0
+    telegram_per_chat_interval: float = 1.0
+    telegram_max_connections: int = 10
+    telegram_send_concurrency: int = 4
+    telegram_max_retries: int = 3
+    telegram_replay_ttl_seconds: float = 60.0
+    telegram_replay_cache_size: int = 10_000
 
     postgres_host: str = "db"
     postgres_port: int = 5432
     postgres_db: str = "wishlist"
     postgres_user: str = "wishlist"
     postgres_password: str = "wishlist"
+    # Per process: size these against uvicorn workers x Celery concurrency.
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 10.0
+    db_pool_recycle_seconds: int = 1800
+    db_connect_timeout_seconds: int = 5
+    # Connecting through PgBouncer in transaction pooling mode.
+    db_pgbouncer: bool = False
+    # Streaming replica for read-only endpoints; unset means all reads use the primary.
+    postgres_replica_host: str | None = None
+    postgres_replica_port: int | None = None
+    replica_max_lag_seconds: float = 2.0
+    replica_lag_check_interval_seconds: float = 1.0
+    read_your_writes_seconds: int = 5
 
     redis_url: str = "redis://redis:6379/0"
+    redis_max_connections: int = 50
+    redis_pool_timeout_seconds: float = 5.0
+    redis_socket_timeout_seconds: float = 5.0
+    redis_socket_connect_timeout_seconds: float = 2.0
+    redis_health_check_interval_seconds: int = 30
 
     backend_url: AnyHttpUrl = "http://localhost/api"
     frontend_url: AnyHttpUrl = "http://localhost:5173"
@@ -36,13 +66,60 @@ class Settings(BaseSettings):
     allowed_origins_raw: str = "http://localhost:5173"
 
     notify_batch_seconds: int = 30
+    notify_flush_interval_seconds: int = 10
+    notify_digest_max_items: int = 20
+    notify_chunk_size: int = 500
+
+    outbox_batch_size: int = 500
+    outbox_poll_interval_seconds: float = 0.5
+    outbox_stats_interval_seconds: float = 60.0
+    outbox_retry_seconds: int = 10
+
+    feed_timeline_size: int = 500
+    feed_timeline_ttl_seconds: int = 7 * 24 * 3600
+
+    link_preview_timeout_seconds: float = 15.0
+    link_preview_max_connections: int = 50
+    link_preview_cache_ttl_seconds: int = 24 * 3600
+    link_preview_negative_ttl_seconds: int = 300
+    link_preview_max_bytes: int = 512 * 1024
+    link_preview_domain_concurrency: int = 2
+    link_preview_busy_retry_seconds: int = 5
+
+    user_cache_ttl_seconds: int = 300
+    user_cache_local_ttl_seconds: float = 5.0
+    user_cache_local_size: int = 10_000
+
+    # How long shared caches (nginx) may serve public pages without revalidating.
+    public_cache_seconds: int = 5
+    # Rendered public wishlist pages in Redis; concurrent misses wait for one rebuild.
+    wishlist_cache_ttl_seconds: int = 600
+    wishlist_cache_lock_seconds: float = 5.0
+    wishlist_cache_lock_wait_seconds: float = 1.0
 
     session_cookie_name: str = "wishlist_session"
     csrf_cookie_name: str = "wishlist_csrf"
     csrf_header_name: str = "X-CSRF-Token"
+    primary_cookie_name: str = "wishlist_primary_until"
     media_root: str = "/app/media"
     media_base_url: str = "/media"
     media_max_mb: int = 5
+    media_max_pixels: int = 40_000_000
+    media_webp_quality: int = 80
+    media_gc_interval_seconds: int = 6 * 3600
+    media_gc_grace_seconds: int = 24 * 3600
+    media_storage: str = "local"  # "local" or "s3"
+    s3_bucket: str = "wishlist-media"
+    s3_endpoint_url: str | None = None
+    s3_region: str = "us-east-1"
+    s3_access_key: str | None = None
+    s3_secret_key: str | None = None
+    # Namespace for our objects in the bucket; garbage collection never looks outside
+    # it, so it must not be empty.
+    s3_key_prefix: str = "media/"
+    s3_public_base_url: str | None = None
+    s3_presign_expires_seconds: int = 900
+    s3_max_connections: int = 20
 
     @property
     def database_url(self) -> str:
@@ -51,9 +128,23 @@ class Settings(BaseSettings):
             f"{self.postgres_password}@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
         )
 
+    @property
+    def replica_database_url(self) -> str | None:
+        if not self.postgres_replica_host:
+            return None
+        port = self.postgres_replica_port or self.postgres_port
+        return (
+            f"postgresql+psycopg://{self.postgres_user}:{self.postgres_password}@"
+            f"{self.postgres_replica_host}:{port}/{self.postgres_db}"
+        )
+
     @property
     def allowed_origins(self) -> list[str]:
-        return [origin.strip() for origin in self.allowed_origins_raw.split(",") if origin.strip()]
+        return [
+            origin.strip()
+            for origin in self.allowed_origins_raw.split(",")
+            if origin.strip()
+        ]
 
     @property
     def is_prod(self) -> bool:
@@ -65,4 +156,4 @@ def get_settings() -> Settings:
     return Settings()  # type: ignore[arg-type]
 
 
-settings = get_settings()
+settings = get_settings()
@@ -1,24 +1,227 @@
 from __future__ import annotations
 
+import time
+from collections.abc import AsyncGenerator, Generator
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any
 
-from sqlalchemy import create_engine
+from fastapi import Request
+from loguru import logger
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from .config import settings
 from .models.base import Base
+from .utils.pool_metrics import PoolMetrics
+from .utils.read_routing import pinned_to_primary
+
+
+class _InstrumentedPoolMixin:
+    """Times every checkout, including waits for a free slot and new connects."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.metrics = PoolMetrics()
+        super().__init__(*args, **kwargs)
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()  # type: ignore[misc]
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.metrics.record(started, timed_out)
+
+    def usage(self) -> dict[str, float]:
+        pool: QueuePool = self  # type: ignore[assignment]
+        return {
+            "size": float(pool.size()),
+            "checked_out": float(pool.checkedout()),
+            "idle": float(pool.checkedin()),
+            "overflow": float(max(pool.overflow(), 0)),
+            **self.metrics.as_dict(),
+        }
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options() -> dict[str, Any]:
+    """Pool settings shared by the sync and async engines.
+
+    Instead of a pre-ping round trip on every checkout, connections are
+    recycled before server/proxy idle timeouts and dead peers are found by
+    TCP keepalives; a connection that still fails is invalidated on error.
+    """
+    connect_args: dict[str, Any] = {
+        "connect_timeout": settings.db_connect_timeout_seconds,
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 3,
+    }
+    if settings.db_pgbouncer:
+        # Transaction pooling hands each transaction a different server
+        # connection, so server-side prepared statements cannot be reused.
+        connect_args["prepare_threshold"] = None
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_pre_ping": False,
+        "connect_args": connect_args,
+    }
+
 
 engine = create_engine(
     settings.database_url,
-    pool_pre_ping=True,
+    poolclass=InstrumentedQueuePool,
     future=True,
+    **engine_options(),
 )
 
 SessionLocal = scoped_session(
     sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
 )
 
+# Async stack for the hot API routes; psycopg 3 serves both engines from the
+# same URL. Celery tasks and the remaining routes keep the sync engine.
+async_engine = create_async_engine(
+    settings.database_url,
+    poolclass=InstrumentedAsyncQueuePool,
+    **engine_options(),
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+# Read-only endpoints go to the replica when one is configured (see get_read_db).
+if settings.replica_database_url:
+    replica_engine = create_engine(
+        settings.replica_database_url,
+        poolclass=InstrumentedQueuePool,
+        future=True,
+        **engine_options(),
+    )
+    replica_async_engine = create_async_engine(
+        settings.replica_database_url,
+        poolclass=InstrumentedAsyncQueuePool,
+        **engine_options(),
+    )
+else:
+    replica_engine, replica_async_engine = engine, async_engine
+
+ReplicaSessionLocal = scoped_session(
+    sessionmaker(
+        bind=replica_engine, autoflush=False, autocommit=False, expire_on_commit=False
+    )
+)
+AsyncReplicaSessionLocal = async_sessionmaker(
+    bind=replica_async_engine, autoflush=False, expire_on_commit=False
+)
+
+# Zero when the replica has replayed everything it received, else the age of
+# the last replayed transaction: an idle primary does not look like lag.
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class _ReplicaLag:
+    """Last measured replica lag, refreshed at most once per check interval."""
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+        self.checked_at = float("-inf")
+
+    def due(self) -> bool:
+        return (
+            time.monotonic() - self.checked_at
+            >= settings.replica_lag_check_interval_seconds
+        )
+
+    def record(self, seconds: float) -> None:
+        self.seconds = seconds
+        self.checked_at = time.monotonic()
+
+    def acceptable(self) -> bool:
+        return self.seconds <= settings.replica_max_lag_seconds
+
+
+_replica_lag = _ReplicaLag()
+
+
+def replica_lag_seconds() -> float:
+    if replica_engine.dialect.name != "postgresql":
+        return 0.0
+    with replica_engine.connect() as connection:
+        return float(connection.scalar(REPLICA_LAG_SQL) or 0.0)
+
+
+async def replica_lag_seconds_async() -> float:
+    if replica_async_engine.dialect.name != "postgresql":
+        return 0.0
+    async with replica_async_engine.connect() as connection:
+        return float(await connection.scalar(REPLICA_LAG_SQL) or 0.0)
+
+
+def _lag_probe_failed(error: Exception) -> None:
+    logger.warning("Replica lag check failed, reading from the primary: {}", error)
+    _replica_lag.record(float("inf"))
+
+
+def _replica_wanted(request: Request) -> bool:
+    return settings.replica_database_url is not None and not pinned_to_primary(request)
+
+
+def use_replica(request: Request) -> bool:
+    """Route this read to the replica: configured, caught up, no recent client write."""
+    if not _replica_wanted(request):
+        return False
+    if _replica_lag.due():
+        try:
+            _replica_lag.record(replica_lag_seconds())
+        except exc.SQLAlchemyError as error:
+            _lag_probe_failed(error)
+    return _replica_lag.acceptable()
+
+
+async def use_replica_async(request: Request) -> bool:
+    if not _replica_wanted(request):
+        return False
+    if _replica_lag.due():
+        try:
+            _replica_lag.record(await replica_lag_seconds_async())
+        except exc.SQLAlchemyError as error:
+            _lag_probe_failed(error)
+    return _replica_lag.acceptable()
+
+
+def pool_stats() -> dict[str, dict[str, float]]:
+    """Connection usage and checkout waits of this process's engines."""
+    stats: dict[str, dict[str, float]] = {}
+    engines = {"sync": engine, "async": async_engine.sync_engine}
+    if replica_engine is not engine:
+        engines.update(
+            replica=replica_engine, replica_async=replica_async_engine.sync_engine
+        )
+    for name, target in engines.items():
+        if isinstance(target.pool, _InstrumentedPoolMixin):
+            stats[name] = target.pool.usage()
+    return stats
+
 
 def init_db() -> None:
     Base.metadata.create_all(bind=engine)
@@ -32,6 +235,30 @@ def get_db() -> Generator:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_read_db(request: Request) -> Generator:
+    """Session for read-only endpoints: the replica when safe, else the primary."""
+    db = ReplicaSessionLocal() if use_replica(request) else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    factory = (
+        AsyncReplicaSessionLocal
+        if await use_replica_async(request)
+        else AsyncSessionLocal
+    )
+    async with factory() as db:
+        yield db
+
+
 @contextmanager
 def session_scope() -> Generator:
     session = SessionLocal()
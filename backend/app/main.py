@@ -1,15 +1,32 @@
 from __future__ import annotations
 
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 
 from app.config import settings
 from app.routers import api_router
+from app.services import link_preview
+from app.utils.body_limit import BodySizeLimitMiddleware
+from app.utils.read_routing import ReadYourWritesMiddleware
+from app.utils.redis import close_async_redis
+from app.utils.static import ImmutableStaticFiles
 
-app = FastAPI(title="Wishlist API", version="0.1.0")
+# Room for the multipart boundaries and part headers around the file itself.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    yield
+    await link_preview.close_client()
+    await close_async_redis()
+
+
+app = FastAPI(title="Wishlist API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,15 +36,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(api_router)
+app.add_middleware(ReadYourWritesMiddleware)
 
-Path(settings.media_root).mkdir(parents=True, exist_ok=True)
-app.mount(
-    settings.media_base_url,
-    StaticFiles(directory=settings.media_root, check_dir=True),
-    name="media",
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=settings.media_max_mb * 1024 * 1024 + MULTIPART_OVERHEAD_BYTES,
+    paths=("/api/media/upload",),
 )
 
+app.include_router(api_router)
+
+if settings.media_storage == "local":
+    # Other backends serve media from the bucket or its CDN, not from this process.
+    Path(settings.media_root).mkdir(parents=True, exist_ok=True)
+    app.mount(
+        settings.media_base_url,
+        ImmutableStaticFiles(directory=settings.media_root, check_dir=True),
+        name="media",
+    )
+
 
 @app.get("/healthz", tags=["health"])
 def healthcheck() -> dict[str, str]:
@@ -1,5 +1,6 @@
 from .base import Base
 from .event import Event, EventAction, EventEntity
+from .media import MediaAsset
 from .notification import Notification
 from .subscription import Subscription
 from .user import User
@@ -11,6 +12,7 @@ __all__ = [
     "Event",
     "EventAction",
     "EventEntity",
+    "MediaAsset",
     "Notification",
     "Subscription",
     "User",
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
+from datetime import datetime
 from enum import Enum
 
-from sqlalchemy import Enum as SAEnum, ForeignKey, Integer
+from sqlalchemy import DateTime, Enum as SAEnum, ForeignKey, Index, Integer, text
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.types import JSON
 
 from .base import Base, IDMixin, TimestampMixin
@@ -14,21 +15,53 @@ class EventAction(str, Enum):
     CREATE = "create"
     UPDATE = "update"
     DELETE = "delete"
+    # Not a change to fan out: asks for the wish's link preview to be fetched.
+    ENRICH = "enrich"
 
 
 class EventEntity(str, Enum):
     WISH = "wish"
+    # Uploaded media assets, created to have their variants rendered.
+    MEDIA = "media"
 
 
 class Event(Base, IDMixin, TimestampMixin):
     __tablename__ = "events"
+    __table_args__ = (
+        # Partial index over the outbox backlog the relay polls.
+        Index(
+            "ix_events_pending",
+            "id",
+            postgresql_where=text("dispatched_at IS NULL"),
+            sqlite_where=text("dispatched_at IS NULL"),
+        ),
+    )
 
-    actor_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    actor_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="SET NULL"), nullable=True
+    )
     entity: Mapped[EventEntity] = mapped_column(
-        SAEnum(EventEntity, name="event_entity", values_callable=lambda e: [i.value for i in e])
+        SAEnum(
+            EventEntity,
+            name="event_entity",
+            values_callable=lambda e: [i.value for i in e],
+        )
     )
     entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
     action: Mapped[EventAction] = mapped_column(
-        SAEnum(EventAction, name="event_action", values_callable=lambda e: [i.value for i in e])
+        SAEnum(
+            EventAction,
+            name="event_action",
+            values_callable=lambda e: [i.value for i in e],
+        )
+    )
+    diff: Mapped[dict | None] = mapped_column(
+        JSON().with_variant(JSONB(), "postgresql"), nullable=True
+    )
+    # Outbox bookkeeping: set by the relay once published, by the worker once applied.
+    dispatched_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True, index=True
+    )
+    processed_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
     )
-    diff: Mapped[dict | None] = mapped_column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
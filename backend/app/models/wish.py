@@ -1,25 +1,42 @@
 from __future__ import annotations
 
 from decimal import Decimal
-from typing import List, Optional
+from typing import TYPE_CHECKING
 
-from sqlalchemy import Enum, ForeignKey, Integer, Numeric, String, Text
+from sqlalchemy import Enum, ForeignKey, Index, Integer, Numeric, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base, IDMixin, TimestampMixin
 from .enums import WishPriority, WishStatus
+from .media import MediaAsset
 from .types import TagListType
 
+if TYPE_CHECKING:
+    from .wishlist import Wishlist
+
 
 class Wish(Base, IDMixin, TimestampMixin):
     __tablename__ = "wishes"
+    # Composite (sort key, id) indexes backing keyset pagination per wishlist.
+    __table_args__ = (
+        Index("ix_wishes_wishlist_created_at_id", "wishlist_id", "created_at", "id"),
+        Index("ix_wishes_wishlist_updated_at_id", "wishlist_id", "updated_at", "id"),
+        Index("ix_wishes_wishlist_priority_id", "wishlist_id", "priority", "id"),
+        Index("ix_wishes_wishlist_price_id", "wishlist_id", "price", "id"),
+        Index("ix_wishes_wishlist_position_id", "wishlist_id", "position", "id"),
+    )
+    # Postgres also has a generated ``search_vector`` column with GIN indexes
+    # (migration 0007); it is left unmapped so SQLite can create this table.
+    # See services.wish_search.
 
-    wishlist_id: Mapped[int] = mapped_column(ForeignKey("wishlists.id", ondelete="CASCADE"), index=True)
+    wishlist_id: Mapped[int] = mapped_column(
+        ForeignKey("wishlists.id", ondelete="CASCADE"), index=True
+    )
     title: Mapped[str] = mapped_column(String(255))
-    description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
-    url: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
-    price: Mapped[Optional[Decimal]] = mapped_column(Numeric(10, 2), nullable=True)
-    image_url: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
+    description: Mapped[str | None] = mapped_column(Text, nullable=True)
+    url: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    price: Mapped[Decimal | None] = mapped_column(Numeric(10, 2), nullable=True)
+    image_url: Mapped[str | None] = mapped_column(String(512), nullable=True)
     priority: Mapped[WishPriority] = mapped_column(
         Enum(
             WishPriority,
@@ -37,6 +54,18 @@ class Wish(Base, IDMixin, TimestampMixin):
         index=True,
     )
     position: Mapped[int] = mapped_column(Integer, default=0, index=True)
-    tags: Mapped[List[str]] = mapped_column(TagListType, default=list)
+    tags: Mapped[list[str]] = mapped_column(TagListType, default=list)
+
+    wishlist: Mapped[Wishlist] = relationship("Wishlist", back_populates="wishes")
+    # Uploaded images have a MediaAsset with resized variants; external URLs do not.
+    image_asset: Mapped[MediaAsset | None] = relationship(
+        MediaAsset,
+        primaryjoin="foreign(Wish.image_url) == MediaAsset.url",
+        viewonly=True,
+        uselist=False,
+        lazy="selectin",
+    )
 
-    wishlist: Mapped["Wishlist"] = relationship("Wishlist", back_populates="wishes")
+    @property
+    def image_variants(self) -> dict[str, str]:
+        return dict(self.image_asset.variants or {}) if self.image_asset else {}
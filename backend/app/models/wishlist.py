@@ -1,13 +1,17 @@
 from __future__ import annotations
 
-from typing import List
+from typing import TYPE_CHECKING
 
-from sqlalchemy import Enum, ForeignKey, String
+from sqlalchemy import Enum, ForeignKey, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base, IDMixin, TimestampMixin
 from .enums import WishlistVisibility
 
+if TYPE_CHECKING:
+    from .user import User
+    from .wish import Wish
+
 
 class Wishlist(Base, IDMixin, TimestampMixin):
     __tablename__ = "wishlists"
@@ -23,8 +27,15 @@ class Wishlist(Base, IDMixin, TimestampMixin):
         server_default=WishlistVisibility.PUBLIC.value,
     )
     cover_url: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    # Bumped by every write that changes the public detail; the ETag is built from it.
+    version: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=1, server_default="1"
+    )
 
-    owner: Mapped["User"] = relationship("User", back_populates="wishlists")
-    wishes: Mapped[List["Wish"]] = relationship(
-        "Wish", back_populates="wishlist", cascade="all, delete-orphan", order_by="Wish.position"
+    owner: Mapped[User] = relationship("User", back_populates="wishlists")
+    wishes: Mapped[list[Wish]] = relationship(
+        "Wish",
+        back_populates="wishlist",
+        cascade="all, delete-orphan",
+        order_by="Wish.position",
     )
@@ -0,0 +1,97 @@
+"""Outbox relay: publishes committed events to Celery.
+
+Run one or more instances with ``python -m app.relay``; batches are claimed
+with ``SELECT ... FOR UPDATE SKIP LOCKED`` so relays never publish the same
+event concurrently.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Sequence
+from typing import Any
+
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models.event import Event, EventAction, EventEntity
+from app.services import outbox
+from app.worker import (
+    celery_app,
+    enrich_wish_preview,
+    expand_wish_event,
+    process_media_asset,
+)
+
+# Changes are expanded from the event itself.
+EVENT_TASKS = {
+    EventEntity.WISH: expand_wish_event,
+}
+# Background work on the entity, which only needs its id.
+ACTION_TASKS = {
+    (EventEntity.WISH, EventAction.ENRICH): enrich_wish_preview,
+    (EventEntity.MEDIA, EventAction.CREATE): process_media_asset,
+}
+
+
+def task_for(event: Event) -> tuple[Any, tuple[int]] | None:
+    """The Celery task an event is published to, with its arguments."""
+    task = ACTION_TASKS.get((event.entity, event.action))
+    if task is not None:
+        return task, (event.entity_id,)
+    task = EVENT_TASKS.get(event.entity)
+    if task is not None:
+        return task, (event.id,)
+    return None
+
+
+def publish_events(events: Sequence[Event]) -> None:
+    # One producer connection for the whole batch instead of one per task.
+    with celery_app.producer_or_acquire() as producer:
+        for event in events:
+            routed = task_for(event)
+            if routed is not None:
+                task, args = routed
+                task.apply_async(args, producer=producer)
+
+
+def relay_once(batch_size: int | None = None) -> int:
+    session: Session = SessionLocal()
+    try:
+        return outbox.relay_batch(
+            session, publish_events, batch_size or settings.outbox_batch_size
+        )
+    finally:
+        session.close()
+
+
+def log_stats() -> None:
+    session: Session = SessionLocal()
+    try:
+        current = outbox.stats(session)
+    finally:
+        session.close()
+    logger.info(
+        "Outbox pending={pending:.0f} lag={lag_seconds:.1f}s "
+        "throughput={dispatched_per_second:.1f}/s",
+        **current,
+    )
+
+
+def run() -> None:
+    logger.info("Outbox relay started (batch={})", settings.outbox_batch_size)
+    next_stats_at = time.monotonic()
+    while True:
+        published = relay_once()
+        if time.monotonic() >= next_stats_at:
+            log_stats()
+            next_stats_at = time.monotonic() + settings.outbox_stats_interval_seconds
+        # A full batch means there is more backlog; poll again immediately.
+        if published < settings.outbox_batch_size:
+            time.sleep(settings.outbox_poll_interval_seconds)
+
+
+if __name__ == "__main__":
+    run()
@@ -1,24 +1,46 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, Response
-from sqlalchemy.exc import IntegrityError
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.auth.telegram import TelegramAuthError, validate_telegram_init_data
+from app.auth.telegram import (
+    TelegramAuthError,
+    TelegramUserPayload,
+    validate_telegram_init_data,
+)
 from app.config import settings
-from app.db import get_db
+from app.db import get_async_db
 from app.models.user import User
 from app.models.wishlist import Wishlist
 from app.schemas.auth import AuthRequest, AuthResponse
 from app.schemas.user import UserMe
+from app.services import user_cache, usernames
 from app.utils.security import create_csrf_token, create_session_token
 
 router = APIRouter()
 
 
+def _profile_changes(
+    user: User, tg_user: TelegramUserPayload, display_name: str
+) -> dict[str, str]:
+    """Telegram-sourced fields whose stored value differs from the login payload."""
+    wanted = {
+        "tg_username": tg_user.username or user.tg_username,
+        "avatar_url": tg_user.photo_url or user.avatar_url,
+        "display_name": user.display_name or display_name,
+        "locale": tg_user.language_code or user.locale,
+    }
+    return {
+        field: value for field, value in wanted.items() if value != getattr(user, field)
+    }
+
+
 @router.post("/auth/telegram", response_model=AuthResponse)
-def telegram_auth(payload: AuthRequest, response: Response, db: Session = Depends(get_db)) -> AuthResponse:
+async def telegram_auth(
+    payload: AuthRequest, response: Response, db: AsyncSession = Depends(get_async_db)
+) -> AuthResponse:
     try:
         result = validate_telegram_init_data(payload.init_data)
     except TelegramAuthError:
@@ -27,11 +49,17 @@ def telegram_auth(payload: AuthRequest, response: Response, db: Session = Depend
     tg_user = result.user
 
     stmt = select(User).where(User.tg_user_id == str(tg_user.id))
-    user: User | None = db.scalar(stmt)
+    user: User | None = await db.scalar(stmt)
 
-    display_name_parts = [value for value in [tg_user.first_name, tg_user.last_name] if value]
-    display_name = " ".join(display_name_parts).strip() or tg_user.username or "Wishlist User"
+    display_name_parts = [
+        value for value in [tg_user.first_name, tg_user.last_name] if value
+    ]
+    display_name = (
+        " ".join(display_name_parts).strip() or tg_user.username or "Wishlist User"
+    )
 
+    dirty = True
+    renamed: tuple[str | None, str | None] | None = None
     if user is None:
         try:
             user = User(
@@ -42,21 +70,31 @@ def telegram_auth(payload: AuthRequest, response: Response, db: Session = Depend
                 locale=tg_user.language_code or "en",
             )
             db.add(user)
-            db.flush()
-            wishlist = Wishlist(owner_id=user.id, title=f"{user.display_name}'s wishlist")
+            await db.flush()
+            wishlist = Wishlist(
+                owner_id=user.id, title=f"{user.display_name}'s wishlist"
+            )
             db.add(wishlist)
         except IntegrityError:
-            db.rollback()
-            user = db.scalar(select(User).where(User.tg_user_id == str(tg_user.id)))
+            await db.rollback()
+            user = await db.scalar(
+                select(User).where(User.tg_user_id == str(tg_user.id))
+            )
     else:
-        user.tg_username = tg_user.username or user.tg_username
-        user.avatar_url = tg_user.photo_url or user.avatar_url
-        if not user.display_name:
-            user.display_name = display_name
-        user.locale = tg_user.language_code or user.locale
+        changes = _profile_changes(user, tg_user, display_name)
+        if "tg_username" in changes:
+            renamed = (user.tg_username, changes["tg_username"])
+        for field, value in changes.items():
+            setattr(user, field, value)
+        # Most logins are reopens with an unchanged profile: nothing to write.
+        dirty = bool(changes)
 
-    db.commit()
-    user = db.get(User, user.id)
+    if dirty:
+        await db.commit()
+        await db.refresh(user)
+        await user_cache.invalidate_async(user.id)
+        if renamed:
+            await usernames.invalidate_async(*renamed)
 
     session_token = create_session_token(user.id)
     csrf_token = create_csrf_token(session_token)
@@ -1,9 +1,13 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
 
 from app.config import settings
-from app.utils.security import get_current_user
+from app.db import get_db, pool_stats as db_pool_stats
+from app.services import outbox, user_cache
+from app.utils.redis import pool_stats
+from app.utils.security import get_current_user, operator_protect
 from app.utils.seeder import seed
 
 router = APIRouter()
@@ -12,6 +16,28 @@ router = APIRouter()
 @router.post("/debug/seed", status_code=status.HTTP_202_ACCEPTED)
 def trigger_seed(_: str = Depends(get_current_user)) -> dict[str, str]:
     if settings.is_prod:
-        raise HTTPException(status_code=403, detail="Seed endpoint disabled in production")
+        raise HTTPException(
+            status_code=403, detail="Seed endpoint disabled in production"
+        )
     seed()
     return {"detail": "Seed data created"}
+
+
+@router.get("/debug/outbox", dependencies=[Depends(operator_protect)])
+def outbox_stats(db: Session = Depends(get_db)) -> dict[str, float]:
+    return outbox.stats(db)
+
+
+@router.get("/debug/user-cache", dependencies=[Depends(operator_protect)])
+def user_cache_stats() -> dict[str, float]:
+    return user_cache.stats()
+
+
+@router.get("/debug/redis", dependencies=[Depends(operator_protect)])
+def redis_pool_stats() -> dict[str, dict[str, float]]:
+    return pool_stats()
+
+
+@router.get("/debug/db-pool", dependencies=[Depends(operator_protect)])
+def database_pool_stats() -> dict[str, dict[str, float]]:
+    return db_pool_stats()
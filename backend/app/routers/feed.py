@@ -1,44 +1,73 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends
-from sqlalchemy import select
-from sqlalchemy.orm import Session, selectinload
-
-from app.db import get_db
-from app.models.enums import WishlistVisibility
-from app.models.subscription import Subscription
-from app.models.user import User
-from app.models.wish import Wish
-from app.models.wishlist import Wishlist
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.db import get_async_read_db
 from app.schemas.feed import FeedItem
 from app.schemas.user import UserPublic
 from app.schemas.wish import WishRead
-from app.utils.security import get_current_user
+from app.services import timeline
+from app.services.user_cache import CachedUser
+from app.utils.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.utils.security import get_current_user_async
 
 router = APIRouter(prefix="/feed")
 
+FEED_LIMIT = 50
+FEED_CURSOR_KEY = "updated_at"
+
 
 @router.get("", response_model=list[FeedItem])
-def fetch_feed(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> list[FeedItem]:
-    # Build feed via two-step approach: fetch subscriptions first, then public wishes of targets
-    subscriptions_stmt = select(Subscription).where(Subscription.follower_id == current_user.id)
-    subscriptions = db.scalars(subscriptions_stmt).all()
-    target_ids = [sub.target_user_id for sub in subscriptions]
-    if not target_ids:
-        return []
-
-    wishes_stmt = (
-        select(Wish)
-        .join(Wishlist)
-        .options(selectinload(Wish.wishlist).selectinload(Wishlist.owner))
-        .where(
-            Wishlist.owner_id.in_(target_ids),
-            Wishlist.visibility != WishlistVisibility.PRIVATE,
-        )
-        .order_by(Wish.updated_at.desc())
-        .limit(50)
+async def fetch_feed(
+    response: Response,
+    current_user: CachedUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db),
+    limit: int = Query(FEED_LIMIT, ge=1, le=100),
+    cursor: str | None = Query(None),
+) -> list[FeedItem]:
+    before: tuple[int, int] | None = None
+    if cursor:
+        before = decode_cursor(cursor, FEED_CURSOR_KEY, int)
+
+    # Serve from the materialised Redis timeline; cold timelines are rebuilt from SQL.
+    # Redis calls are blocking, so they run in the threadpool rather than on the loop.
+    entries = await run_in_threadpool(
+        timeline.read_page, current_user.id, limit + 1, before
     )
-    wishes = db.scalars(wishes_stmt).all()
+    if entries is not None:
+        page = entries[:limit]
+        wishes = await db.run_sync(timeline.hydrate, [wish_id for wish_id, _ in page])
+        if len(entries) > limit:
+            last_id, last_score = page[-1]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+                FEED_CURSOR_KEY, last_score, last_id
+            )
+    else:
+        if before is None:
+            loaded = list(
+                await db.run_sync(
+                    timeline.load_recent_wishes,
+                    current_user.id,
+                    settings.feed_timeline_size,
+                )
+            )
+            await run_in_threadpool(timeline.store, current_user.id, loaded)
+            loaded = loaded[: limit + 1]
+        else:
+            loaded = list(
+                await db.run_sync(
+                    timeline.load_recent_wishes, current_user.id, limit + 1, before
+                )
+            )
+        wishes = loaded[:limit]
+        if len(loaded) > limit:
+            last = wishes[-1]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+                FEED_CURSOR_KEY, last.updated_at, last.id
+            )
 
     feed: list[FeedItem] = []
     for wish in wishes:
@@ -1,35 +1,211 @@
 from __future__ import annotations
 
-import imghdr
+import hashlib
 import os
+import tempfile
+from collections.abc import Iterable
+from datetime import UTC, datetime
 from pathlib import Path
-from typing import Literal
-from uuid import uuid4
+from typing import Any, BinaryIO, Literal, cast
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.responses import RedirectResponse
+from sqlalchemy import CursorResult, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 from app.config import settings
-from app.models.user import User
-from app.utils.security import csrf_protect, get_current_user
+from app.db import get_async_db
+from app.models.media import MediaAsset
+from app.schemas.media import CompleteUploadRequest, PresignRequest, PresignResponse
+from app.services import events, image_metadata, images, media
+from app.services.storage import MediaStorage, get_storage
+from app.services.user_cache import CachedUser
+from app.utils.security import csrf_protect, get_current_user_async
 
 ALLOWED_EXTENSIONS: set[str] = {"jpg", "jpeg", "png", "gif", "webp"}
 
+CHUNK_SIZE = 64 * 1024
+SNIFF_BYTES = 12
+MAGIC_NUMBERS: tuple[tuple[bytes, str], ...] = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+CONTENT_TYPES: dict[str, str] = {
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp",
+}
+EXTENSIONS_BY_TYPE: dict[str, str] = {
+    content_type: ext for ext, content_type in CONTENT_TYPES.items()
+}
+
 router = APIRouter(prefix="/media")
 
 
 def _validate_extension(filename: str) -> str:
     ext = filename.rsplit(".", 1)[-1].lower()
     if ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported image format")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported image format"
+        )
     return ext
 
 
-async def _read_file(upload_file: UploadFile) -> bytes:
-    data = await upload_file.read()
+def _sniff_image_type(head: bytes) -> str | None:
+    for magic, ext in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _write_chunk(
+    out: BinaryIO,
+    digest: hashlib._Hash,
+    strip: image_metadata.MetadataFilter,
+    chunk: bytes,
+) -> None:
+    kept = strip.feed(chunk)
+    digest.update(kept)
+    out.write(kept)
+
+
+def _finish_copy(
+    out: BinaryIO, digest: hashlib._Hash, strip: image_metadata.MetadataFilter
+) -> str:
+    """Flush the filter and return the SHA-256 of everything written to ``out``."""
+    tail = strip.finish()
+    digest.update(tail)
+    out.write(tail)
+    patches = strip.patches()
+    if not patches:
+        return digest.hexdigest()
+    for offset, data in patches:
+        out.seek(offset)
+        out.write(data)
+    # A patched header invalidates the running hash; re-read the file in chunks.
+    out.seek(0)
+    digest = hashlib.sha256()
+    while chunk := out.read(CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def _stream_to_temp(
+    upload_file: UploadFile, target_dir: Path | None
+) -> tuple[Path, str, str]:
+    """Sniff the upload's type from its first bytes, then copy it to a temp file.
+
+    Metadata is filtered out on the way, so the content-addressed object never
+    carries it. Memory stays at one chunk regardless of file size, and the
+    copy stops as soon as ``media_max_mb`` is exceeded. Returns the temp path,
+    the detected extension and the SHA-256 of the bytes written.
+    """
+    head = await upload_file.read(SNIFF_BYTES)
+    mapped = _sniff_image_type(head)
+    if mapped is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image content"
+        )
+    if mapped not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported image content"
+        )
+
     max_bytes = settings.media_max_mb * 1024 * 1024
-    if len(data) > max_bytes:
-        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
-    return data
+    fd, tmp_name = tempfile.mkstemp(dir=target_dir, prefix=".upload-")
+    tmp_path = Path(tmp_name)
+    size = len(head)
+    digest = hashlib.sha256()
+    strip = image_metadata.metadata_filter(mapped)
+    try:
+        with os.fdopen(fd, "w+b") as out:
+            await run_in_threadpool(_write_chunk, out, digest, strip, head)
+            while chunk := await upload_file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="File too large",
+                    )
+                await run_in_threadpool(_write_chunk, out, digest, strip, chunk)
+            hexdigest = await run_in_threadpool(_finish_copy, out, digest, strip)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return tmp_path, mapped, hexdigest
+
+
+def _strip_object(
+    chunks: Iterable[bytes], ext: str, target_dir: Path | None
+) -> tuple[Path, str]:
+    """Copy a stored object to a temp file without metadata, one chunk at a time."""
+    fd, tmp_name = tempfile.mkstemp(dir=target_dir, prefix=".upload-")
+    tmp_path = Path(tmp_name)
+    digest = hashlib.sha256()
+    strip = image_metadata.metadata_filter(ext)
+    try:
+        with os.fdopen(fd, "w+b") as out:
+            for chunk in chunks:
+                _write_chunk(out, digest, strip, chunk)
+            hexdigest = _finish_copy(out, digest, strip)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return tmp_path, hexdigest
+
+
+async def _store_temp(
+    storage: MediaStorage, tmp_path: Path, digest: str, ext: str
+) -> str:
+    """Store a temp file under its content key, consuming it; returns the key."""
+    # Content-addressed: identical uploads share one object, URL and variants.
+    key = media.content_path(digest, ext)
+    try:
+        if await run_in_threadpool(storage.exists, key):
+            # Reset the garbage collector's grace period for the shared object.
+            await run_in_threadpool(storage.touch, key)
+        else:
+            await run_in_threadpool(
+                storage.save_file, key, tmp_path, CONTENT_TYPES[ext]
+            )
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return key
+
+
+async def _register_asset(
+    db: AsyncSession, url: str, owner_id: int
+) -> dict[Literal["url"], str]:
+    touched = cast(
+        CursorResult[Any],
+        await db.execute(
+            update(MediaAsset)
+            .where(MediaAsset.url == url)
+            .values(updated_at=datetime.now(UTC))
+        ),
+    )
+    if touched.rowcount:
+        await db.commit()
+        return {"url": url}
+
+    asset = MediaAsset(url=url, owner_id=owner_id)
+    db.add(asset)
+    try:
+        await db.flush()
+        # Resizing runs in the worker; the relay publishes it once this commits.
+        events.record_media_event(db, asset, owner_id)
+        await db.commit()
+    except IntegrityError:
+        # A concurrent upload of the same bytes registered the asset first.
+        await db.rollback()
+    return {"url": url}
 
 
 @router.post(
@@ -39,29 +215,145 @@ async def _read_file(upload_file: UploadFile) -> bytes:
 )
 async def upload_image(
     file: UploadFile = File(...),
-    _: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
 ) -> dict[Literal["url"], str]:
     if not file.filename:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File has no name")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="File has no name"
+        )
 
     _ = _validate_extension(file.filename)
-    data = await _read_file(file)
-    detected = imghdr.what(None, data)
-    if not detected:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image content")
-    mapped = "jpg" if detected == "jpeg" else detected
-    if mapped not in ALLOWED_EXTENSIONS:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported image content")
 
-    target_dir = Path(settings.media_root)
-    target_dir.mkdir(parents=True, exist_ok=True)
+    storage = get_storage()
+    tmp_path, mapped, digest = await _stream_to_temp(file, storage.staging_dir)
+    key = await _store_temp(storage, tmp_path, digest, mapped)
+    return await _register_asset(db, storage.url_for(key), current_user.id)
 
-    filename = f"{uuid4().hex}.{mapped}"
-    destination = target_dir / filename
-    destination.write_bytes(data)
 
-    if os.name != "nt":
-        os.chmod(destination, 0o644)
+@router.post(
+    "/presign", response_model=PresignResponse, dependencies=[Depends(csrf_protect)]
+)
+async def presign_upload(
+    payload: PresignRequest,
+    current_user: CachedUser = Depends(get_current_user_async),
+) -> PresignResponse:
+    """Hand out a direct-to-storage upload URL; finish with ``POST /media/complete``."""
+    if payload.size > settings.media_max_mb * 1024 * 1024:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="File too large",
+        )
+    storage = get_storage()
+    key = media.content_path(payload.sha256, EXTENSIONS_BY_TYPE[payload.content_type])
+    presigned = storage.presign_upload(
+        key, payload.content_type, payload.sha256, payload.size
+    )
+    if presigned is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Direct uploads are not supported",
+        )
+    url = storage.url_for(key)
+    if await run_in_threadpool(storage.exists, key):
+        return PresignResponse(url=url)
+    return PresignResponse(
+        url=url,
+        upload_url=presigned.url,
+        method=presigned.method,
+        headers=presigned.headers,
+        expires_in=presigned.expires_in,
+    )
 
-    url = f"{settings.media_base_url}/{filename}"
-    return {"url": url}
+
+@router.post(
+    "/complete",
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(csrf_protect)],
+)
+async def complete_upload(
+    payload: CompleteUploadRequest,
+    current_user: CachedUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+) -> dict[Literal["url"], str]:
+    """Validate a direct upload and register it like a proxied one.
+
+    The returned URL differs from the uploaded one when metadata was stripped.
+    """
+    storage = get_storage()
+    key = storage.key_for_url(payload.url)
+    if key is None or not media.is_content_key(key):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown media URL"
+        )
+    # A registered object passed these checks once and may be shared by other wishes:
+    # it is never re-checked, let alone deleted, on behalf of another upload.
+    if (
+        await db.scalar(select(MediaAsset.id).where(MediaAsset.url == payload.url))
+        is not None
+    ):
+        return await _register_asset(db, payload.url, current_user.id)
+    try:
+        size = await run_in_threadpool(storage.size, key)
+    except FileNotFoundError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found"
+        ) from exc
+    # The signed length should have stopped this, but storage is the authority, and
+    # nothing of an oversized object is read.
+    if size > settings.media_max_mb * 1024 * 1024:
+        await run_in_threadpool(storage.delete, key)
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="File too large",
+        )
+
+    # Storage checked the bytes against the SHA-256 in the key; the type is on us.
+    head = await run_in_threadpool(storage.read, key, SNIFF_BYTES)
+    if _sniff_image_type(head) != key.rsplit(".", 1)[-1]:
+        await run_in_threadpool(storage.delete, key)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image content"
+        )
+
+    ext = key.rsplit(".", 1)[-1]
+    if ext not in image_metadata.FILTERS:
+        return await _register_asset(db, payload.url, current_user.id)
+    # The client hashed the bytes as uploaded; a stripped copy gets its own key, and
+    # the upload itself is left to garbage collection once nothing references it.
+    tmp_path, digest = await run_in_threadpool(
+        _strip_object,
+        storage.iter_chunks(key, CHUNK_SIZE),
+        ext,
+        storage.staging_dir,
+    )
+    if media.content_path(digest, ext) == key:
+        tmp_path.unlink(missing_ok=True)
+        return await _register_asset(db, payload.url, current_user.id)
+    clean_key = await _store_temp(storage, tmp_path, digest, ext)
+    return await _register_asset(db, storage.url_for(clean_key), current_user.id)
+
+
+@router.get(
+    "/variant",
+    response_class=RedirectResponse,
+    status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+)
+async def get_image_variant(
+    url: str = Query(..., max_length=512),
+    width: int = Query(..., ge=1, le=4096),
+    db: AsyncSession = Depends(get_async_db),
+) -> RedirectResponse:
+    """Redirect to the smallest processed variant at least ``width`` pixels wide."""
+    asset = await db.scalar(select(MediaAsset).where(MediaAsset.url == url))
+    if asset is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Media not found"
+        )
+    # Until the worker has processed the upload, the original is the only option.
+    target = images.best_variant(asset.variants or {}, width) or asset.url
+    return RedirectResponse(
+        target,
+        status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+        headers={"Cache-Control": "public, max-age=300"},
+    )
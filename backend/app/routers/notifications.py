@@ -7,8 +7,8 @@ from sqlalchemy.orm import Session
 from app.db import get_db
 from app.models.enums import NotificationType
 from app.models.notification import Notification
-from app.models.user import User
 from app.schemas.notification import NotificationRead
+from app.services.user_cache import CachedUser
 from app.utils.security import csrf_protect, get_current_user
 from app.worker import send_notification
 
@@ -16,7 +16,7 @@ router = APIRouter(prefix="/notifications")
 
 
 @router.get("", response_model=list[NotificationRead])
-def list_notifications(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> list[NotificationRead]:
+def list_notifications(current_user: CachedUser = Depends(get_current_user), db: Session = Depends(get_db)) -> list[NotificationRead]:
     stmt = select(Notification).where(Notification.user_id == current_user.id).order_by(Notification.created_at.desc())
     notifications = db.scalars(stmt).all()
     return [NotificationRead.model_validate(item) for item in notifications]
@@ -28,7 +28,7 @@ def list_notifications(current_user: User = Depends(get_current_user), db: Sessi
     dependencies=[Depends(csrf_protect)],
 )
 def trigger_test_notification(
-    current_user: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> dict[str, str]:
     payload = {
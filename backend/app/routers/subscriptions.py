@@ -1,35 +1,27 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.orm import Session, selectinload
 
-from app.db import get_db
+from app.db import get_db, get_read_db
 from app.models.enums import WishlistVisibility
 from app.models.subscription import Subscription
-from app.models.user import User
 from app.models.wishlist import Wishlist
 from app.schemas.subscription import SubscriptionRead
+from app.services import timeline, usernames
+from app.services.user_cache import CachedUser
 from app.utils.rate_limit import rate_limit
 from app.utils.security import csrf_protect, get_current_user
 
 router = APIRouter(prefix="/subscriptions")
 
 
-def _find_user(db: Session, username: str) -> User | None:
-    try:
-        user_id = int(username)
-    except ValueError:
-        lowered = username.lower()
-        stmt = select(User).where(
-            (func.lower(User.tg_username) == lowered) | (func.lower(User.custom_username) == lowered)
-        )
-        return db.scalar(stmt)
-    return db.get(User, user_id)
-
-
 @router.get("", response_model=list[SubscriptionRead])
-def list_subscriptions(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> list[SubscriptionRead]:
+def list_subscriptions(
+    current_user: CachedUser = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+) -> list[SubscriptionRead]:
     stmt = (
         select(Subscription)
         .options(selectinload(Subscription.target))
@@ -43,14 +35,17 @@ def list_subscriptions(current_user: User = Depends(get_current_user), db: Sessi
     "/{username}",
     response_model=SubscriptionRead,
     status_code=status.HTTP_201_CREATED,
-    dependencies=[Depends(csrf_protect), Depends(rate_limit("subscription:create", limit=10, window=60))],
+    dependencies=[
+        Depends(csrf_protect),
+        Depends(rate_limit("subscription:create", limit=10, window=60)),
+    ],
 )
 def subscribe(
     username: str,
-    current_user: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> SubscriptionRead:
-    target_user = _find_user(db, username)
+    target_user = usernames.resolve(db, username)
     if not target_user:
         raise HTTPException(status_code=404, detail="User not found")
     if target_user.id == current_user.id:
@@ -72,9 +67,12 @@ def subscribe(
     if existing:
         return SubscriptionRead.model_validate(existing)
 
-    subscription = Subscription(follower_id=current_user.id, target_user_id=target_user.id)
+    subscription = Subscription(
+        follower_id=current_user.id, target_user_id=target_user.id
+    )
     db.add(subscription)
     db.commit()
+    timeline.add_author(db, current_user.id, target_user.id)
     subscription = db.get(
         Subscription,
         subscription.id,
@@ -92,10 +90,10 @@ def subscribe(
 )
 def unsubscribe(
     username: str,
-    current_user: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> None:
-    target_user = _find_user(db, username)
+    target_user = usernames.resolve(db, username)
     if not target_user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -110,3 +108,4 @@ def unsubscribe(
 
     db.delete(subscription)
     db.commit()
+    timeline.remove_author(db, current_user.id, target_user.id)
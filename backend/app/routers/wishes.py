@@ -1,51 +1,117 @@
 from __future__ import annotations
 
+from collections.abc import Callable, Sequence
 from decimal import Decimal
-from typing import List
 from enum import Enum as PyEnum
+from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import func, select
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import ColumnElement, Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import QueryableAttribute, Session, selectinload
 
-from app.db import get_db
-from app.models.enums import NotificationType, WishPriority, WishStatus, WishlistVisibility
-from app.models.user import User
+from app.db import get_async_read_db, get_db
+from app.models.enums import WishlistVisibility, WishPriority, WishStatus
+from app.models.event import EventAction
 from app.models.wish import Wish
 from app.models.wishlist import Wishlist
 from app.schemas.common import Paginated
 from app.schemas.wish import WishCreate, WishRead, WishReorderItem, WishUpdate
-from app.services import notify
+from app.services import events, wish_search, wishlist_cache, wishlist_versions
+from app.services.user_cache import CachedUser
+from app.utils.pagination import decode_cursor, encode_cursor, from_micros
 from app.utils.rate_limit import rate_limit
-from app.utils.security import csrf_protect, get_current_user
-from app.worker import send_notification
+from app.utils.security import csrf_protect, get_current_user, get_current_user_async
+from app.worker import needs_enrichment
 
 router = APIRouter(prefix="/wishes")
 
+ENRICH_DESCRIPTION = (
+    "Fill an empty title, description and image from the wish URL in the background"
+)
+SORT_DESCRIPTION = (
+    "Defaults to relevance when searching with q (Postgres), else created_at"
+)
+
 
-def _base_query(owner_id: int):
+def _base_query(owner_id: int) -> Select[Wish]:
     return select(Wish).join(Wishlist).where(Wishlist.owner_id == owner_id)
 
 
+# A mapped column, or a computed key such as the search rank.
+SortColumn = QueryableAttribute[Any] | ColumnElement[Any]
+
+# Keyset ordering per ``sort`` option: (column, descending). ``Wish.id`` breaks
+# ties in the same direction so every cursor position is unique.
+SORT_COLUMNS: dict[str, tuple[SortColumn, bool]] = {
+    "created_at": (Wish.created_at, True),
+    "priority": (Wish.priority, True),
+    "price": (Wish.price, False),
+    "position": (Wish.position, False),
+    "updated_at": (Wish.updated_at, True),
+}
+
+# Turns a cursor's JSON sort value back into something comparable to the column.
+CURSOR_PARSERS: dict[str, Callable[[Any], Any]] = {
+    "relevance": float,
+    "created_at": from_micros,
+    "priority": WishPriority,
+    "price": Decimal,
+    "position": int,
+    "updated_at": from_micros,
+}
+
+
+def _order_by(column: SortColumn, descending: bool) -> list[ColumnElement[Any]]:
+    if descending:
+        return [column.desc(), Wish.id.desc()]
+    return [column.asc().nulls_last(), Wish.id.asc()]
+
+
+def _after_cursor(
+    column: SortColumn, descending: bool, value: Any, last_id: int
+) -> ColumnElement[bool]:
+    clause: ColumnElement[bool]
+    if value is None:
+        # NULLs sort last, so the cursor is already inside the NULL tail.
+        clause = column.is_(None) & (Wish.id > last_id)
+    elif descending:
+        clause = (column < value) | ((column == value) & (Wish.id < last_id))
+    else:
+        clause = (column > value) | ((column == value) & (Wish.id > last_id))
+        if getattr(column.expression, "nullable", False):
+            clause = clause | column.is_(None)
+    return clause
+
+
 @router.get("", response_model=Paginated[WishRead])
-def list_wishes(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+async def list_wishes(
+    current_user: CachedUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db),
     q: str | None = Query(None, max_length=255),
     priority: WishPriority | None = Query(None),
     status: WishStatus | None = Query(None),
-    tags: List[str] | None = Query(None),
+    tags: list[str] | None = Query(None),
     price_min: Decimal | None = Query(None),
     price_max: Decimal | None = Query(None),
-    sort: str = Query("created_at"),
+    sort: str | None = Query(None, description=SORT_DESCRIPTION),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(
+        None, description="Opaque keyset cursor from a previous next_cursor"
+    ),
+    include_total: bool | None = Query(
+        None, description="Defaults to true for page mode, false for cursor mode"
+    ),
 ) -> Paginated[WishRead]:
     query = _base_query(current_user.id).options(selectinload(Wish.wishlist))
 
-    if q:
-        like = f"%{q.lower()}%"
-        query = query.where(func.lower(Wish.title).like(like) | func.lower(Wish.description).like(like))
+    rank: ColumnElement[float] | None = None
+    if q and wish_search.supports_full_text(db.get_bind().dialect.name):
+        clause, rank = wish_search.full_text(q)
+        query = query.where(clause)
+    elif q:
+        query = query.where(wish_search.substring(q))
     if priority:
         query = query.where(Wish.priority == priority)
     if status:
@@ -58,37 +124,65 @@ def list_wishes(
     if price_max is not None:
         query = query.where(Wish.price <= price_max)
 
-    sort_map = {
-        "created_at": Wish.created_at.desc(),
-        "priority": Wish.priority.desc(),
-        "price": Wish.price.asc(),
-        "position": Wish.position.asc(),
-        "updated_at": Wish.updated_at.desc(),
-    }
-    order_by = sort_map.get(sort, Wish.created_at.desc())
-    query = query.order_by(order_by)
-
-    count_query = query.with_only_columns(func.count()).order_by(None)
-    total = db.scalar(count_query) or 0
-    items = db.scalars(query.offset((page - 1) * per_page).limit(per_page)).all()
-    return {
-        "items": [WishRead.model_validate(item) for item in items],
-        "total": total,
-        "page": page,
-        "per_page": per_page,
-    }
+    column: SortColumn
+    if rank is not None and sort in {None, "relevance"}:
+        sort = "relevance"
+        column, descending = rank, True
+    else:
+        if sort not in SORT_COLUMNS:
+            sort = "created_at"
+        column, descending = SORT_COLUMNS[sort]
+    if include_total is None:
+        include_total = cursor is None
+
+    total = None
+    if include_total:
+        count_query = query.with_only_columns(func.count()).order_by(None)
+        total = await db.scalar(count_query) or 0
+
+    query = query.order_by(*_order_by(column, descending))
+    if cursor:
+        parse = CURSOR_PARSERS[sort]
+        value, last_id = decode_cursor(
+            cursor, sort, lambda raw: parse(raw) if raw is not None else None
+        )
+        query = query.where(_after_cursor(column, descending, value, last_id))
+    else:
+        query = query.offset((page - 1) * per_page)
+
+    # One extra row tells us whether another page exists without counting.
+    # Rows are (wish, sort key), so a computed key like the search rank can seed
+    # the cursor.
+    result = await db.execute(query.add_columns(column).limit(per_page + 1))
+    rows: Sequence[tuple[Wish, Any]] = result.tuples().all()
+    items: list[Wish] = [wish for wish, _ in rows[:per_page]]
+    next_cursor = None
+    if len(rows) > per_page:
+        next_cursor = encode_cursor(sort, rows[per_page - 1][1], items[-1].id)
+
+    return Paginated[WishRead](
+        items=[WishRead.model_validate(item) for item in items],
+        total=total,
+        page=page,
+        per_page=per_page,
+        next_cursor=next_cursor,
+    )
 
 
 @router.post(
     "",
     response_model=WishRead,
     status_code=status.HTTP_201_CREATED,
-    dependencies=[Depends(csrf_protect), Depends(rate_limit("wish:create", limit=20, window=60))],
+    dependencies=[
+        Depends(csrf_protect),
+        Depends(rate_limit("wish:create", limit=20, window=60)),
+    ],
 )
 def create_wish(
     payload: WishCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
+    enrich: bool = Query(False, description=ENRICH_DESCRIPTION),
 ) -> WishRead:
     wishlist = db.get(Wishlist, payload.wishlist_id)
     if not wishlist or wishlist.owner_id != current_user.id:
@@ -115,77 +209,95 @@ def create_wish(
     db.add(wish)
     db.flush()
 
-    notifications = []
+    # Fan-out is published by the outbox relay once this transaction commits.
     if wishlist.visibility in {WishlistVisibility.PUBLIC, WishlistVisibility.UNLISTED}:
-        notifications = notify.create_notifications(db, wish, NotificationType.WISH_CREATED)
+        events.record_wish_event(db, wish, current_user.id, EventAction.CREATE)
+    # Enrichment is relayed like fan-out, so a broker outage can't fail or lose it.
+    if enrich and needs_enrichment(wish):
+        events.record_wish_event(db, wish, current_user.id, EventAction.ENRICH)
+    changed = wishlist_versions.bump(db, [wishlist.id])
 
     db.commit()
+    wishlist_cache.invalidate(changed)
     db.refresh(wish)
 
-    for notification in notifications:
-        send_notification.delay(notification.id)
-
     return WishRead.model_validate(wish)
 
 
 @router.patch(
     "/{wish_id}",
     response_model=WishRead,
-    dependencies=[Depends(csrf_protect), Depends(rate_limit("wish:update", limit=30, window=60))],
+    dependencies=[
+        Depends(csrf_protect),
+        Depends(rate_limit("wish:update", limit=30, window=60)),
+    ],
 )
 def update_wish(
     wish_id: int,
     payload: WishUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
+    enrich: bool = Query(False, description=ENRICH_DESCRIPTION),
 ) -> WishRead:
     wish = db.get(Wish, wish_id)
     if not wish or wish.wishlist.owner_id != current_user.id:
         raise HTTPException(status_code=404, detail="Wish not found")
 
-    for field, value in payload.model_dump(exclude_unset=True).items():
+    changes = payload.model_dump(exclude_unset=True)
+    for field, value in changes.items():
         if isinstance(value, PyEnum):
             value = value.value
         setattr(wish, field, value)
 
-    notifications = []
-    if wish.wishlist.visibility in {WishlistVisibility.PUBLIC, WishlistVisibility.UNLISTED}:
-        notifications = notify.create_notifications(db, wish, NotificationType.WISH_UPDATED)
+    if wish.wishlist.visibility in {
+        WishlistVisibility.PUBLIC,
+        WishlistVisibility.UNLISTED,
+    }:
+        events.record_wish_event(db, wish, current_user.id, EventAction.UPDATE, changes)
+    if enrich and needs_enrichment(wish):
+        events.record_wish_event(db, wish, current_user.id, EventAction.ENRICH)
+    changed = wishlist_versions.bump(db, [wish.wishlist_id])
 
     db.add(wish)
     db.commit()
+    wishlist_cache.invalidate(changed)
     db.refresh(wish)
 
-    for notification in notifications:
-        send_notification.delay(notification.id)
-
     return WishRead.model_validate(wish)
 
 
 @router.delete(
     "/{wish_id}",
     status_code=status.HTTP_204_NO_CONTENT,
-    dependencies=[Depends(csrf_protect), Depends(rate_limit("wish:delete", limit=20, window=60))],
+    dependencies=[
+        Depends(csrf_protect),
+        Depends(rate_limit("wish:delete", limit=20, window=60)),
+    ],
 )
 def delete_wish(
     wish_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> None:
     wish = db.get(Wish, wish_id)
     if not wish or wish.wishlist.owner_id != current_user.id:
         raise HTTPException(status_code=404, detail="Wish not found")
+    changed = wishlist_versions.bump(db, [wish.wishlist_id])
     db.delete(wish)
     db.commit()
+    wishlist_cache.invalidate(changed)
 
 
 @router.post(
     "/reorder",
-    dependencies=[Depends(csrf_protect), Depends(rate_limit("wish:reorder", limit=10, window=60))],
+    dependencies=[
+        Depends(csrf_protect),
+        Depends(rate_limit("wish:reorder", limit=10, window=60)),
+    ],
 )
 def reorder_wishes(
-    items: List[WishReorderItem],
-    current_user: User = Depends(get_current_user),
+    items: list[WishReorderItem],
+    current_user: CachedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> dict[str, str]:
     wish_ids = [item.id for item in items]
@@ -202,5 +314,7 @@ def reorder_wishes(
             continue
         wish.position = item.position
         db.add(wish)
+    changed = wishlist_versions.bump(db, {wish.wishlist_id for wish in wishes})
     db.commit()
+    wishlist_cache.invalidate(changed)
     return {"detail": "Reordered"}
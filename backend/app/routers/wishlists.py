@@ -1,21 +1,26 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func, select
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, selectinload
 
-from app.db import get_db
+from app.db import get_async_read_db, get_db
 from app.models.enums import WishlistVisibility
-from app.models.user import User
 from app.models.wishlist import Wishlist
 from app.schemas.wishlist import WishlistCreate, WishlistDetail, WishlistRead
-from app.utils.security import csrf_protect, get_current_user, get_optional_user
+from app.services import usernames, wishlist_cache
+from app.services.user_cache import CachedUser
+from app.utils import http_cache
+from app.utils.security import csrf_protect, get_current_user, get_optional_user_async
 
 router = APIRouter()
 
 
 @router.get("/wishlists/mine", response_model=list[WishlistDetail])
-def get_my_wishlists(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> list[WishlistDetail]:
+def get_my_wishlists(
+    current_user: CachedUser = Depends(get_current_user), db: Session = Depends(get_db)
+) -> list[WishlistDetail]:
     stmt = (
         select(Wishlist)
         .where(Wishlist.owner_id == current_user.id)
@@ -33,7 +38,7 @@ def get_my_wishlists(current_user: User = Depends(get_current_user), db: Session
 )
 def create_wishlist(
     wishlist: WishlistCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> WishlistRead:
     new_wishlist = Wishlist(
@@ -45,40 +50,85 @@ def create_wishlist(
     db.add(new_wishlist)
     db.commit()
     db.refresh(new_wishlist)
+    # Retires anything cached for an owner without a wishlist yet; a page of
+    # their first wishlist is at least this version and is kept as is.
+    wishlist_cache.invalidate({new_wishlist.owner_id: new_wishlist.version})
     return WishlistRead.model_validate(new_wishlist)
 
 
+def _check_visible(
+    visibility: WishlistVisibility, owner_id: int, current_user: CachedUser | None
+) -> None:
+    if visibility == WishlistVisibility.PRIVATE and (
+        not current_user or current_user.id != owner_id
+    ):
+        raise HTTPException(status_code=403, detail="Wishlist is private")
+
+
 @router.get("/users/{username}/wishlist", response_model=WishlistDetail)
-def get_user_wishlist(
+async def get_user_wishlist(
     username: str,
-    db: Session = Depends(get_db),
-    current_user: User | None = Depends(get_optional_user),
-) -> WishlistDetail:
-    try:
-        user_id = int(username)
-    except ValueError:
-        lowered = username.lower()
-        user_stmt = select(User).where(
-            (func.lower(User.tg_username) == lowered) | (func.lower(User.custom_username) == lowered)
-        )
-        target_user = db.scalar(user_stmt)
-    else:
-        target_user = db.get(User, user_id)
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: CachedUser | None = Depends(get_optional_user_async),
+) -> Response:
+    target_user = await usernames.resolve_async(db, username)
     if not target_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    wishlist_stmt = (
-        select(Wishlist)
-        .where(Wishlist.owner_id == target_user.id)
-        .options(selectinload(Wishlist.wishes))
-    )
-    wishlist = db.scalar(wishlist_stmt)
-    if not wishlist:
-        raise HTTPException(status_code=404, detail="Wishlist not found")
+    async def render() -> wishlist_cache.CachedPage | None:
+        wishlist_stmt = (
+            select(Wishlist)
+            .where(Wishlist.owner_id == target_user.id)
+            .order_by(Wishlist.id)
+            .limit(1)
+            .options(selectinload(Wishlist.wishes))
+        )
+        wishlist = await db.scalar(wishlist_stmt)
+        if not wishlist:
+            return None
+        return wishlist_cache.CachedPage(
+            owner_id=target_user.id,
+            wishlist_id=wishlist.id,
+            version=wishlist.version,
+            visibility=wishlist.visibility,
+            body=WishlistDetail.model_validate(wishlist).model_dump_json().encode(),
+        )
 
-    if wishlist.visibility == WishlistVisibility.PRIVATE and (
-        not current_user or current_user.id != target_user.id
-    ):
-        raise HTTPException(status_code=403, detail="Wishlist is private")
+    # Hot shared links are served from Redis without touching the wishlist tables.
+    page = await wishlist_cache.get(target_user.id)
+    if page is None and request.headers.get("if-none-match"):
+        # A revalidation after a cache miss: compare versions before rendering.
+        head_stmt = (
+            select(Wishlist.id, Wishlist.version, Wishlist.visibility)
+            .where(Wishlist.owner_id == target_user.id)
+            .order_by(Wishlist.id)
+            .limit(1)
+        )
+        head = (await db.execute(head_stmt)).first()
+        if head is not None:
+            etag = wishlist_cache.page_etag(head.id, head.version)
+            if http_cache.matches(request, etag):
+                _check_visible(head.visibility, target_user.id, current_user)
+                return http_cache.not_modified(
+                    etag,
+                    http_cache.cache_control(
+                        public=head.visibility == WishlistVisibility.PUBLIC
+                    ),
+                )
+    if page is None:
+        page = await wishlist_cache.fill(target_user.id, render)
+    if not page:
+        raise HTTPException(status_code=404, detail="Wishlist not found")
 
-    return WishlistDetail.model_validate(wishlist)
+    _check_visible(page.visibility, target_user.id, current_user)
+    cache_control = http_cache.cache_control(
+        public=page.visibility == WishlistVisibility.PUBLIC
+    )
+    if http_cache.matches(request, page.etag):
+        return http_cache.not_modified(page.etag, cache_control)
+    return Response(
+        content=page.body,
+        media_type="application/json",
+        headers={"ETag": page.etag, "Cache-Control": cache_control},
+    )
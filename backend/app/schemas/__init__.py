@@ -1,6 +1,7 @@
 from .auth import AuthRequest, AuthResponse
 from .common import Message, Paginated, Pagination
 from .feed import FeedItem
+from .media import CompleteUploadRequest, PresignRequest, PresignResponse
 from .notification import NotificationRead
 from .subscription import SubscriptionRead
 from .user import UserBase, UserMe, UserPublic, UserUpdateRequest
@@ -10,11 +11,14 @@ from .wishlist import WishlistBase, WishlistCreate, WishlistDetail, WishlistRead
 __all__ = [
     "AuthRequest",
     "AuthResponse",
+    "CompleteUploadRequest",
     "FeedItem",
     "Message",
     "NotificationRead",
     "Paginated",
     "Pagination",
+    "PresignRequest",
+    "PresignResponse",
     "SubscriptionRead",
     "UserBase",
     "UserMe",
@@ -14,9 +14,10 @@ class Pagination(BaseModel):
 
 class Paginated(BaseModel, Generic[T]):
     items: list[T]
-    total: int
+    total: int | None = None
     page: int
     per_page: int
+    next_cursor: str | None = None
 
 
 class Message(BaseModel):
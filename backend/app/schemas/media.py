@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+
+class PresignRequest(BaseModel):
+    sha256: str = Field(pattern=r"^[0-9a-f]{64}$")
+    size: int = Field(gt=0)
+    content_type: Literal["image/jpeg", "image/png", "image/gif", "image/webp"]
+
+
+class PresignResponse(BaseModel):
+    url: str
+    # ``None`` when identical bytes are already stored: nothing to upload.
+    upload_url: str | None = None
+    method: str = "PUT"
+    headers: dict[str, str] = Field(default_factory=dict)
+    expires_in: int = 0
+
+
+class CompleteUploadRequest(BaseModel):
+    url: str = Field(max_length=512)
@@ -1,9 +1,8 @@
 from __future__ import annotations
 
 from decimal import Decimal
-from typing import List
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, computed_field
 
 from app.models.enums import WishPriority, WishStatus
 
@@ -16,7 +15,7 @@ class WishBase(BaseModel):
     image_url: str | None = Field(default=None, max_length=512)
     priority: WishPriority = WishPriority.MEDIUM
     status: WishStatus = WishStatus.PLANNED
-    tags: List[str] = Field(default_factory=list)
+    tags: list[str] = Field(default_factory=list)
 
 
 class WishCreate(WishBase):
@@ -31,7 +30,7 @@ class WishUpdate(BaseModel):
     image_url: str | None = Field(default=None, max_length=512)
     priority: WishPriority | None = None
     status: WishStatus | None = None
-    tags: List[str] | None = None
+    tags: list[str] | None = None
     position: int | None = Field(default=None, ge=0)
 
 
@@ -46,3 +45,14 @@ class WishRead(WishBase):
     id: int
     wishlist_id: int
     position: int
+    image_variants: dict[int, str] = Field(default_factory=dict)
+
+    @computed_field
+    @property
+    def image_srcset(self) -> str | None:
+        """``srcset`` over the WebP variants so clients pick the best fit themselves."""
+        if not self.image_variants:
+            return None
+        return ", ".join(
+            f"{url} {width}w" for width, url in sorted(self.image_variants.items())
+        )
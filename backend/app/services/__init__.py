@@ -1,3 +1,27 @@
-from . import notify, telegram_bot
+from . import (
+    events,
+    image_metadata,
+    images,
+    link_preview,
+    media,
+    notify,
+    outbox,
+    storage,
+    telegram_bot,
+    timeline,
+    user_cache,
+)
 
-__all__ = ["notify", "telegram_bot"]
+__all__ = [
+    "events",
+    "image_metadata",
+    "images",
+    "link_preview",
+    "media",
+    "notify",
+    "outbox",
+    "storage",
+    "telegram_bot",
+    "timeline",
+    "user_cache",
+]
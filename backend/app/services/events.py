@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.event import Event, EventAction, EventEntity
+from app.models.media import MediaAsset
+from app.models.wish import Wish
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def record_wish_event(
+    session: Session,
+    wish: Wish,
+    actor_id: int,
+    action: EventAction,
+    changes: dict[str, Any] | None = None,
+) -> Event:
+    """Add an outbox row for ``wish`` to the caller's transaction.
+
+    Followers are expanded from the event by a worker, so the request only pays
+    for this single insert regardless of the owner's audience size.
+    """
+    event = Event(
+        actor_id=actor_id,
+        entity=EventEntity.WISH,
+        entity_id=wish.id,
+        action=action,
+        diff=(
+            {field: _jsonable(value) for field, value in changes.items()}
+            if changes
+            else None
+        ),
+    )
+    session.add(event)
+    return event
+
+
+def record_media_event(
+    session: Session | AsyncSession, asset: MediaAsset, actor_id: int
+) -> Event:
+    """Add an outbox row asking for a new upload's variants to be rendered.
+
+    ``asset`` must be flushed, so it has an id.
+    """
+    event = Event(
+        actor_id=actor_id,
+        entity=EventEntity.MEDIA,
+        entity_id=asset.id,
+        action=EventAction.CREATE,
+    )
+    session.add(event)
+    return event
@@ -0,0 +1,264 @@
+"""Streaming removal of EXIF, XMP and text metadata from uploaded images.
+
+The filters work on the container structure, segment by segment, so pixels
+are never decoded and memory stays at one chunk plus at most one 64 KiB JPEG
+segment, whatever the size of the upload. A structure the filter does not
+understand is kept as uploaded from that point on.
+"""
+
+from __future__ import annotations
+
+import struct
+
+ORIENTATION_TAG = 0x0112
+EXIF_HEADER = b"Exif\x00\x00"
+
+# APP1 (EXIF, XMP), APP13 (Photoshop/IPTC) and COM; APP2 (ICC) and APP14
+# (Adobe colour transform) change how pixels decode and are kept.
+JPEG_DROPPED_MARKERS = {0xE1, 0xED, 0xFE}
+JPEG_STANDALONE_MARKERS = {0x01, 0xD8, 0xD9, *range(0xD0, 0xD8)}
+JPEG_START_OF_SCAN = 0xDA
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_DROPPED_CHUNKS = {b"tEXt", b"zTXt", b"iTXt", b"eXIf"}
+
+WEBP_DROPPED_CHUNKS = {b"EXIF", b"XMP "}
+# VP8X feature flags announcing the chunks above.
+WEBP_METADATA_FLAGS = 0x08 | 0x04
+
+
+class MetadataFilter:
+    """Pass-through filter; subclasses drop metadata from one container format.
+
+    Feed the upload in order with :meth:`feed`, write out what each call
+    returns, then write :meth:`finish` and apply :meth:`patches`.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._passthrough = False
+
+    def feed(self, chunk: bytes) -> bytes:
+        if self._passthrough:
+            return chunk
+        self._buffer += chunk
+        out = bytearray()
+        try:
+            self._parse(out)
+        except ValueError:
+            self._passthrough = True
+        if self._passthrough:
+            out += self._buffer
+            self._buffer.clear()
+        return bytes(out)
+
+    def finish(self) -> bytes:
+        """Whatever is still buffered; a truncated segment is kept as is."""
+        rest = bytes(self._buffer)
+        self._buffer.clear()
+        return rest
+
+    def patches(self) -> list[tuple[int, bytes]]:
+        """``(offset, bytes)`` to overwrite once the whole output is written."""
+        return []
+
+    def _parse(self, out: bytearray) -> None:
+        """Move complete segments from the buffer to ``out``, dropping metadata."""
+        self._passthrough = True
+
+
+def _exif_orientation(payload: bytes) -> int | None:
+    """The Orientation tag of an APP1 EXIF payload, if it has a valid one."""
+    if not payload.startswith(EXIF_HEADER):
+        return None
+    tiff = payload[len(EXIF_HEADER) :]
+    if tiff[:4] == b"II*\x00":
+        order = "<"
+    elif tiff[:4] == b"MM\x00*":
+        order = ">"
+    else:
+        return None
+    try:
+        (ifd,) = struct.unpack_from(f"{order}I", tiff, 4)
+        (count,) = struct.unpack_from(f"{order}H", tiff, ifd)
+        for index in range(count):
+            tag, kind, _, value = struct.unpack_from(
+                f"{order}HHIH", tiff, ifd + 2 + 12 * index
+            )
+            if tag == ORIENTATION_TAG and kind == 3:
+                return value if 1 <= value <= 8 else None
+    except struct.error:
+        return None
+    return None
+
+
+def _orientation_segment(orientation: int | None) -> bytes:
+    """An APP1 segment holding nothing but ``orientation``, so photos stay upright."""
+    if orientation is None or orientation == 1:
+        return b""
+    tiff = b"MM\x00*" + struct.pack(
+        ">IHHHIHHI", 8, 1, ORIENTATION_TAG, 3, 1, orientation, 0, 0
+    )
+    payload = EXIF_HEADER + tiff
+    return b"\xff\xe1" + (len(payload) + 2).to_bytes(2, "big") + payload
+
+
+class JpegMetadataFilter(MetadataFilter):
+    """Drops APP1, APP13 and COM segments before the first scan.
+
+    The EXIF orientation survives as a minimal APP1 segment, since nothing
+    else rotates the original. Metadata only precedes the image data, so the
+    entropy-coded scans are passed through unparsed.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._started = False
+
+    def _parse(self, out: bytearray) -> None:
+        buffer = self._buffer
+        if not self._started:
+            if len(buffer) < 2:
+                return
+            if buffer[:2] != b"\xff\xd8":
+                raise ValueError("Missing JPEG start of image")
+            out += buffer[:2]
+            del buffer[:2]
+            self._started = True
+        while len(buffer) >= 2:
+            if buffer[0] != 0xFF:
+                raise ValueError("Expected a JPEG marker")
+            marker = buffer[1]
+            if marker == 0xFF:
+                # Fill byte before a marker.
+                out.append(0xFF)
+                del buffer[:1]
+                continue
+            if marker in JPEG_STANDALONE_MARKERS:
+                out += buffer[:2]
+                del buffer[:2]
+                continue
+            if marker == JPEG_START_OF_SCAN:
+                self._passthrough = True
+                return
+            if len(buffer) < 4:
+                return
+            end = 2 + int.from_bytes(buffer[2:4], "big")
+            if end < 4:
+                raise ValueError("Invalid JPEG segment length")
+            if len(buffer) < end:
+                return
+            segment = bytes(buffer[:end])
+            del buffer[:end]
+            if marker not in JPEG_DROPPED_MARKERS:
+                out += segment
+            elif marker == 0xE1:
+                out += _orientation_segment(_exif_orientation(segment[4:]))
+
+
+class PngMetadataFilter(MetadataFilter):
+    """Drops text and eXIf chunks; image data is streamed, never buffered."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._started = False
+        #: Bytes left in the current chunk's data and CRC.
+        self._remaining = 0
+        self._keep = True
+
+    def _parse(self, out: bytearray) -> None:
+        buffer = self._buffer
+        if not self._started:
+            if len(buffer) < len(PNG_SIGNATURE):
+                return
+            if buffer[: len(PNG_SIGNATURE)] != PNG_SIGNATURE:
+                raise ValueError("Missing PNG signature")
+            out += buffer[: len(PNG_SIGNATURE)]
+            del buffer[: len(PNG_SIGNATURE)]
+            self._started = True
+        while buffer:
+            if self._remaining:
+                taken = min(self._remaining, len(buffer))
+                if self._keep:
+                    out += buffer[:taken]
+                del buffer[:taken]
+                self._remaining -= taken
+                continue
+            if len(buffer) < 8:
+                return
+            length = int.from_bytes(buffer[:4], "big")
+            self._keep = bytes(buffer[4:8]) not in PNG_DROPPED_CHUNKS
+            if self._keep:
+                out += buffer[:8]
+            del buffer[:8]
+            self._remaining = length + 4
+
+
+class WebpMetadataFilter(MetadataFilter):
+    """Drops EXIF and XMP chunks and clears their VP8X flags.
+
+    Those chunks usually follow the image data, so the RIFF size in the
+    header is only known at the end and is fixed up through :meth:`patches`.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._riff_size: int | None = None
+        self._dropped = 0
+        self._remaining = 0
+        self._keep = True
+
+    def patches(self) -> list[tuple[int, bytes]]:
+        if self._riff_size is None or not self._dropped:
+            return []
+        return [(4, struct.pack("<I", self._riff_size - self._dropped))]
+
+    def _parse(self, out: bytearray) -> None:
+        buffer = self._buffer
+        if self._riff_size is None:
+            if len(buffer) < 12:
+                return
+            if buffer[:4] != b"RIFF" or buffer[8:12] != b"WEBP":
+                raise ValueError("Missing RIFF WebP header")
+            self._riff_size = int.from_bytes(buffer[4:8], "little")
+            out += buffer[:12]
+            del buffer[:12]
+        while buffer:
+            if self._remaining:
+                taken = min(self._remaining, len(buffer))
+                if self._keep:
+                    out += buffer[:taken]
+                del buffer[:taken]
+                self._remaining -= taken
+                continue
+            if len(buffer) < 8:
+                return
+            fourcc = bytes(buffer[:4])
+            size = int.from_bytes(buffer[4:8], "little")
+            padded = 8 + size + (size & 1)
+            if fourcc == b"VP8X":
+                if size > 64:
+                    raise ValueError("Invalid VP8X chunk size")
+                if len(buffer) < padded:
+                    return
+                buffer[8] &= ~WEBP_METADATA_FLAGS & 0xFF
+                out += buffer[:padded]
+                del buffer[:padded]
+                continue
+            self._keep = fourcc not in WEBP_DROPPED_CHUNKS
+            if not self._keep:
+                self._dropped += padded
+            self._remaining = padded
+
+
+FILTERS: dict[str, type[MetadataFilter]] = {
+    "jpg": JpegMetadataFilter,
+    "jpeg": JpegMetadataFilter,
+    "png": PngMetadataFilter,
+    "webp": WebpMetadataFilter,
+}
+
+
+def metadata_filter(ext: str) -> MetadataFilter:
+    """A fresh filter for files with extension ``ext``; GIFs pass through."""
+    return FILTERS.get(ext, MetadataFilter)()
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import io
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from PIL import Image, ImageOps
+
+from app.config import settings
+
+VARIANT_WIDTHS = (128, 512, 1024)
+
+Image.MAX_IMAGE_PIXELS = settings.media_max_pixels
+
+
+class ImageProcessingError(Exception):
+    pass
+
+
+def variant_filename(filename: str, width: int) -> str:
+    return f"{Path(filename).stem}_{width}.webp"
+
+
+def best_variant(variants: Mapping[str, str], width: int) -> str | None:
+    """Smallest variant at least ``width`` pixels wide, else the largest one."""
+    if not variants:
+        return None
+    sized = sorted((int(key), url) for key, url in variants.items())
+    for variant_width, url in sized:
+        if variant_width >= width:
+            return url
+    return sized[-1][1]
+
+
+def _encode(image: Image.Image, format: str, **params: Any) -> bytes:  # noqa: A002
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+def _webp_ready(image: Image.Image) -> Image.Image:
+    has_alpha = image.mode in {"RGBA", "LA", "PA"} or (
+        image.mode == "P" and "transparency" in image.info
+    )
+    return image.convert("RGBA" if has_alpha else "RGB")
+
+
+@dataclass
+class ProcessedImage:
+    width: int
+    height: int
+    #: ``{width: (variant filename, WebP bytes)}``.
+    variants: dict[int, tuple[str, bytes]] = field(default_factory=dict)
+
+
+def process_image(data: bytes, filename: str) -> ProcessedImage:
+    """Render WebP width variants of an uploaded image.
+
+    A variant is rendered for each ``VARIANT_WIDTHS`` entry narrower than the
+    image, plus a full-size WebP when the image is no wider than the largest
+    one. Animated images get no variants. Nothing is written here; the caller
+    stores the results next to ``filename``.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            if getattr(source, "is_animated", False):
+                return ProcessedImage(source.width, source.height)
+            # Bake the EXIF orientation into the pixels; variants carry no tags.
+            image = ImageOps.exif_transpose(source)
+            image.load()
+    except (OSError, Image.DecompressionBombError) as exc:
+        raise ImageProcessingError(f"Cannot process {filename}: {exc}") from exc
+
+    width, height = image.size
+    result = ProcessedImage(width, height)
+    widths = [target for target in VARIANT_WIDTHS if target < width]
+    if width <= VARIANT_WIDTHS[-1]:
+        widths.append(width)
+
+    base = _webp_ready(image)
+    for target in widths:
+        resized = base
+        if target < width:
+            resized = base.resize(
+                (target, max(1, round(height * target / width))),
+                Image.Resampling.LANCZOS,
+            )
+        encoded = _encode(
+            resized, "WEBP", quality=settings.media_webp_quality, method=4
+        )
+        result.variants[target] = (variant_filename(filename, target), encoded)
+    return result
@@ -0,0 +1,448 @@
+from __future__ import annotations
+
+import asyncio
+import codecs
+import hashlib
+import json
+import re
+import time
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from typing import Any, cast
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import httpx
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.schemas.link_preview import LinkPreview
+from app.utils.redis import get_async_redis, get_binary_redis, get_redis
+
+REQUEST_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/118.0 Safari/537.36"
+    ),
+    "Accept-Language": "ru,en;q=0.9",
+}
+
+# Upstreams that refuse us get an empty preview instead of an error so the
+# client keeps its manual data.
+BLOCKED_STATUSES = frozenset({400, 401, 403, 404, 410})
+
+# The HTML spec's encoding prescan window: a <meta charset> must appear this early.
+CHARSET_SNIFF_BYTES = 1024
+_META_CHARSET_RE = re.compile(
+    rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-z0-9_\-:.]+)""", re.IGNORECASE
+)
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+TRACKING_PARAMS = frozenset({"fbclid", "gclid", "yclid", "_openstat"})
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+_client: httpx.AsyncClient | None = None
+_sync_client: httpx.Client | None = None
+_inflight: dict[str, asyncio.Task[dict[str, Any]]] = {}
+
+
+class LinkPreviewError(Exception):
+    pass
+
+
+class DomainBusyError(Exception):
+    """Every fetch slot for the URL's domain is taken; retry later."""
+
+
+class _MetaParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__()
+        self._capture_title = False
+        self.title: str | None = None
+        self.meta: dict[str, str] = {}
+        self.head_done = False
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        tag_lower = tag.lower()
+        if tag_lower == "body":
+            self.head_done = True
+        elif tag_lower == "title":
+            self._capture_title = True
+        elif tag_lower == "meta":
+            attr_map = {key.lower(): (value or "") for key, value in attrs}
+            name = attr_map.get("property") or attr_map.get("name")
+            content = attr_map.get("content") or attr_map.get("value")
+            if name and content:
+                self.meta[name.lower()] = content.strip()
+
+    def handle_data(self, data: str) -> None:
+        if self._capture_title:
+            text = data.strip()
+            if text and not self.title:
+                self.title = text
+
+    def handle_endtag(self, tag: str) -> None:
+        tag_lower = tag.lower()
+        if tag_lower == "title":
+            self._capture_title = False
+        elif tag_lower == "head":
+            self.head_done = True
+
+
+def _charset_from_content_type(content_type: str | None) -> str | None:
+    if not content_type:
+        return None
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset":
+            return value.strip().strip("\"'") or None
+    return None
+
+
+def _known_codec(name: str | None) -> str | None:
+    if not name:
+        return None
+    try:
+        info = codecs.lookup(name)
+    except LookupError:
+        return None
+    # base64, rot13 and friends are codecs too, but don't decode bytes to text.
+    return info.name if info._is_text_encoding else None
+
+
+def detect_encoding(prefix: bytes, content_type: str | None = None) -> str:
+    """Pick a decoder the way browsers do: BOM, then HTTP header, then ``<meta>``."""
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    declared = _known_codec(_charset_from_content_type(content_type))
+    if declared:
+        return declared
+    match = _META_CHARSET_RE.search(prefix[:CHARSET_SNIFF_BYTES])
+    if match:
+        sniffed = _known_codec(match.group(1).decode("ascii", "ignore"))
+        if sniffed:
+            return sniffed
+    return "utf-8"
+
+
+class HeadReader:
+    """Decode and parse a page chunk by chunk until its ``<head>`` is complete.
+
+    Only the bytes up to ``</head>`` (or ``max_bytes``) are ever decoded, so a
+    multi-megabyte product page costs no more than its metadata.
+    """
+
+    def __init__(
+        self,
+        content_type: str | None = None,
+        max_bytes: int = settings.link_preview_max_bytes,
+    ) -> None:
+        self.content_type = content_type
+        self.max_bytes = max_bytes
+        self.received = 0
+        self.encoding: str | None = None
+        self._parser = _MetaParser()
+        self._pending = b""
+        self._decoder: codecs.IncrementalDecoder | None = None
+
+    @property
+    def done(self) -> bool:
+        return self._parser.head_done or self.received >= self.max_bytes
+
+    def feed(self, chunk: bytes) -> bool:
+        """Consume ``chunk``; returns ``True`` once no more input is needed."""
+        if self.done:
+            return True
+        chunk = chunk[: self.max_bytes - self.received]
+        self.received += len(chunk)
+        if self._decoder is None:
+            # Hold bytes back until the charset prescan window is filled.
+            self._pending += chunk
+            if len(self._pending) < CHARSET_SNIFF_BYTES and not self.done:
+                return False
+            self._start_decoding()
+        else:
+            self._parser.feed(self._decoder.decode(chunk))
+        return self.done
+
+    def _start_decoding(self) -> codecs.IncrementalDecoder:
+        # detect_encoding falls back to UTF-8 when nothing usable is declared.
+        self.encoding = detect_encoding(self._pending, self.content_type)
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        self._decoder = decoder
+        pending, self._pending = self._pending, b""
+        self._parser.feed(decoder.decode(pending))
+        return decoder
+
+    def preview(self, base_url: str) -> LinkPreview:
+        decoder = self._decoder or self._start_decoding()
+        self._parser.feed(decoder.decode(b"", final=True))
+        self._parser.close()
+        return _build_preview(self._parser, base_url)
+
+
+def extract_preview(html: str, base_url: str) -> LinkPreview:
+    parser = _MetaParser()
+    parser.feed(html)
+    return _build_preview(parser, base_url)
+
+
+def _build_preview(parser: _MetaParser, base_url: str) -> LinkPreview:
+    meta = parser.meta
+
+    title = (
+        meta.get("og:title")
+        or meta.get("twitter:title")
+        or meta.get("title")
+        or parser.title
+    )
+
+    description = (
+        meta.get("og:description")
+        or meta.get("twitter:description")
+        or meta.get("description")
+    )
+
+    image = (
+        meta.get("og:image")
+        or meta.get("twitter:image")
+        or meta.get("twitter:image:src")
+    )
+    if image:
+        image = urljoin(base_url, image)
+
+    try:
+        return LinkPreview(
+            url=base_url, title=title, description=description, image=image
+        )
+    except Exception:
+        # Validation might fail on malformed URL/image; return minimal payload
+        return LinkPreview(
+            url=base_url, title=title, description=description, image=None
+        )
+
+
+def normalize_url(url: str) -> str:
+    """Cache identity of ``url``.
+
+    Lowercase host, no default port, fragment or tracking params.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    netloc = (
+        host if port is None or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+    )
+    query = urlencode(
+        sorted(
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not key.startswith("utm_") and key not in TRACKING_PARAMS
+        )
+    )
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+
+def cache_key(normalized_url: str) -> str:
+    return f"linkpreview:{hashlib.sha256(normalized_url.encode()).hexdigest()}"
+
+
+def get_client() -> httpx.AsyncClient:
+    """Process-wide client so upstream connections are pooled and kept alive."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers=REQUEST_HEADERS,
+            timeout=httpx.Timeout(settings.link_preview_timeout_seconds, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=settings.link_preview_max_connections,
+                max_keepalive_connections=settings.link_preview_max_connections,
+            ),
+            follow_redirects=True,
+        )
+    return _client
+
+
+def get_sync_client() -> httpx.Client:
+    """Blocking twin of ``get_client`` for Celery workers."""
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        _sync_client = httpx.Client(
+            headers=REQUEST_HEADERS,
+            timeout=httpx.Timeout(settings.link_preview_timeout_seconds, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=settings.link_preview_max_connections,
+                max_keepalive_connections=settings.link_preview_max_connections,
+            ),
+            follow_redirects=True,
+        )
+    return _sync_client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _cache_ttl(entry: dict[str, Any]) -> int:
+    if entry["status"] == "ok":
+        return settings.link_preview_cache_ttl_seconds
+    return settings.link_preview_negative_ttl_seconds
+
+
+def _cache_get(key: str) -> dict[str, Any] | None:
+    try:
+        # The binary client leaves replies undecoded.
+        raw = cast(bytes | None, get_binary_redis().get(key))
+    except RedisError as exc:
+        logger.warning("Link preview cache read failed: {}", exc)
+        return None
+    return json.loads(raw) if raw else None
+
+
+def _cache_set(key: str, entry: dict[str, Any]) -> None:
+    try:
+        get_binary_redis().set(key, json.dumps(entry), ex=_cache_ttl(entry))
+    except RedisError as exc:
+        logger.warning("Link preview cache write failed: {}", exc)
+
+
+async def _cache_get_async(key: str) -> dict[str, Any] | None:
+    try:
+        raw = await get_async_redis().get(key)
+    except RedisError as exc:
+        logger.warning("Link preview cache read failed: {}", exc)
+        return None
+    return json.loads(raw) if raw else None
+
+
+async def _cache_set_async(key: str, entry: dict[str, Any]) -> None:
+    try:
+        await get_async_redis().set(key, json.dumps(entry), ex=_cache_ttl(entry))
+    except RedisError as exc:
+        logger.warning("Link preview cache write failed: {}", exc)
+
+
+async def _fetch(url: str) -> dict[str, Any]:
+    try:
+        async with get_client().stream("GET", url) as response:
+            response.raise_for_status()
+            reader = HeadReader(response.headers.get("Content-Type"))
+            # Leaving the block early closes the stream; the rest is never read.
+            async for chunk in response.aiter_bytes():
+                if reader.feed(chunk):
+                    break
+    except httpx.HTTPStatusError as exc:
+        if exc.response.status_code in BLOCKED_STATUSES:
+            return {"status": "blocked"}
+        return {"status": "failed"}
+    except httpx.HTTPError:
+        return {"status": "failed"}
+    return {"status": "ok", "preview": reader.preview(url).model_dump(mode="json")}
+
+
+def _fetch_sync(url: str) -> dict[str, Any]:
+    try:
+        with get_sync_client().stream("GET", url) as response:
+            response.raise_for_status()
+            reader = HeadReader(response.headers.get("Content-Type"))
+            for chunk in response.iter_bytes():
+                if reader.feed(chunk):
+                    break
+    except httpx.HTTPStatusError as exc:
+        if exc.response.status_code in BLOCKED_STATUSES:
+            return {"status": "blocked"}
+        return {"status": "failed"}
+    except httpx.HTTPError:
+        return {"status": "failed"}
+    return {"status": "ok", "preview": reader.preview(url).model_dump(mode="json")}
+
+
+async def _fetch_and_cache(key: str, url: str) -> dict[str, Any]:
+    entry = await _fetch(url)
+    await _cache_set_async(key, entry)
+    return entry
+
+
+def _from_entry(entry: dict[str, Any], url: str) -> LinkPreview:
+    if entry["status"] == "failed":
+        raise LinkPreviewError(f"Failed to fetch link preview for {url}")
+    if entry["status"] == "blocked":
+        return LinkPreview(url=url)
+    # Cached under the normalised URL; answer with the URL this caller asked for.
+    return LinkPreview.model_validate({**entry["preview"], "url": url})
+
+
+async def get_preview(url: str) -> LinkPreview:
+    """Cached preview for ``url``; concurrent misses share one upstream fetch.
+
+    Failures are cached briefly too, so a dead retailer is not hammered by
+    every client retrying it. Raises ``LinkPreviewError`` for those failures.
+    """
+    key = cache_key(normalize_url(url))
+    entry = await _cache_get_async(key)
+    if entry is None:
+        task = _inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(_fetch_and_cache(key, url))
+            _inflight[key] = task
+            task.add_done_callback(lambda _: _inflight.pop(key, None))
+        # Shielded so one disconnecting caller does not cancel the fetch for the rest.
+        entry = await asyncio.shield(task)
+    return _from_entry(entry, url)
+
+
+def domain_key(url: str) -> str:
+    return f"linkpreview:domain:{(urlsplit(url).hostname or '').lower()}"
+
+
+@contextmanager
+def domain_slot(url: str) -> Iterator[None]:
+    """Hold one of the fetch slots for ``url``'s domain, shared by all workers.
+
+    Slots live in a sorted set scored by acquisition time, so a worker that dies
+    mid-fetch only blocks its slot until the fetch timeout has passed twice.
+    """
+    key = domain_key(url)
+    token = uuid.uuid4().hex
+    stale_after = int(settings.link_preview_timeout_seconds * 2)
+    now = time.time()
+    redis = get_redis()
+    pipe = redis.pipeline(transaction=True)
+    pipe.zremrangebyscore(key, "-inf", now - stale_after)
+    pipe.zadd(key, {token: now})
+    pipe.zrank(key, token)
+    pipe.expire(key, stale_after)
+    _, _, rank, _ = pipe.execute()
+    try:
+        if rank >= settings.link_preview_domain_concurrency:
+            raise DomainBusyError(key)
+        yield
+    finally:
+        redis.zrem(key, token)
+
+
+def fetch_preview(url: str) -> LinkPreview:
+    """Blocking ``get_preview`` for workers; misses are limited per domain.
+
+    Shares the cache with the API endpoint, so each URL is fetched once no
+    matter how many wishes or clients reference it. Raises ``DomainBusyError`` when
+    the domain has no free slot and ``LinkPreviewError`` for cached failures.
+    """
+    key = cache_key(normalize_url(url))
+    entry = _cache_get(key)
+    if entry is None:
+        with domain_slot(url):
+            entry = _fetch_sync(url)
+        _cache_set(key, entry)
+    return _from_entry(entry, url)
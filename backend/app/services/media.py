@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import re
+from collections.abc import Sequence
+from datetime import UTC, datetime, timedelta
+
+from loguru import logger
+from sqlalchemy import delete, select, union
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.media import MediaAsset
+from app.models.user import User
+from app.models.wish import Wish
+from app.models.wishlist import Wishlist
+from app.services.storage import MediaStorage, StorageError, get_storage
+
+CONTENT_KEY = re.compile(
+    r"([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.(?:jpg|png|gif|webp)"
+)
+VARIANT_KEY = re.compile(r"([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}_\d+\.webp")
+# ``<uuid4 hex>.ext`` uploads from before content addressing, and their variants.
+LEGACY_KEY = re.compile(r"[0-9a-f]{32}(?:\.(?:jpg|png|gif|webp)|_\d+\.webp)")
+# Upload staging and atomic-write temp files, see routers.media and LocalStorage.
+TEMP_PREFIXES = (".upload-", ".tmp-")
+
+
+def content_path(digest: str, ext: str) -> str:
+    """Sharded location for bytes hashing to ``digest``: ``ab/cd/abcd….ext``."""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+def is_content_key(key: str) -> bool:
+    return CONTENT_KEY.fullmatch(key) is not None
+
+
+def is_sweepable(key: str) -> bool:
+    """Whether garbage collection may remove ``key``: only objects uploads create."""
+    if any(
+        pattern.fullmatch(key) for pattern in (CONTENT_KEY, VARIANT_KEY, LEGACY_KEY)
+    ):
+        return True
+    return key.rsplit("/", 1)[-1].startswith(TEMP_PREFIXES)
+
+
+def referenced_urls(session: Session, storage: MediaStorage) -> set[str]:
+    """Every stored media URL still used by a wish, avatar or wishlist cover."""
+    pattern = f"{storage.base_url}/%"
+    stmt = union(
+        select(Wish.image_url).where(Wish.image_url.like(pattern)),
+        select(User.avatar_url).where(User.avatar_url.like(pattern)),
+        select(Wishlist.cover_url).where(Wishlist.cover_url.like(pattern)),
+    )
+    return set(session.scalars(stmt))
+
+
+def _asset_keys(
+    url: str, variants: dict[str, str] | None, storage: MediaStorage
+) -> list[str]:
+    urls = [url, *(variants or {}).values()]
+    return [key for key in map(storage.key_for_url, urls) if key is not None]
+
+
+def _delete(storage: MediaStorage, key: str) -> int:
+    try:
+        storage.delete(key)
+    except (OSError, StorageError) as exc:
+        logger.warning("Cannot remove media object {}: {}", key, exc)
+        return 0
+    return 1
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=UTC)
+
+
+def collect_garbage(
+    session: Session,
+    grace_seconds: int | None = None,
+    storage: MediaStorage | None = None,
+) -> int:
+    """Mark and sweep media nothing references; returns the number of objects removed.
+
+    Assets and loose objects (uploads that predate ``media_assets``, abandoned
+    temp files, direct uploads never completed) are only swept once untouched
+    for ``grace_seconds``, which covers the gap between an upload and the save
+    that references it. Loose objects are limited to the key shapes uploads
+    produce, so nothing else sharing the directory or bucket is touched.
+    """
+    if grace_seconds is None:
+        grace_seconds = settings.media_gc_grace_seconds
+    storage = storage or get_storage()
+    cutoff = datetime.now(UTC) - timedelta(seconds=grace_seconds)
+    referenced = referenced_urls(session, storage)
+    kept: set[str] = set()
+    stale_ids: list[int] = []
+    removed = 0
+
+    for asset in session.scalars(select(MediaAsset).execution_options(yield_per=500)):
+        if asset.url in referenced or _aware(asset.updated_at) > cutoff:
+            kept.update(_asset_keys(asset.url, asset.variants, storage))
+            continue
+        stale_ids.append(asset.id)
+    deleted: Sequence[tuple[str, dict[str, str] | None]] = ()
+    if stale_ids:
+        # Re-check the timestamp: a duplicate upload may have revived the asset.
+        # Files go only once the rows are gone, and only for rows really deleted.
+        deleted = (
+            session.execute(
+                delete(MediaAsset)
+                .where(MediaAsset.id.in_(stale_ids), MediaAsset.updated_at <= cutoff)
+                .returning(MediaAsset.url, MediaAsset.variants)
+                .execution_options(synchronize_session=False)
+            )
+            .tuples()
+            .all()
+        )
+    session.commit()
+    for url, variants in deleted:
+        removed += sum(
+            _delete(storage, key) for key in _asset_keys(url, variants, storage)
+        )
+
+    for stored in storage.iter_objects():
+        if stored.key in kept or storage.url_for(stored.key) in referenced:
+            continue
+        if not is_sweepable(stored.key):
+            continue
+        if _aware(stored.modified_at) > cutoff:
+            continue
+        removed += _delete(storage, stored.key)
+    return removed
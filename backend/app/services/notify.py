@@ -1,9 +1,12 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
-from typing import Iterable, List
+import time
+from collections.abc import Iterable, Sequence
+from datetime import UTC, datetime
+from enum import Enum
+from typing import Protocol, cast
 
-from sqlalchemy import select
+from sqlalchemy import Row, false, insert, literal, select, update
 from sqlalchemy.orm import Session
 
 from app.config import settings
@@ -12,19 +15,33 @@ from app.models.notification import Notification
 from app.models.subscription import Subscription
 from app.models.user import User
 from app.models.wish import Wish
+from app.utils.redis import get_redis
+
+DIGEST_DUE_KEY = "notify:due"
+
+
+def _digest_pending_key(user_id: int) -> str:
+    return f"notify:pending:{user_id}"
+
+
+def _digest_ids_key(user_id: int) -> str:
+    return f"notify:ids:{user_id}"
 
 
 def _wish_payload(wish: Wish) -> dict:
     wishlist = wish.wishlist
     owner = wishlist.owner if wishlist else None
     username = owner.tg_username or owner.custom_username if owner else ""
-    deep_link = f"https://t.me/{settings.telegram_bot_name}?startapp={username}" if username else None
+    deep_link = (
+        f"https://t.me/{settings.telegram_bot_name}?startapp={username}"
+        if username
+        else None
+    )
 
-    def _enum_or_str(value):
-        try:
-            return value.value  # type: ignore[attr-defined]
-        except Exception:
-            return str(value) if value is not None else None
+    def _enum_or_str(value: object) -> str | None:
+        if isinstance(value, Enum):
+            return str(value.value)
+        return str(value) if value is not None else None
 
     return {
         "wish_id": wish.id,
@@ -50,29 +67,121 @@ def _wish_payload(wish: Wish) -> dict:
     }
 
 
-def create_notifications(session: Session, wish: Wish, notification_type: NotificationType) -> List[Notification]:
+def create_notifications(
+    session: Session, wish: Wish, notification_type: NotificationType
+) -> Sequence[Row[int, int]]:
+    """Insert one notification per follower of the wish owner in a single statement.
+
+    Uses ``INSERT ... SELECT`` over subscriptions with a shared payload, so the
+    cost does not grow with ORM objects. Returns ``(id, user_id)`` rows.
+    """
     owner: User = wish.wishlist.owner  # type: ignore[assignment]
-    followers_stmt = (
-        select(Subscription)
-        .where(Subscription.target_user_id == owner.id)
-        .join(User, User.id == Subscription.follower_id)
+    columns = Notification.__table__.c
+    followers = select(
+        Subscription.follower_id,
+        literal(notification_type, columns.type.type),
+        literal(_wish_payload(wish), columns.payload.type),
+        false(),
+    ).where(Subscription.target_user_id == owner.id)
+    stmt = (
+        insert(Notification)
+        .from_select(["user_id", "type", "payload", "is_sent"], followers)
+        .returning(Notification.id, Notification.user_id)
     )
-    subscriptions: Iterable[Subscription] = session.scalars(followers_stmt).all()
-    notifications: List[Notification] = []
-    payload = _wish_payload(wish)
-    for sub in subscriptions:
-        notification = Notification(
-            user_id=sub.follower_id,
-            type=notification_type.value,
-            payload=payload,
-            is_sent=False,
-        )
-        session.add(notification)
-        notifications.append(notification)
-    return notifications
+    return session.execute(stmt).all()
 
 
 def mark_sent(session: Session, notification: Notification) -> None:
     notification.is_sent = True
-    notification.sent_at = datetime.now(timezone.utc)
+    notification.sent_at = datetime.now(UTC)
     session.add(notification)
+
+
+def mark_sent_many(session: Session, notification_ids: Iterable[int]) -> None:
+    ids = list(notification_ids)
+    if not ids:
+        return
+    session.execute(
+        update(Notification)
+        .where(Notification.id.in_(ids))
+        .values(is_sent=True, sent_at=datetime.now(UTC))
+    )
+
+
+class QueuedNotification(Protocol):
+    id: int
+    user_id: int
+
+
+def queue_for_digest(notifications: Iterable[QueuedNotification], wish_id: int) -> None:
+    """Collect notifications per recipient until their batch window closes.
+
+    The first notification opens the window. Repeated edits of the same wish
+    collapse into one entry; superseded rows are marked sent with the digest.
+    """
+    due_at = time.time() + settings.notify_batch_seconds
+    pipe = get_redis().pipeline(transaction=True)
+    for notification in notifications:
+        pipe.zadd(DIGEST_DUE_KEY, {str(notification.user_id): due_at}, nx=True)
+        pipe.hset(
+            _digest_pending_key(notification.user_id),
+            str(wish_id),
+            str(notification.id),
+        )
+        pipe.sadd(_digest_ids_key(notification.user_id), notification.id)
+    pipe.execute()
+
+
+def due_digest_recipients(now: float | None = None) -> list[int]:
+    # get_redis() decodes replies, so members come back as str.
+    due = cast(
+        list[str],
+        get_redis().zrangebyscore(
+            DIGEST_DUE_KEY, "-inf", now if now is not None else time.time()
+        ),
+    )
+    return [int(user_id) for user_id in due]
+
+
+def claim_digest(user_id: int) -> tuple[dict[int, int], list[int]]:
+    """Atomically take a recipient's batch.
+
+    Returns the latest notification id per wish (to render) and every collected
+    id (to mark sent). A concurrent claim of the same recipient gets nothing.
+    """
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.hgetall(_digest_pending_key(user_id))
+    pipe.smembers(_digest_ids_key(user_id))
+    pipe.delete(_digest_pending_key(user_id), _digest_ids_key(user_id))
+    pipe.zrem(DIGEST_DUE_KEY, str(user_id))
+    replies = pipe.execute()
+    latest = cast(dict[str, str], replies[0])
+    collected = cast(set[str], replies[1])
+    return (
+        {
+            int(wish_id): int(notification_id)
+            for wish_id, notification_id in latest.items()
+        },
+        sorted(int(value) for value in collected),
+    )
+
+
+def requeue_digest(
+    user_id: int, latest: dict[int, int], collected: Iterable[int]
+) -> None:
+    """Put back a claimed batch whose delivery failed, to retry after another window.
+
+    Notifications queued for the same wish since the claim are newer and win.
+    """
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.zadd(
+        DIGEST_DUE_KEY,
+        {str(user_id): time.time() + settings.notify_batch_seconds},
+        nx=True,
+    )
+    for wish_id, notification_id in latest.items():
+        pipe.hsetnx(_digest_pending_key(user_id), str(wish_id), str(notification_id))
+    ids = list(collected)
+    if ids:
+        pipe.sadd(_digest_ids_key(user_id), *ids)
+    pipe.execute()
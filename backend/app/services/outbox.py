@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Sequence
+from datetime import UTC, datetime, timedelta
+from typing import Any, cast
+
+from sqlalchemy import CursorResult, func, select, update
+from sqlalchemy.orm import Session
+
+from app.models.event import Event
+
+THROUGHPUT_WINDOW_SECONDS = 60
+
+
+def claim_batch(session: Session, limit: int) -> Sequence[Event]:
+    """Lock the oldest undispatched events for this transaction.
+
+    ``SKIP LOCKED`` lets several relays poll concurrently: each one gets a
+    disjoint batch and never waits on rows another relay is publishing.
+    """
+    stmt = (
+        select(Event)
+        .where(Event.dispatched_at.is_(None))
+        .order_by(Event.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return session.scalars(stmt).all()
+
+
+def relay_batch(
+    session: Session, publish: Callable[[Sequence[Event]], None], limit: int
+) -> int:
+    """Publish one claimed batch and mark it dispatched in the same transaction.
+
+    A crash after ``publish`` but before commit republishes the batch; the
+    consumer guards against duplicates with ``Event.processed_at``.
+    """
+    events = claim_batch(session, limit)
+    if not events:
+        session.rollback()
+        return 0
+    publish(events)
+    session.execute(
+        update(Event)
+        .where(Event.id.in_([event.id for event in events]))
+        .values(dispatched_at=datetime.now(UTC))
+    )
+    session.commit()
+    return len(events)
+
+
+def mark_processed(session: Session, event_id: int) -> bool:
+    """Claim an event for processing; ``False`` if it was already applied."""
+    result = cast(
+        CursorResult[Any],
+        session.execute(
+            update(Event)
+            .where(Event.id == event_id, Event.processed_at.is_(None))
+            .values(processed_at=datetime.now(UTC))
+        ),
+    )
+    return result.rowcount == 1
+
+
+def release(session: Session, event_id: int) -> None:
+    """Hand an unprocessed event back to the relay, to be published again."""
+    session.execute(
+        update(Event)
+        .where(Event.id == event_id, Event.processed_at.is_(None))
+        .values(dispatched_at=None)
+    )
+
+
+def stats(session: Session) -> dict[str, float]:
+    """Backlog size, lag of the oldest pending event and recent relay throughput."""
+    now = datetime.now(UTC)
+    pending, oldest = session.execute(
+        select(func.count(Event.id), func.min(Event.created_at)).where(
+            Event.dispatched_at.is_(None)
+        )
+    ).one()
+    dispatched = session.scalar(
+        select(func.count(Event.id)).where(
+            Event.dispatched_at >= now - timedelta(seconds=THROUGHPUT_WINDOW_SECONDS)
+        )
+    )
+    lag = 0.0
+    if oldest is not None:
+        if oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=UTC)
+        lag = max((now - oldest).total_seconds(), 0.0)
+    return {
+        "pending": float(pending or 0),
+        "lag_seconds": lag,
+        "dispatched_per_second": (dispatched or 0) / THROUGHPUT_WINDOW_SECONDS,
+    }
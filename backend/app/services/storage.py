@@ -0,0 +1,370 @@
+from __future__ import annotations
+
+import base64
+import mimetypes
+import os
+import tempfile
+import threading
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+from app.config import settings
+from app.utils.static import IMMUTABLE_CACHE_CONTROL
+
+
+@dataclass(frozen=True)
+class StoredObject:
+    key: str
+    size: int
+    modified_at: datetime
+
+
+@dataclass(frozen=True)
+class PresignedUpload:
+    """A direct-to-storage upload the client performs with exactly these headers."""
+
+    url: str
+    method: str = "PUT"
+    headers: dict[str, str] = field(default_factory=dict)
+    expires_in: int = 0
+
+
+class StorageError(Exception):
+    pass
+
+
+def guess_content_type(key: str) -> str:
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+class MediaStorage:
+    """Where uploaded media bytes live; keys are ``/``-separated relative paths."""
+
+    #: Local directory for upload temp files, when the final move must stay on
+    #: one filesystem.
+    staging_dir: Path | None = None
+
+    @property
+    def base_url(self) -> str:
+        raise NotImplementedError
+
+    def url_for(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def key_for_url(self, url: str) -> str | None:
+        """Storage key behind ``url``, or ``None`` if the URL is not ours."""
+        prefix = f"{self.base_url}/"
+        if not url.startswith(prefix):
+            return None
+        key = url[len(prefix) :]
+        if not key or ".." in key.split("/"):
+            return None
+        return key
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    def read(self, key: str, length: int | None = None) -> bytes:
+        """Object bytes, or only the first ``length`` of them."""
+        raise NotImplementedError
+
+    def iter_chunks(self, key: str, chunk_size: int) -> Iterator[bytes]:
+        """Object bytes in order, ``chunk_size`` at a time, never all at once."""
+        raise NotImplementedError
+
+    def save_file(self, key: str, path: Path, content_type: str | None = None) -> None:
+        """Store the local file at ``path`` under ``key``; the file is consumed."""
+        raise NotImplementedError
+
+    def save_bytes(
+        self, key: str, data: bytes, content_type: str | None = None
+    ) -> None:
+        raise NotImplementedError
+
+    def touch(self, key: str) -> None:
+        """Refresh the modification time garbage collection looks at."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def iter_objects(self) -> Iterator[StoredObject]:
+        raise NotImplementedError
+
+    def presign_upload(
+        self, key: str, content_type: str, sha256_hex: str, size: int
+    ) -> PresignedUpload | None:
+        """Direct upload for clients, or ``None`` when bytes must go through the API.
+
+        The upload is only accepted with exactly ``size`` bytes hashing to
+        ``sha256_hex``; the caller checks ``size`` against the upload limit.
+        """
+        return None
+
+
+class LocalStorage(MediaStorage):
+    """Files under ``media_root``, served by StaticFiles/nginx at ``media_base_url``."""
+
+    @property
+    def root(self) -> Path:
+        return Path(settings.media_root)
+
+    @property
+    def staging_dir(self) -> Path:  # type: ignore[override]
+        self.root.mkdir(parents=True, exist_ok=True)
+        return self.root
+
+    @property
+    def base_url(self) -> str:
+        return settings.media_base_url
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def size(self, key: str) -> int:
+        return self._path(key).stat().st_size
+
+    def read(self, key: str, length: int | None = None) -> bytes:
+        with self._path(key).open("rb") as source:
+            return source.read(-1 if length is None else length)
+
+    def iter_chunks(self, key: str, chunk_size: int) -> Iterator[bytes]:
+        with self._path(key).open("rb") as source:
+            while chunk := source.read(chunk_size):
+                yield chunk
+
+    def save_file(self, key: str, path: Path, content_type: str | None = None) -> None:
+        destination = self._path(key)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        if os.name != "nt":
+            os.chmod(path, 0o644)
+        # Same filesystem as the staging dir, so readers never see a partial file.
+        os.replace(path, destination)
+
+    def save_bytes(
+        self, key: str, data: bytes, content_type: str | None = None
+    ) -> None:
+        destination = self._path(key)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(
+            dir=destination.parent, prefix=".tmp-", suffix=destination.suffix
+        )
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            self.save_file(key, Path(tmp_name), content_type)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def touch(self, key: str) -> None:
+        os.utime(self._path(key))
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def iter_objects(self) -> Iterator[StoredObject]:
+        root = self.root
+        if not root.is_dir():
+            return
+        for path in root.rglob("*"):
+            if not path.is_file():
+                continue
+            stat = path.stat()
+            yield StoredObject(
+                key=path.relative_to(root).as_posix(),
+                size=stat.st_size,
+                modified_at=datetime.fromtimestamp(stat.st_mtime, tz=UTC),
+            )
+
+
+class S3Storage(MediaStorage):
+    """S3-compatible bucket (AWS, MinIO, ...); clients can upload to it directly."""
+
+    def __init__(self, client: Any | None = None) -> None:
+        if client is None:
+            import boto3
+            from botocore.config import Config
+
+            client = boto3.client(
+                "s3",
+                endpoint_url=settings.s3_endpoint_url,
+                region_name=settings.s3_region,
+                aws_access_key_id=settings.s3_access_key,
+                aws_secret_access_key=settings.s3_secret_key,
+                config=Config(
+                    signature_version="s3v4",
+                    max_pool_connections=settings.s3_max_connections,
+                ),
+            )
+        if not settings.s3_key_prefix.strip("/"):
+            raise StorageError(
+                "S3_KEY_PREFIX must name a key prefix of its own in the bucket"
+            )
+        self._client = client
+        self.bucket = settings.s3_bucket
+        self.prefix = settings.s3_key_prefix
+
+    @property
+    def base_url(self) -> str:
+        if settings.s3_public_base_url:
+            return settings.s3_public_base_url.rstrip("/")
+        endpoint = (
+            settings.s3_endpoint_url or f"https://s3.{settings.s3_region}.amazonaws.com"
+        ).rstrip("/")
+        return f"{endpoint}/{self.bucket}/{self.prefix}".rstrip("/")
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}" if self.prefix else key
+
+    def _head(self, key: str) -> dict[str, Any] | None:
+        from botocore.exceptions import ClientError
+
+        try:
+            head: dict[str, Any] = self._client.head_object(
+                Bucket=self.bucket, Key=self._object_key(key)
+            )
+            return head
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in {
+                "404",
+                "NoSuchKey",
+                "NotFound",
+            }:
+                return None
+            raise StorageError(str(exc)) from exc
+
+    def exists(self, key: str) -> bool:
+        return self._head(key) is not None
+
+    def size(self, key: str) -> int:
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return int(head["ContentLength"])
+
+    def read(self, key: str, length: int | None = None) -> bytes:
+        params: dict[str, Any] = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        if length is not None:
+            params["Range"] = f"bytes=0-{max(length - 1, 0)}"
+        data: bytes = self._client.get_object(**params)["Body"].read()
+        return data
+
+    def iter_chunks(self, key: str, chunk_size: int) -> Iterator[bytes]:
+        body = self._client.get_object(Bucket=self.bucket, Key=self._object_key(key))[
+            "Body"
+        ]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def save_file(self, key: str, path: Path, content_type: str | None = None) -> None:
+        try:
+            self._client.upload_file(
+                str(path),
+                self.bucket,
+                self._object_key(key),
+                ExtraArgs={
+                    "ContentType": content_type or guess_content_type(key),
+                    "CacheControl": IMMUTABLE_CACHE_CONTROL,
+                },
+            )
+        finally:
+            path.unlink(missing_ok=True)
+
+    def save_bytes(
+        self, key: str, data: bytes, content_type: str | None = None
+    ) -> None:
+        self._client.put_object(
+            Bucket=self.bucket,
+            Key=self._object_key(key),
+            Body=data,
+            ContentType=content_type or guess_content_type(key),
+            CacheControl=IMMUTABLE_CACHE_CONTROL,
+        )
+
+    def touch(self, key: str) -> None:
+        object_key = self._object_key(key)
+        head = self._head(key)
+        if head is None:
+            return
+        # A metadata-replacing self-copy is the only way to bump LastModified.
+        self._client.copy_object(
+            Bucket=self.bucket,
+            Key=object_key,
+            CopySource={"Bucket": self.bucket, "Key": object_key},
+            MetadataDirective="REPLACE",
+            ContentType=head.get("ContentType") or guess_content_type(key),
+            CacheControl=IMMUTABLE_CACHE_CONTROL,
+        )
+
+    def delete(self, key: str) -> None:
+        self._client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def iter_objects(self) -> Iterator[StoredObject]:
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                yield StoredObject(
+                    key=item["Key"][len(self.prefix) :],
+                    size=int(item["Size"]),
+                    modified_at=item["LastModified"],
+                )
+
+    def presign_upload(
+        self, key: str, content_type: str, sha256_hex: str, size: int
+    ) -> PresignedUpload:
+        checksum = base64.b64encode(bytes.fromhex(sha256_hex)).decode()
+        url = self._client.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self._object_key(key),
+                "ContentType": content_type,
+                "CacheControl": IMMUTABLE_CACHE_CONTROL,
+                "ChecksumSHA256": checksum,
+                # Signed, so the bucket rejects a body of any other length; clients
+                # send it anyway, as browsers don't let scripts set it.
+                "ContentLength": size,
+            },
+            ExpiresIn=settings.s3_presign_expires_seconds,
+        )
+        return PresignedUpload(
+            url=url,
+            headers={
+                "Content-Type": content_type,
+                "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+                "x-amz-checksum-sha256": checksum,
+            },
+            expires_in=settings.s3_presign_expires_seconds,
+        )
+
+
+_storage: MediaStorage | None = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> MediaStorage:
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if settings.media_storage == "s3":
+                    _storage = S3Storage()
+                elif settings.media_storage == "local":
+                    _storage = LocalStorage()
+                else:
+                    raise StorageError(
+                        f"Unknown media storage backend: {settings.media_storage}"
+                    )
+    return _storage
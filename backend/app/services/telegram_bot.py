@@ -1,36 +1,332 @@
 from __future__ import annotations
 
 import json
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential
+from loguru import logger
+from redis.exceptions import RedisError
+from tenacity import (
+    Retrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
 
 from app.config import settings
+from app.utils.rate_limit import GCRA_SCRIPT
+from app.utils.redis import get_redis
 
-API_BASE = f"https://api.telegram.org/bot{settings.bot_token}"
+API_BASE = f"{settings.telegram_api_base}/bot{settings.bot_token}"
+GLOBAL_RATE_KEY = "rl:telegram:global"
+
+# Moves the shared GCRA key's TAT past a flood wait, so no process sends until it ends.
+PAUSE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local tat = now + tonumber(ARGV[1]) + tonumber(ARGV[2])
+if tonumber(redis.call('GET', KEYS[1]) or 0) < tat then
+  redis.call('SET', KEYS[1], tat, 'PX', math.ceil(tat - now))
+end
+return 1
+"""
 
 
 class TelegramBotError(Exception):
     pass
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=5))
-def send_message(chat_id: int, text: str, reply_markup: dict[str, Any] | None = None) -> dict[str, Any]:
-    payload: dict[str, Any] = {
-        "chat_id": chat_id,
-        "text": text,
-        "parse_mode": "HTML",
-        "disable_web_page_preview": True,
-    }
-    if reply_markup:
-        payload["reply_markup"] = json.dumps(reply_markup)
-
-    with httpx.Client(timeout=10.0) as client:
-        response = client.post(f"{API_BASE}/sendMessage", data=payload)
-        if response.status_code >= 400:
-            raise TelegramBotError(f"Telegram API error: {response.status_code} {response.text}")
-        data = response.json()
-        if not data.get("ok"):
-            raise TelegramBotError(f"Telegram API failure: {data}")
-        return data
+class TelegramRateLimitedError(TelegramBotError):
+    def __init__(self, retry_after: float, message: str) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``pause`` blocks all callers for flood-wait periods."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, self._clock() + seconds)
+
+
+class SharedTokenBucket:
+    """``TokenBucket`` whose budget lives in Redis (GCRA), shared by every process.
+
+    Celery runs several sender processes; a per-process bucket would let each
+    of them send at the full rate. While Redis is unavailable the local
+    ``fallback`` bucket paces this process alone.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        rate: float,
+        capacity: float | None = None,
+        fallback: TokenBucket | None = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.key = key
+        self.rate = rate
+        self.emission_ms = 1000 / rate
+        self.tolerance_ms = self.emission_ms * (
+            capacity if capacity is not None else max(rate, 1.0)
+        )
+        self._fallback = fallback or TokenBucket(rate, capacity, sleep=sleep)
+        self._sleep = sleep
+        self._client = None
+        self._scripts: tuple[Any, Any] | None = None
+
+    def _registered(self) -> tuple[Any, Any]:
+        client = get_redis()
+        if self._scripts is None or client is not self._client:
+            self._client = client
+            self._scripts = (
+                client.register_script(GCRA_SCRIPT),
+                client.register_script(PAUSE_SCRIPT),
+            )
+        return self._scripts
+
+    def acquire(self) -> None:
+        while True:
+            try:
+                gcra, _ = self._registered()
+                allowed, _, retry_after_ms, _ = gcra(
+                    keys=[self.key], args=[self.emission_ms, self.tolerance_ms]
+                )
+            except RedisError as exc:
+                logger.warning(
+                    "Shared Telegram rate limit unavailable, pacing locally: {}", exc
+                )
+                self._fallback.acquire()
+                return
+            if allowed:
+                return
+            self._sleep(int(retry_after_ms) / 1000)
+
+    def pause(self, seconds: float) -> None:
+        self._fallback.pause(seconds)
+        try:
+            _, pause = self._registered()
+            pause(keys=[self.key], args=[seconds * 1000, self.tolerance_ms])
+        except RedisError as exc:
+            logger.warning("Shared Telegram flood wait not recorded: {}", exc)
+
+
+class ChatThrottle:
+    """Reserves per-chat send slots at most one per ``interval`` seconds."""
+
+    MAX_TRACKED_CHATS = 10_000
+
+    def __init__(
+        self,
+        interval: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.interval = interval
+        self._clock = clock
+        self._sleep = sleep
+        self._next_slot: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, chat_id: int) -> None:
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._next_slot.get(chat_id, now))
+            self._next_slot[chat_id] = slot + self.interval
+            if len(self._next_slot) > self.MAX_TRACKED_CHATS:
+                self._next_slot = {
+                    key: value for key, value in self._next_slot.items() if value > now
+                }
+        if slot > now:
+            self._sleep(slot - now)
+
+    def defer(self, chat_id: int, seconds: float) -> None:
+        with self._lock:
+            self._next_slot[chat_id] = max(
+                self._next_slot.get(chat_id, 0.0), self._clock() + seconds
+            )
+
+
+def _retry_after(response: httpx.Response) -> float:
+    try:
+        parameters = response.json().get("parameters") or {}
+        return float(parameters["retry_after"])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        try:
+            return float(response.headers.get("Retry-After", 1))
+        except ValueError:
+            return 1.0
+
+
+class TelegramSender:
+    """Long-lived Bot API client with keep-alive pooling and flood control.
+
+    One instance per process: the global bucket, shared through Redis, keeps
+    the bot under Telegram's broadcast limit across all worker processes, the
+    chat throttle under the per-chat limit, and a 429 ``retry_after`` pauses
+    every sender, not only the thread that hit it.
+    """
+
+    def __init__(
+        self,
+        api_base: str = API_BASE,
+        client: httpx.Client | None = None,
+        global_rate: float = settings.telegram_global_rate,
+        per_chat_interval: float = settings.telegram_per_chat_interval,
+        max_retries: int = settings.telegram_max_retries,
+        concurrency: int = settings.telegram_send_concurrency,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        global_bucket: TokenBucket | SharedTokenBucket | None = None,
+    ) -> None:
+        self.api_base = api_base
+        self._client = client or httpx.Client(
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=settings.telegram_max_connections,
+                max_keepalive_connections=settings.telegram_max_connections,
+            ),
+        )
+        self._bucket = global_bucket or SharedTokenBucket(
+            GLOBAL_RATE_KEY,
+            global_rate,
+            fallback=TokenBucket(global_rate, clock=clock, sleep=sleep),
+            sleep=sleep,
+        )
+        self._chats = ChatThrottle(per_chat_interval, clock=clock, sleep=sleep)
+        self._max_retries = max_retries
+        self._concurrency = concurrency
+        self._retrying = Retrying(
+            retry=retry_if_exception_type(httpx.TransportError),
+            stop=stop_after_attempt(max_retries + 1),
+            wait=wait_exponential(multiplier=1, min=1, max=5),
+            sleep=sleep,
+            reraise=True,
+        )
+
+    def _post(self, method: str, payload: dict[str, Any]) -> httpx.Response:
+        return self._retrying(
+            self._client.post, f"{self.api_base}/{method}", data=payload
+        )
+
+    def send_message(
+        self, chat_id: int, text: str, reply_markup: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        payload: dict[str, Any] = {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": "HTML",
+            "disable_web_page_preview": True,
+        }
+        if reply_markup:
+            payload["reply_markup"] = json.dumps(reply_markup)
+
+        for attempt in range(self._max_retries + 1):
+            self._chats.acquire(chat_id)
+            self._bucket.acquire()
+            response = self._post("sendMessage", payload)
+            if response.status_code == 429:
+                retry_after = _retry_after(response)
+                self._bucket.pause(retry_after)
+                self._chats.defer(chat_id, retry_after)
+                if attempt == self._max_retries:
+                    raise TelegramRateLimitedError(
+                        retry_after,
+                        f"Telegram flood control: retry after {retry_after}s",
+                    )
+                continue
+            if response.status_code >= 400:
+                raise TelegramBotError(
+                    f"Telegram API error: {response.status_code} {response.text}"
+                )
+            data = response.json()
+            if not data.get("ok"):
+                raise TelegramBotError(f"Telegram API failure: {data}")
+            return data
+        raise TelegramBotError("Telegram send retries exhausted")
+
+    def send_many(
+        self,
+        chat_ids: Iterable[int],
+        text: str,
+        reply_markup: dict[str, Any] | None = None,
+    ) -> dict[int, dict[str, Any] | TelegramBotError]:
+        """Send the same message to several chats; failures are returned, not raised."""
+
+        def _send(chat_id: int) -> tuple[int, dict[str, Any] | TelegramBotError]:
+            try:
+                return chat_id, self.send_message(chat_id, text, reply_markup)
+            except TelegramBotError as exc:
+                return chat_id, exc
+            except httpx.HTTPError as exc:
+                return chat_id, TelegramBotError(f"Telegram transport error: {exc}")
+
+        unique_ids = list(dict.fromkeys(chat_ids))
+        with ThreadPoolExecutor(max_workers=max(1, self._concurrency)) as executor:
+            return dict(executor.map(_send, unique_ids))
+
+    def close(self) -> None:
+        self._client.close()
+
+
+_sender: TelegramSender | None = None
+_sender_lock = threading.Lock()
+
+
+def get_sender() -> TelegramSender:
+    global _sender
+    if _sender is None:
+        with _sender_lock:
+            if _sender is None:
+                _sender = TelegramSender()
+    return _sender
+
+
+def send_message(
+    chat_id: int, text: str, reply_markup: dict[str, Any] | None = None
+) -> dict[str, Any]:
+    return get_sender().send_message(chat_id, text, reply_markup)
+
+
+def send_many(
+    chat_ids: Iterable[int], text: str, reply_markup: dict[str, Any] | None = None
+) -> dict[int, dict[str, Any] | TelegramBotError]:
+    return get_sender().send_many(chat_ids, text, reply_markup)
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Sequence
+
+from loguru import logger
+from redis.exceptions import RedisError
+from sqlalchemy import Select, select
+from sqlalchemy.orm import Session, selectinload
+
+from app.config import settings
+from app.models.enums import WishlistVisibility
+from app.models.subscription import Subscription
+from app.models.wish import Wish
+from app.models.wishlist import Wishlist
+from app.utils.pagination import from_micros, to_micros
+from app.utils.redis import get_redis
+
+FEED_VISIBILITIES = (WishlistVisibility.PUBLIC, WishlistVisibility.UNLISTED)
+
+# Placeholder member so a warm timeline with no wishes still exists in Redis.
+# Wish ids start at 1, so "0" never collides with a real entry.
+SENTINEL_MEMBER = "0"
+
+
+def timeline_key(user_id: int) -> str:
+    return f"feed:{user_id}"
+
+
+def _score(wish: Wish) -> int:
+    # Integer microseconds stay exact in a Redis double and match the feed cursor.
+    return to_micros(wish.updated_at)
+
+
+def _visible_wishes_query(
+    owner_ids: Iterable[int] | Select[int],
+) -> Select[Wish]:
+    """Feed-visible wishes of ``owner_ids``: a list of ids, or a subquery of them."""
+    return (
+        select(Wish)
+        .join(Wishlist)
+        .options(selectinload(Wish.wishlist).selectinload(Wishlist.owner))
+        .where(
+            Wishlist.owner_id.in_(owner_ids),
+            Wishlist.visibility.in_(FEED_VISIBILITIES),
+        )
+        .order_by(Wish.updated_at.desc(), Wish.id.desc())
+    )
+
+
+def load_recent_wishes(
+    session: Session,
+    follower_id: int,
+    limit: int,
+    before: tuple[int, int] | None = None,
+) -> Sequence[Wish]:
+    """SQL source of truth for a follower's feed, newest first.
+
+    ``before`` is an exclusive ``(score, wish_id)`` keyset bound.
+    """
+    target_ids = select(Subscription.target_user_id).where(
+        Subscription.follower_id == follower_id
+    )
+    stmt = _visible_wishes_query(target_ids)
+    if before is not None:
+        updated_at = from_micros(before[0])
+        stmt = stmt.where(
+            (Wish.updated_at < updated_at)
+            | ((Wish.updated_at == updated_at) & (Wish.id < before[1]))
+        )
+    return session.scalars(stmt.limit(limit)).all()
+
+
+def read_page(
+    follower_id: int,
+    limit: int,
+    before: tuple[int, int] | None = None,
+) -> list[tuple[int, int]] | None:
+    """Return up to ``limit`` ``(wish_id, score)`` entries older than ``before``.
+
+    ``None`` means the timeline cannot answer: it is cold, or the page runs past
+    the trimmed tail and has to come from SQL.
+    """
+    key = timeline_key(follower_id)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.exists(key)
+        pipe.zcard(key)
+        if before is None:
+            pipe.zrevrange(key, 0, limit, withscores=True)
+        else:
+            # Ties on the cursor score are resolved by id, the rest is strictly older.
+            pipe.zrevrangebyscore(key, before[0], before[0], withscores=True)
+            pipe.zrevrangebyscore(
+                key, f"({before[0]}", "-inf", start=0, num=limit + 1, withscores=True
+            )
+        exists, size, *ranges = pipe.execute()
+    except RedisError as exc:
+        logger.warning("Feed timeline read failed for user {}: {}", follower_id, exc)
+        return None
+    if not exists:
+        return None
+
+    entries: list[tuple[int, int]] = []
+    for members in ranges:
+        for member, score in members:
+            wish_id = int(member)
+            if wish_id == int(SENTINEL_MEMBER):
+                continue
+            if before is not None and int(score) == before[0] and wish_id >= before[1]:
+                continue
+            entries.append((wish_id, int(score)))
+    entries.sort(key=lambda entry: (entry[1], entry[0]), reverse=True)
+
+    if len(entries) < limit and size >= settings.feed_timeline_size:
+        return None
+    return entries[:limit]
+
+
+def hydrate(session: Session, wish_ids: Sequence[int]) -> list[Wish]:
+    """Load timeline entries in one query, in timeline order, dropping stale ids."""
+    if not wish_ids:
+        return []
+    stmt = (
+        select(Wish)
+        .join(Wishlist)
+        .options(selectinload(Wish.wishlist).selectinload(Wishlist.owner))
+        .where(Wish.id.in_(wish_ids), Wishlist.visibility.in_(FEED_VISIBILITIES))
+    )
+    wishes_map = {wish.id: wish for wish in session.scalars(stmt).all()}
+    return [wishes_map[wish_id] for wish_id in wish_ids if wish_id in wishes_map]
+
+
+def backfill(session: Session, follower_id: int) -> Sequence[Wish]:
+    """Rebuild a follower's timeline from SQL and return the loaded wishes."""
+    wishes = load_recent_wishes(session, follower_id, settings.feed_timeline_size)
+    store(follower_id, wishes)
+    return wishes
+
+
+def store(follower_id: int, wishes: Sequence[Wish]) -> None:
+    """Replace a follower's timeline with ``wishes`` from ``load_recent_wishes``."""
+    key = timeline_key(follower_id)
+    mapping: dict[str, int] = {SENTINEL_MEMBER: 0}
+    mapping.update({str(wish.id): _score(wish) for wish in wishes})
+    try:
+        pipe = get_redis().pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.zadd(key, mapping)
+        pipe.expire(key, settings.feed_timeline_ttl_seconds)
+        pipe.execute()
+    except RedisError as exc:
+        logger.warning(
+            "Feed timeline backfill failed for user {}: {}", follower_id, exc
+        )
+
+
+def _push(keys: Sequence[str], mapping: dict[str, int]) -> None:
+    """Add entries to the timelines among ``keys`` that are already warm."""
+    if not keys or not mapping:
+        return
+    redis = get_redis()
+    pipe = redis.pipeline(transaction=False)
+    for key in keys:
+        pipe.exists(key)
+    warm_keys = [
+        key for key, exists in zip(keys, pipe.execute(), strict=True) if exists
+    ]
+    if not warm_keys:
+        return
+    pipe = redis.pipeline(transaction=False)
+    for key in warm_keys:
+        pipe.zadd(key, mapping)
+        pipe.zremrangebyrank(key, 0, -settings.feed_timeline_size - 1)
+    pipe.execute()
+
+
+def fan_out(session: Session, wish: Wish) -> None:
+    """Write ``wish`` onto the warm timelines of everyone following its owner.
+
+    Cold timelines are left alone; they are rebuilt from SQL on the next read.
+    """
+    wishlist = wish.wishlist
+    if not wishlist or wishlist.visibility not in FEED_VISIBILITIES:
+        return
+    follower_ids = session.scalars(
+        select(Subscription.follower_id).where(
+            Subscription.target_user_id == wishlist.owner_id
+        )
+    ).all()
+    keys = [timeline_key(follower_id) for follower_id in follower_ids]
+    try:
+        _push(keys, {str(wish.id): _score(wish)})
+    except RedisError as exc:
+        logger.warning("Feed fan-out failed for wish {}: {}", wish.id, exc)
+
+
+def add_author(session: Session, follower_id: int, target_user_id: int) -> None:
+    """Merge a newly followed user's recent wishes into a warm timeline."""
+    wishes = session.scalars(
+        _visible_wishes_query([target_user_id]).limit(settings.feed_timeline_size)
+    ).all()
+    try:
+        _push(
+            [timeline_key(follower_id)], {str(wish.id): _score(wish) for wish in wishes}
+        )
+    except RedisError as exc:
+        logger.warning("Feed backfill failed for user {}: {}", follower_id, exc)
+
+
+def remove_author(session: Session, follower_id: int, target_user_id: int) -> None:
+    """Drop an unfollowed user's wishes from a timeline."""
+    wish_ids = session.scalars(
+        select(Wish.id).join(Wishlist).where(Wishlist.owner_id == target_user_id)
+    ).all()
+    if not wish_ids:
+        return
+    try:
+        get_redis().zrem(
+            timeline_key(follower_id), *[str(wish_id) for wish_id in wish_ids]
+        )
+    except RedisError as exc:
+        logger.warning("Feed timeline cleanup failed for user {}: {}", follower_id, exc)
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import json
+from dataclasses import asdict, dataclass, fields
+from typing import cast
+
+from loguru import logger
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.user import User
+from app.utils.redis import get_async_redis, get_binary_redis
+from app.utils.ttl_cache import TTLCache
+
+CACHE_PREFIX = "user:"
+
+
+@dataclass(frozen=True, slots=True)
+class CachedUser:
+    """The read-only profile of a session user; write paths load ``User`` itself."""
+
+    id: int
+    tg_username: str | None
+    custom_username: str | None
+    display_name: str
+    avatar_url: str | None
+    bio: str | None
+    locale: str
+
+
+_FIELDS = tuple(field.name for field in fields(CachedUser))
+_PROJECTION = select(*(getattr(User, name) for name in _FIELDS))
+
+_local: TTLCache[int, CachedUser] = TTLCache(
+    maxsize=settings.user_cache_local_size, ttl=settings.user_cache_local_ttl_seconds
+)
+_counts = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+
+
+def cache_key(user_id: int) -> str:
+    return f"{CACHE_PREFIX}{user_id}"
+
+
+def _dump(user: CachedUser) -> str:
+    return json.dumps(asdict(user))
+
+
+def _load(raw: bytes) -> CachedUser:
+    stored = json.loads(raw)
+    return CachedUser(**{name: stored[name] for name in _FIELDS})
+
+
+def _redis_get(user_id: int) -> CachedUser | None:
+    try:
+        raw = cast(bytes | None, get_binary_redis().get(cache_key(user_id)))
+    except RedisError as exc:
+        logger.warning("User cache read failed for user {}: {}", user_id, exc)
+        return None
+    return _load(raw) if raw else None
+
+
+def _redis_set(user: CachedUser) -> None:
+    try:
+        get_binary_redis().set(
+            cache_key(user.id), _dump(user), ex=settings.user_cache_ttl_seconds
+        )
+    except RedisError as exc:
+        logger.warning("User cache write failed for user {}: {}", user.id, exc)
+
+
+def _redis_delete(user_id: int) -> None:
+    try:
+        get_binary_redis().delete(cache_key(user_id))
+    except RedisError as exc:
+        logger.warning("User cache invalidation failed for user {}: {}", user_id, exc)
+
+
+async def _redis_get_async(user_id: int) -> CachedUser | None:
+    try:
+        raw = await get_async_redis().get(cache_key(user_id))
+    except RedisError as exc:
+        logger.warning("User cache read failed for user {}: {}", user_id, exc)
+        return None
+    return _load(raw) if raw else None
+
+
+async def _redis_set_async(user: CachedUser) -> None:
+    try:
+        await get_async_redis().set(
+            cache_key(user.id), _dump(user), ex=settings.user_cache_ttl_seconds
+        )
+    except RedisError as exc:
+        logger.warning("User cache write failed for user {}: {}", user.id, exc)
+
+
+async def _redis_delete_async(user_id: int) -> None:
+    try:
+        await get_async_redis().delete(cache_key(user_id))
+    except RedisError as exc:
+        logger.warning("User cache invalidation failed for user {}: {}", user_id, exc)
+
+
+def get_user(db: Session, user_id: int) -> CachedUser | None:
+    """A user's profile from the local LRU, then Redis, then the database.
+
+    The result is a detached snapshot: to change the user, load the ``User``
+    row in the request's session and call :func:`invalidate` after commit.
+    """
+    user = _local.get(user_id)
+    if user is not None:
+        _counts["local_hits"] += 1
+        return user
+    user = _redis_get(user_id)
+    if user is not None:
+        _counts["redis_hits"] += 1
+        _local.set(user_id, user)
+        return user
+
+    _counts["misses"] += 1
+    row = db.execute(_PROJECTION.where(User.id == user_id)).one_or_none()
+    if row is None:
+        return None
+    user = CachedUser(**row._mapping)
+    _local.set(user_id, user)
+    _redis_set(user)
+    return user
+
+
+async def get_user_async(db: AsyncSession, user_id: int) -> CachedUser | None:
+    """Async counterpart of :func:`get_user`."""
+    user = _local.get(user_id)
+    if user is not None:
+        _counts["local_hits"] += 1
+        return user
+    user = await _redis_get_async(user_id)
+    if user is not None:
+        _counts["redis_hits"] += 1
+        _local.set(user_id, user)
+        return user
+
+    _counts["misses"] += 1
+    row = (await db.execute(_PROJECTION.where(User.id == user_id))).one_or_none()
+    if row is None:
+        return None
+    user = CachedUser(**row._mapping)
+    _local.set(user_id, user)
+    await _redis_set_async(user)
+    return user
+
+
+def invalidate(user_id: int) -> None:
+    """Drop a user after a committed change.
+
+    Other processes may keep serving their local copy for up to
+    ``user_cache_local_ttl_seconds``.
+    """
+    _local.pop(user_id)
+    _redis_delete(user_id)
+
+
+async def invalidate_async(user_id: int) -> None:
+    _local.pop(user_id)
+    await _redis_delete_async(user_id)
+
+
+def stats() -> dict[str, float]:
+    """Lookups served by each tier in this process and the overall hit ratio."""
+    total = sum(_counts.values())
+    hits = _counts["local_hits"] + _counts["redis_hits"]
+    return {
+        **{key: float(value) for key, value in _counts.items()},
+        "hit_ratio": hits / total if total else 0.0,
+    }
+
+
+def reset() -> None:
+    _local.clear()
+    for key in _counts:
+        _counts[key] = 0
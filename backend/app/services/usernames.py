@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+from loguru import logger
+from redis.exceptions import RedisError
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.user import User
+from app.services import user_cache
+from app.services.user_cache import CachedUser
+from app.utils.redis import get_async_redis, get_binary_redis
+from app.utils.ttl_cache import TTLCache
+
+CACHE_PREFIX = "username:"
+
+_local: TTLCache[str, int] = TTLCache(
+    maxsize=settings.user_cache_local_size, ttl=settings.user_cache_local_ttl_seconds
+)
+
+
+def normalize(username: str) -> str:
+    return username.lower()
+
+
+def cache_key(username: str) -> str:
+    return f"{CACHE_PREFIX}{normalize(username)}"
+
+
+def _lookup(lowered: str):
+    # Matches the lower() expression indexes on both columns (migration 0006).
+    return (
+        select(User.id)
+        .where(
+            or_(
+                func.lower(User.tg_username) == lowered,
+                func.lower(User.custom_username) == lowered,
+            )
+        )
+        .limit(1)
+    )
+
+
+def _matches(user: CachedUser | None, lowered: str) -> bool:
+    return user is not None and lowered in {
+        normalize(name) for name in (user.tg_username, user.custom_username) if name
+    }
+
+
+def _parse_id(identifier: str) -> int | None:
+    # Telegram usernames start with a letter, so an all-digit identifier is a user id.
+    try:
+        return int(identifier)
+    except ValueError:
+        return None
+
+
+def resolve(db: Session, identifier: str) -> CachedUser | None:
+    """The user behind a profile link: a numeric id, Telegram or custom username.
+
+    Usernames are matched case-insensitively and mapped to ids through the local
+    cache and Redis; the user row itself comes from ``user_cache``.
+    """
+    user_id = _parse_id(identifier)
+    if user_id is not None:
+        return user_cache.get_user(db, user_id)
+
+    lowered = normalize(identifier)
+    user_id = _local.get(lowered)
+    if user_id is None:
+        try:
+            raw = get_binary_redis().get(cache_key(lowered))
+        except RedisError as exc:
+            logger.warning("Username cache read failed for {}: {}", lowered, exc)
+            raw = None
+        user_id = int(raw) if raw else None
+    if user_id is not None:
+        user = user_cache.get_user(db, user_id)
+        # A renamed user may still be cached in another process for a few seconds.
+        if _matches(user, lowered):
+            _local.set(lowered, user_id)
+            return user
+
+    user_id = db.scalar(_lookup(lowered))
+    if user_id is None:
+        return None
+    _remember(lowered, user_id)
+    return user_cache.get_user(db, user_id)
+
+
+async def resolve_async(db: AsyncSession, identifier: str) -> CachedUser | None:
+    """Async counterpart of :func:`resolve`."""
+    user_id = _parse_id(identifier)
+    if user_id is not None:
+        return await user_cache.get_user_async(db, user_id)
+
+    lowered = normalize(identifier)
+    user_id = _local.get(lowered)
+    if user_id is None:
+        try:
+            raw = await get_async_redis().get(cache_key(lowered))
+        except RedisError as exc:
+            logger.warning("Username cache read failed for {}: {}", lowered, exc)
+            raw = None
+        user_id = int(raw) if raw else None
+    if user_id is not None:
+        user = await user_cache.get_user_async(db, user_id)
+        if _matches(user, lowered):
+            _local.set(lowered, user_id)
+            return user
+
+    user_id = await db.scalar(_lookup(lowered))
+    if user_id is None:
+        return None
+    await _remember_async(lowered, user_id)
+    return await user_cache.get_user_async(db, user_id)
+
+
+def _remember(lowered: str, user_id: int) -> None:
+    _local.set(lowered, user_id)
+    try:
+        get_binary_redis().set(
+            cache_key(lowered), user_id, ex=settings.user_cache_ttl_seconds
+        )
+    except RedisError as exc:
+        logger.warning("Username cache write failed for {}: {}", lowered, exc)
+
+
+async def _remember_async(lowered: str, user_id: int) -> None:
+    _local.set(lowered, user_id)
+    try:
+        await get_async_redis().set(
+            cache_key(lowered), user_id, ex=settings.user_cache_ttl_seconds
+        )
+    except RedisError as exc:
+        logger.warning("Username cache write failed for {}: {}", lowered, exc)
+
+
+def _names(usernames: Iterable[str | None]) -> list[str]:
+    return sorted({normalize(name) for name in usernames if name})
+
+
+def invalidate(*usernames: str | None) -> None:
+    """Forget old and new handles after a committed username change."""
+    names = _names(usernames)
+    for name in names:
+        _local.pop(name)
+    if not names:
+        return
+    try:
+        get_binary_redis().delete(*(cache_key(name) for name in names))
+    except RedisError as exc:
+        logger.warning("Username cache invalidation failed for {}: {}", names, exc)
+
+
+async def invalidate_async(*usernames: str | None) -> None:
+    names = _names(usernames)
+    for name in names:
+        _local.pop(name)
+    if not names:
+        return
+    try:
+        await get_async_redis().delete(*(cache_key(name) for name in names))
+    except RedisError as exc:
+        logger.warning("Username cache invalidation failed for {}: {}", names, exc)
+
+
+def reset() -> None:
+    _local.clear()
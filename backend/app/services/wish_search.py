@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from sqlalchemy import ColumnElement, Float, cast, func, literal, literal_column, or_
+from sqlalchemy.dialects.postgresql import TSQUERY, TSVECTOR
+
+from app.models.wish import Wish
+
+# Our users write in Russian and English; titles and descriptions are indexed in both.
+SEARCH_CONFIGS = ("russian", "english")
+
+# Generated tsvector column, Postgres only (migration 0007), hence not mapped on Wish.
+search_vector = literal_column("wishes.search_vector", type_=TSVECTOR)
+
+
+def supports_full_text(dialect_name: str) -> bool:
+    return dialect_name == "postgresql"
+
+
+def _tsquery(q: str) -> ColumnElement:
+    query = func.websearch_to_tsquery(SEARCH_CONFIGS[0], q)
+    for config in SEARCH_CONFIGS[1:]:
+        query = query.op("||", return_type=TSQUERY)(
+            func.websearch_to_tsquery(config, q)
+        )
+    return query
+
+
+def full_text(q: str) -> tuple[ColumnElement[bool], ColumnElement[float]]:
+    """Filter and rank for ``q``: stemmed words in title or description, or a title
+    that nearly contains ``q`` (``<%``, trigram word similarity), so typos still match.
+
+    Both predicates are served by GIN indexes.
+    """
+    tsquery = _tsquery(q)
+    title_like = literal(q).op("<%", is_comparison=True)(Wish.title)
+    clause = or_(search_vector.op("@@", is_comparison=True)(tsquery), title_like)
+    rank = cast(
+        func.ts_rank_cd(search_vector, tsquery) + func.word_similarity(q, Wish.title),
+        Float,
+    )
+    return clause, rank
+
+
+def substring(q: str) -> ColumnElement[bool]:
+    """Case-insensitive substring match, for databases without full-text search."""
+    like = f"%{q.lower()}%"
+    return func.lower(Wish.title).like(like) | func.lower(Wish.description).like(like)
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import secrets
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.models.enums import WishlistVisibility
+from app.utils import http_cache
+from app.utils.redis import get_async_redis, get_binary_redis
+
+CACHE_PREFIX = "wishlist:page:"
+LOCK_PREFIX = "wishlist:page-lock:"
+
+# Values are "<version>\n<visibility>\n<wishlist id>\n<json>" for a rendered page, or
+# just "<version>\n" for a tombstone left by a write. A value only replaces an older
+# one, so a render that read pre-commit or lagging replica data can't be stored
+# over the invalidation of a newer version.
+STORE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+  local newline = string.find(current, '\\n', 1, true)
+  local version = tonumber(string.sub(current, 1, newline - 1))
+  local incoming = tonumber(ARGV[1])
+  if incoming < version or (incoming == version and newline ~= #current) then
+    return 0
+  end
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_scripts: dict[str, tuple[object, object, object]] = {}
+
+
+def page_etag(wishlist_id: int, version: int) -> str:
+    return http_cache.strong_etag("wishlist", wishlist_id, version)
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    """A serialized ``WishlistDetail`` plus what is needed to serve it from cache."""
+
+    owner_id: int
+    wishlist_id: int
+    version: int
+    visibility: WishlistVisibility
+    body: bytes
+
+    @property
+    def etag(self) -> str:
+        return page_etag(self.wishlist_id, self.version)
+
+    def encode(self) -> bytes:
+        return (
+            f"{self.version}\n{self.visibility.value}\n{self.wishlist_id}\n".encode()
+            + self.body
+        )
+
+    @classmethod
+    def decode(cls, owner_id: int, raw: bytes) -> CachedPage | None:
+        parts = raw.split(b"\n", 3)
+        if len(parts) < 4:
+            return None  # tombstone
+        version, visibility, wishlist_id, body = parts
+        return cls(
+            owner_id,
+            int(wishlist_id),
+            int(version),
+            WishlistVisibility(visibility.decode()),
+            body,
+        )
+
+
+def cache_key(owner_id: int) -> str:
+    return f"{CACHE_PREFIX}{owner_id}"
+
+
+def _registered(name: str, client):
+    cached = _scripts.get(name)
+    if cached is None or cached[0] is not client:
+        cached = (
+            client,
+            client.register_script(STORE_SCRIPT),
+            client.register_script(RELEASE_SCRIPT),
+        )
+        _scripts[name] = cached
+    return cached[1], cached[2]
+
+
+def invalidate(versions: dict[int, int]) -> None:
+    """Retire cached pages after a committed write.
+
+    ``versions`` comes from ``wishlist_versions.bump``.
+    """
+    if not versions:
+        return
+    client = get_binary_redis()
+    store, _ = _registered("sync", client)
+    try:
+        for owner_id, version in versions.items():
+            store(
+                keys=[cache_key(owner_id)],
+                args=[version, f"{version}\n", settings.wishlist_cache_ttl_seconds],
+            )
+    except RedisError as exc:
+        logger.warning(
+            "Wishlist cache invalidation failed for owners {}: {}",
+            sorted(versions),
+            exc,
+        )
+
+
+async def get(owner_id: int) -> CachedPage | None:
+    """The owner's page if Redis has it; ``None`` on a miss or a Redis error."""
+    try:
+        raw = await get_async_redis().get(cache_key(owner_id))
+    except RedisError as exc:
+        logger.warning("Wishlist cache read failed for owner {}: {}", owner_id, exc)
+        return None
+    return CachedPage.decode(owner_id, raw) if raw else None
+
+
+async def fetch(
+    owner_id: int, render: Callable[[], Awaitable[CachedPage | None]]
+) -> CachedPage | None:
+    """The owner's page from Redis, rendering it on a miss."""
+    page = await get(owner_id)
+    if page is not None:
+        return page
+    return await fill(owner_id, render)
+
+
+async def fill(
+    owner_id: int, render: Callable[[], Awaitable[CachedPage | None]]
+) -> CachedPage | None:
+    """Render the owner's page after a :func:`get` miss and store it in Redis.
+
+    Only one request per owner renders at a time; the others wait up to
+    ``wishlist_cache_lock_wait_seconds`` for its result before rendering
+    themselves. Callers check ``visibility`` before serving a page. Redis
+    errors fall back to rendering.
+    """
+    client = get_async_redis()
+    store, release = _registered("async", client)
+    key = cache_key(owner_id)
+    lock_key = f"{LOCK_PREFIX}{owner_id}"
+    token = secrets.token_hex(8)
+    try:
+        leader = await client.set(
+            lock_key,
+            token,
+            nx=True,
+            px=int(settings.wishlist_cache_lock_seconds * 1000),
+        )
+    except RedisError as exc:
+        logger.warning("Wishlist cache read failed for owner {}: {}", owner_id, exc)
+        return await render()
+
+    if not leader:
+        deadline = time.monotonic() + settings.wishlist_cache_lock_wait_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            try:
+                raw = await client.get(key)
+            except RedisError:
+                break
+            page = CachedPage.decode(owner_id, raw) if raw else None
+            if page is not None:
+                return page
+        return await render()
+
+    try:
+        page = await render()
+        if page is not None:
+            try:
+                await store(
+                    keys=[key],
+                    args=[
+                        page.version,
+                        page.encode(),
+                        settings.wishlist_cache_ttl_seconds,
+                    ],
+                )
+            except RedisError as exc:
+                logger.warning(
+                    "Wishlist cache write failed for owner {}: {}", owner_id, exc
+                )
+        return page
+    finally:
+        with contextlib.suppress(RedisError):
+            await release(keys=[lock_key], args=[token])
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models.wish import Wish
+from app.models.wishlist import Wishlist
+
+
+def bump(session: Session, wishlist_ids: Iterable[int]) -> dict[int, int]:
+    """Invalidate the ETags of ``wishlist_ids`` as part of the caller's transaction.
+
+    Call it from every write that changes what ``WishlistDetail`` shows: wish
+    edits, reordering, enrichment, image processing, wishlist settings. Returns
+    the new version per owner; pass it to ``wishlist_cache.invalidate`` once the
+    transaction has committed.
+    """
+    ids = sorted(set(wishlist_ids))
+    if not ids:
+        return {}
+    rows = session.execute(
+        update(Wishlist)
+        .where(Wishlist.id.in_(ids))
+        .values(version=Wishlist.version + 1)
+        .returning(Wishlist.owner_id, Wishlist.version)
+        .execution_options(synchronize_session="fetch")
+    )
+    return dict(rows.tuples().all())
+
+
+def bump_for_media_url(session: Session, url: str) -> dict[int, int]:
+    """Bump every wishlist showing ``url`` as a wish image or cover."""
+    wish_lists = select(Wish.wishlist_id).where(Wish.image_url == url)
+    stmt = select(Wishlist.id).where(
+        or_(Wishlist.cover_url == url, Wishlist.id.in_(wish_lists))
+    )
+    return bump(session, session.scalars(stmt))
@@ -1,15 +1,18 @@
 from __future__ import annotations
 
 import os
-from collections.abc import Generator
+import tempfile
+from collections.abc import AsyncGenerator, Generator, Sequence
+from pathlib import Path
+from typing import Any
 
 import fakeredis
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
-from sqlalchemy.pool import StaticPool
-from pathlib import Path
+from sqlalchemy.pool import NullPool, StaticPool
 
 # Ensure env variables are set before importing application modules
 os.environ.setdefault("SECRET_KEY", "test-secret")
@@ -18,13 +21,25 @@ os.environ.setdefault("BOT_TOKEN", "123456:TEST")
 os.environ.setdefault("POSTGRES_HOST", "localhost")
 os.environ.setdefault("TELEGRAM_BOT_NAME", "wishlist_bot_test")
 
-from app.config import settings  # noqa: E402
-from app.db import Base, get_db  # noqa: E402
-from app.main import app  # noqa: E402
-from app.utils import redis as redis_utils  # noqa: E402
-from app.worker import send_notification  # noqa: E402
+from app import relay, worker
+from app.config import settings
+from app.db import (
+    Base,
+    get_async_db,
+    get_async_read_db,
+    get_db,
+    get_read_db,
+)
+from app.main import app
+from app.models.event import Event
+from app.services import outbox, user_cache, usernames
+from app.utils import redis as redis_utils
+from app.worker import send_notification
 
-SQLALCHEMY_DATABASE_URL = "sqlite+pysqlite:///:memory:"
+# A file rather than :memory: so the sync and async engines see the same database.
+_database_path = Path(tempfile.mkdtemp(prefix="wishlist-tests-")) / "test.db"
+SQLALCHEMY_DATABASE_URL = f"sqlite+pysqlite:///{_database_path}"
+ASYNC_SQLALCHEMY_DATABASE_URL = f"sqlite+aiosqlite:///{_database_path}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
@@ -33,6 +48,12 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
+# Every TestClient runs its own event loop, so async connections are not pooled.
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 @pytest.fixture(autouse=True)
 def setup_database() -> Generator[None, None, None]:
@@ -49,20 +70,58 @@ def override_get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+async def override_get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+app.dependency_overrides[get_read_db] = override_get_db
+app.dependency_overrides[get_async_read_db] = override_get_async_db
 
 
-@pytest.fixture()
-def client(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Generator[TestClient, None, None]:
-    fake_redis = fakeredis.FakeRedis()
+def relay_outbox() -> int:
+    """Run one outbox relay pass and apply the published events in-process."""
+    published: list[tuple[Any, tuple[int]]] = []
+
+    def publish(events: Sequence[Event]) -> None:
+        published.extend(
+            routed for event in events if (routed := relay.task_for(event)) is not None
+        )
 
-    def _fake_get_redis():
+    with TestingSessionLocal() as session:
+        outbox.relay_batch(session, publish, 1000)
+    for task, args in published:
+        task(*args)
+    return len(published)
+
+
+@pytest.fixture()
+def client(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> Generator[TestClient, None, None]:
+    fake_server = fakeredis.FakeServer()
+    # Decoded like the production get_redis(); the binary client below is not.
+    fake_redis = fakeredis.FakeRedis(server=fake_server, decode_responses=True)
+
+    def _fake_get_redis() -> fakeredis.FakeRedis:
         return fake_redis
 
     monkeypatch.setattr(redis_utils, "get_redis", _fake_get_redis)
+    monkeypatch.setattr(redis_utils, "_redis_client", fake_redis)
+    monkeypatch.setattr(
+        redis_utils, "_binary_client", fakeredis.FakeRedis(server=fake_server)
+    )
+    monkeypatch.setattr(
+        redis_utils, "_async_client", fakeredis.FakeAsyncRedis(server=fake_server)
+    )
     monkeypatch.setattr(send_notification, "delay", lambda *args, **kwargs: None)
+    monkeypatch.setattr(worker, "SessionLocal", TestingSessionLocal)
     media_dir = tmp_path / "media"
     media_dir.mkdir(parents=True, exist_ok=True)
     monkeypatch.setattr(settings, "media_root", str(media_dir))
+    user_cache.reset()
+    usernames.reset()
     with TestClient(app) as test_client:
         yield test_client
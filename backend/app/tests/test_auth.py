@@ -3,23 +3,27 @@ from __future__ import annotations
 import hashlib
 import hmac
 import json
-from datetime import datetime, timezone
+from datetime import UTC, datetime
+from typing import cast
 
+import pytest
 from fastapi.testclient import TestClient
 
 BOT_TOKEN = "123456:TEST"
 
 
 def build_init_data(user_payload: dict) -> str:
-    auth_date = int(datetime.now(tz=timezone.utc).timestamp())
+    auth_date = int(datetime.now(tz=UTC).timestamp())
     data = {
         "auth_date": str(auth_date),
         "query_id": "AAEAAAE",
         "user": json.dumps(user_payload, separators=(",", ":")),
     }
     data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(data.items()))
-    secret_key = hmac.new("WebAppData".encode(), BOT_TOKEN.encode(), hashlib.sha256).digest()
-    hash_value = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    secret_key = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    hash_value = hmac.new(
+        secret_key, data_check_string.encode(), hashlib.sha256
+    ).hexdigest()
     data["hash"] = hash_value
     return "&".join(f"{k}={v}" for k, v in data.items())
 
@@ -43,3 +47,105 @@ def test_telegram_auth_flow_success(client: TestClient) -> None:
     assert "csrf_token" in data
     assert "wishlist_session" in response.cookies
     assert "wishlist_csrf" in response.cookies
+
+
+def test_session_user_is_cached_and_invalidated(client: TestClient) -> None:
+    from app.services import user_cache
+    from app.utils.redis import get_redis
+
+    init_data = build_init_data(
+        {"id": 2222, "username": "cached_user", "first_name": "Cached"}
+    )
+    auth = client.post("/api/auth/telegram", json={"init_data": init_data}).json()
+    user_id = auth["user"]["id"]
+    headers = {"X-CSRF-Token": auth["csrf_token"]}
+    user_cache.reset()
+
+    for _ in range(3):
+        assert client.get("/api/me").json()["display_name"] == "Cached"
+    cached = json.loads(cast(str, get_redis().get(user_cache.cache_key(user_id))))
+    # Only the read-only profile is cached, not the whole users row.
+    assert "tg_user_id" not in cached and "created_at" not in cached
+    assert user_cache.stats() == {
+        "local_hits": 2.0,
+        "redis_hits": 0.0,
+        "misses": 1.0,
+        "hit_ratio": 2 / 3,
+    }
+
+    # Updates are written to the users row and evict the cached copy.
+    updated = client.patch("/api/me", json={"display_name": "Renamed"}, headers=headers)
+    assert updated.json()["display_name"] == "Renamed"
+    assert get_redis().get(user_cache.cache_key(user_id)) is None
+    assert client.get("/api/me").json()["display_name"] == "Renamed"
+
+    # Another process: local tier empty, Redis still warm.
+    user_cache._local.clear()
+    assert client.get("/api/wishlists/mine").status_code == 200
+    assert user_cache.stats()["redis_hits"] == 1.0
+
+    # Re-opening the mini app with an unchanged profile writes nothing.
+    client.post("/api/auth/telegram", json={"init_data": init_data})
+    assert get_redis().get(user_cache.cache_key(user_id))
+
+    changed = build_init_data(
+        {
+            "id": 2222,
+            "username": "cached_user",
+            "first_name": "Cached",
+            "language_code": "ru",
+        }
+    )
+    assert (
+        client.post("/api/auth/telegram", json={"init_data": changed}).json()["user"][
+            "locale"
+        ]
+        == "ru"
+    )
+    assert get_redis().get(user_cache.cache_key(user_id)) is None
+
+
+def test_repeated_init_data_is_verified_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.auth import telegram
+
+    init_data = build_init_data({"id": 3333, "username": "reopener"})
+    calls: list[str] = []
+    verify = telegram._verify
+    monkeypatch.setattr(
+        telegram, "_verify", lambda raw: calls.append(raw) or verify(raw)
+    )
+
+    first = telegram.validate_telegram_init_data(init_data)
+    assert telegram.validate_telegram_init_data(init_data) is first
+    assert len(calls) == 1
+
+    with pytest.raises(telegram.TelegramAuthError):
+        telegram.validate_telegram_init_data(init_data.replace("reopener", "impostor"))
+
+
+def test_usernames_resolve_case_insensitively_and_follow_renames(
+    client: TestClient,
+) -> None:
+    from app.services import usernames
+    from app.utils.redis import get_redis
+
+    auth = client.post(
+        "/api/auth/telegram",
+        json={"init_data": build_init_data({"id": 4444, "first_name": "Fox"})},
+    )
+    user_id = auth.json()["user"]["id"]
+    headers = {"X-CSRF-Token": auth.json()["csrf_token"]}
+
+    client.patch("/api/me", json={"custom_username": "Fox"}, headers=headers)
+    assert client.get("/api/users/FOX").json()["id"] == user_id
+    assert client.get("/api/users/fox/wishlist").status_code == 200
+    assert get_redis().get(usernames.cache_key("fox")) == str(user_id)
+
+    client.patch("/api/me", json={"custom_username": "wolf"}, headers=headers)
+    assert get_redis().get(usernames.cache_key("fox")) is None
+    assert client.get("/api/users/fox").status_code == 404
+    assert client.get("/api/users/Wolf").json()["id"] == user_id
+
+    # A stale mapping (a process that missed the rename) is checked against the row.
+    get_redis().set(usernames.cache_key("bear"), user_id)
+    assert client.get("/api/users/bear").status_code == 404
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from app import db
+from app.config import settings
+
+
+def test_pool_records_checkout_waits_and_timeouts(tmp_path: Path) -> None:
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=db.InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    with engine.connect() as held:
+        held.execute(text("select 1"))
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        usage = engine.pool.usage()
+        assert usage["checked_out"] == 1 and usage["idle"] == 0
+    with engine.connect() as conn:
+        conn.execute(text("select 1"))
+
+    usage = engine.pool.usage()
+    assert usage["checkouts"] == 3
+    assert usage["timeouts"] == 1
+    assert usage["wait_ms_max"] >= 50
+    assert usage["idle"] == 1
+
+
+def test_engine_options_for_pgbouncer(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "db_pool_size", 20)
+    assert db.engine_options()["pool_size"] == 20
+    assert db.engine_options()["pool_pre_ping"] is False
+    assert "prepare_threshold" not in db.engine_options()["connect_args"]
+
+    monkeypatch.setattr(settings, "db_pgbouncer", True)
+    assert db.engine_options()["connect_args"]["prepare_threshold"] is None
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+from datetime import UTC, datetime
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.timeline import timeline_key
+from app.tests.conftest import relay_outbox
+from app.utils.pagination import encode_cursor
+from app.utils.redis import get_redis
+
+BOT_TOKEN = "123456:TEST"
+
+
+def build_init_data(user_payload: dict) -> str:
+    auth_date = int(datetime.now(tz=UTC).timestamp())
+    data = {
+        "auth_date": str(auth_date),
+        "query_id": "AAEAAAE",
+        "user": json.dumps(user_payload, separators=(",", ":")),
+    }
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(data.items()))
+    secret_key = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    hash_value = hmac.new(
+        secret_key, data_check_string.encode(), hashlib.sha256
+    ).hexdigest()
+    data["hash"] = hash_value
+    return "&".join(f"{k}={v}" for k, v in data.items())
+
+
+def authenticate(client: TestClient, user_id: int, username: str) -> tuple[str, int]:
+    payload = {"id": user_id, "username": username, "first_name": username.title()}
+    response = client.post(
+        "/api/auth/telegram", json={"init_data": build_init_data(payload)}
+    )
+    assert response.status_code == 200
+    return response.json()["csrf_token"], response.json()["user"]["id"]
+
+
+def create_wish(client: TestClient, csrf_token: str, title: str) -> int:
+    wishlist_id = client.get("/api/wishlists/mine").json()[0]["id"]
+    response = client.post(
+        "/api/wishes",
+        json={"wishlist_id": wishlist_id, "title": title},
+        headers={"X-CSRF-Token": csrf_token},
+    )
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def test_feed_timeline_backfill_and_fan_out(client: TestClient) -> None:
+    csrf_follower, follower_id = authenticate(client, 1, "follower")
+
+    with TestClient(app) as creator_client:
+        csrf_creator, _ = authenticate(creator_client, 2, "creator")
+        first_id = create_wish(creator_client, csrf_creator, "Board game")
+
+        subscribe_resp = client.post(
+            "/api/subscriptions/creator", headers={"X-CSRF-Token": csrf_follower}
+        )
+        assert subscribe_resp.status_code == 201
+
+        # Cold timeline: served from SQL and materialised in Redis.
+        feed_resp = client.get("/api/feed")
+        assert feed_resp.status_code == 200
+        assert [item["wish"]["id"] for item in feed_resp.json()] == [first_id]
+        assert get_redis().exists(timeline_key(follower_id))
+
+        # Warm timeline: new wishes are pushed when the outbox event is applied.
+        second_id = create_wish(creator_client, csrf_creator, "Tea set")
+        relay_outbox()
+        members = {
+            int(member)
+            for member in get_redis().zrange(timeline_key(follower_id), 0, -1)
+        }
+        assert second_id in members
+
+        feed_resp = client.get("/api/feed")
+        assert {item["wish"]["id"] for item in feed_resp.json()} == {
+            first_id,
+            second_id,
+        }
+
+        first_page = client.get("/api/feed", params={"limit": 1})
+        cursor = first_page.headers["X-Next-Cursor"]
+        second_page = client.get("/api/feed", params={"limit": 1, "cursor": cursor})
+        assert "X-Next-Cursor" not in second_page.headers
+        paged_ids = [
+            item["wish"]["id"] for item in first_page.json() + second_page.json()
+        ]
+        assert sorted(paged_ids) == sorted([first_id, second_id])
+        for score in ("soon", None):
+            tampered = encode_cursor("updated_at", score, first_id)
+            assert (
+                client.get("/api/feed", params={"cursor": tampered}).status_code == 400
+            )
+
+    unsubscribe_resp = client.delete(
+        "/api/subscriptions/creator", headers={"X-CSRF-Token": csrf_follower}
+    )
+    assert unsubscribe_resp.status_code == 204
+    assert client.get("/api/feed").json() == []
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services import link_preview
+
+PAGE = """<html><head>
+<title>Fallback title</title>
+<meta property="og:title" content="Espresso machine">
+<meta property="og:description" content="Dual boiler">
+<meta property="og:image" content="/img/espresso.jpg">
+</head><body>...</body></html>"""
+
+
+def install_upstream(
+    monkeypatch: pytest.MonkeyPatch, status_code: int = 200, delay: float = 0.0
+) -> list[str]:
+    calls: list[str] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(str(request.url))
+        if delay:
+            await asyncio.sleep(delay)
+        return httpx.Response(
+            status_code, text=PAGE, headers={"Content-Type": "text/html"}
+        )
+
+    monkeypatch.setattr(
+        link_preview,
+        "_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    return calls
+
+
+def test_link_preview_is_cached_by_normalized_url(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls = install_upstream(monkeypatch)
+
+    first = client.get(
+        "/api/links/preview",
+        params={"url": "https://Shop.example.com/item?b=2&a=1&utm_source=tg#reviews"},
+    )
+    assert first.status_code == 200
+    assert first.json()["title"] == "Espresso machine"
+    assert first.json()["image"] == "https://shop.example.com/img/espresso.jpg"
+
+    second = client.get(
+        "/api/links/preview", params={"url": "https://shop.example.com/item?a=1&b=2"}
+    )
+    assert second.status_code == 200
+    assert second.json()["description"] == "Dual boiler"
+    assert second.json()["url"] == "https://shop.example.com/item?a=1&b=2"
+    assert len(calls) == 1
+
+
+def test_link_preview_failures_are_negatively_cached(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls = install_upstream(monkeypatch, status_code=404)
+    for _ in range(2):
+        response = client.get(
+            "/api/links/preview", params={"url": "https://blocked.example.com/"}
+        )
+        assert response.status_code == 200
+        assert response.json()["title"] is None
+    assert len(calls) == 1
+
+    calls = install_upstream(monkeypatch, status_code=502)
+    for _ in range(2):
+        response = client.get(
+            "/api/links/preview", params={"url": "https://down.example.com/"}
+        )
+        assert response.status_code == 400
+    assert len(calls) == 1
+
+
+def test_link_preview_coalesces_concurrent_fetches(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls = install_upstream(monkeypatch, delay=0.05)
+
+    async def fetch_many() -> list:
+        return await asyncio.gather(
+            *(
+                link_preview.get_preview("https://shop.example.com/kettle")
+                for _ in range(5)
+            )
+        )
+
+    previews = asyncio.run(fetch_many())
+    assert {preview.title for preview in previews} == {"Espresso machine"}
+    assert len(calls) == 1
+
+
+def test_head_reader_sniffs_meta_charset_and_stops_at_head() -> None:
+    page = (
+        '<html><head><meta charset="windows-1251">'
+        '<meta property="og:title" content="Чайник"></head><body>'
+        + "<p>отзыв</p>" * 200_000
+        + "</body></html>"
+    ).encode("cp1251")
+
+    reader = link_preview.HeadReader("text/html")
+    for offset in range(0, len(page), 4096):
+        if reader.feed(page[offset : offset + 4096]):
+            break
+
+    assert reader.encoding == "cp1251"
+    assert reader.received <= 4096
+    assert reader.preview("https://shop.example.com/").title == "Чайник"
+
+
+@pytest.mark.parametrize("charset", ["base64", "rot13", "zlib", "no-such-charset"])
+def test_head_reader_ignores_unusable_charsets(charset: str) -> None:
+    page = (
+        f'<html><head><meta charset="{charset}"><title>Kettle</title></head>'.encode()
+    )
+    reader = link_preview.HeadReader(f"text/html; charset={charset}")
+    reader.feed(page)
+    assert reader.preview("https://shop.example.com/").title == "Kettle"
+    assert reader.encoding == "utf-8"
+
+
+def test_head_reader_respects_byte_cap() -> None:
+    page = b"<html><head><title>Big</title>" + b"<!-- padding -->" * 100_000
+    reader = link_preview.HeadReader("text/html; charset=utf-8", max_bytes=64 * 1024)
+    for offset in range(0, len(page), 8192):
+        if reader.feed(page[offset : offset + 8192]):
+            break
+
+    assert reader.received == 64 * 1024
+    assert reader.preview("https://shop.example.com/").title == "Big"
+
+
+def test_domain_slots_are_limited(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(link_preview.settings, "link_preview_domain_concurrency", 2)
+    url = "https://shop.example.com/a"
+    with (
+        link_preview.domain_slot(url),
+        link_preview.domain_slot("https://SHOP.example.com/b"),
+    ):
+        with pytest.raises(link_preview.DomainBusyError):
+            with link_preview.domain_slot(url):
+                pass
+        with link_preview.domain_slot("https://other.example.com/"):
+            pass
+    with link_preview.domain_slot(url):
+        pass
@@ -3,10 +3,24 @@ from __future__ import annotations
 import base64
 import hashlib
 import hmac
+import io
 import json
-from datetime import datetime, timezone
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
 
+import httpx
+import pytest
 from fastapi.testclient import TestClient
+from PIL import Image, PngImagePlugin
+from sqlalchemy import select
+
+from app import worker
+from app.config import settings
+from app.models.event import Event, EventEntity
+from app.services import image_metadata, media, storage
+from app.tests.conftest import relay_outbox
 
 BOT_TOKEN = "123456:TEST"
 
@@ -16,26 +30,119 @@ PNG_BYTES = base64.b64decode(
 
 
 def build_init_data(user_payload: dict) -> str:
-    auth_date = int(datetime.now(tz=timezone.utc).timestamp())
+    auth_date = int(datetime.now(tz=UTC).timestamp())
     data = {
         "auth_date": str(auth_date),
         "query_id": "AAEAAAE",
         "user": json.dumps(user_payload, separators=(",", ":")),
     }
     data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(data.items()))
-    secret_key = hmac.new("WebAppData".encode(), BOT_TOKEN.encode(), hashlib.sha256).digest()
-    hash_value = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    secret_key = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    hash_value = hmac.new(
+        secret_key, data_check_string.encode(), hashlib.sha256
+    ).hexdigest()
     data["hash"] = hash_value
     return "&".join(f"{k}={v}" for k, v in data.items())
 
 
 def authenticate(client: TestClient) -> str:
     payload = {"id": 404, "username": "media_user"}
-    response = client.post("/api/auth/telegram", json={"init_data": build_init_data(payload)})
+    response = client.post(
+        "/api/auth/telegram", json={"init_data": build_init_data(payload)}
+    )
     assert response.status_code == 200
     return response.json()["csrf_token"]
 
 
+def queued_media_ids() -> list[int]:
+    """Assets whose processing was recorded in the outbox, in order."""
+    from app.tests.conftest import TestingSessionLocal
+
+    with TestingSessionLocal() as session:
+        return list(
+            session.scalars(
+                select(Event.entity_id)
+                .where(Event.entity == EventEntity.MEDIA)
+                .order_by(Event.id)
+            )
+        )
+
+
+ORIENTATION = 0x0112
+
+
+def jpeg_with_exif(width: int, height: int) -> bytes:
+    exif = Image.Exif()
+    exif[ORIENTATION] = 6  # rotate 90° clockwise on display
+    exif[0x010F] = "PhoneMaker"
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 80, 40)).save(
+        buffer, format="JPEG", exif=exif.tobytes()
+    )
+    return buffer.getvalue()
+
+
+def strip_in_chunks(data: bytes, ext: str, chunk_size: int = 7) -> bytes:
+    strip = image_metadata.metadata_filter(ext)
+    out = bytearray()
+    for offset in range(0, len(data), chunk_size):
+        out += strip.feed(data[offset : offset + chunk_size])
+    out += strip.finish()
+    for offset, patch in strip.patches():
+        out[offset : offset + len(patch)] = patch
+    return bytes(out)
+
+
+def test_jpeg_metadata_filter_keeps_only_orientation() -> None:
+    exif = Image.Exif()
+    exif[ORIENTATION] = 3
+    exif[0x010F] = "PhoneMaker"
+    source = Image.new("RGB", (40, 30), (10, 120, 200))
+    buffer = io.BytesIO()
+    source.save(buffer, format="JPEG", exif=exif.tobytes(), comment=b"taken at home")
+    data = buffer.getvalue()
+
+    stripped = strip_in_chunks(data, "jpg")
+    with (
+        Image.open(io.BytesIO(stripped)) as clean,
+        Image.open(io.BytesIO(data)) as original,
+    ):
+        assert dict(clean.getexif()) == {ORIENTATION: 3}
+        assert "comment" not in clean.info
+        assert clean.tobytes() == original.tobytes()
+    # Already clean input comes out unchanged, so its content key is stable.
+    assert strip_in_chunks(stripped, "jpg", chunk_size=64 * 1024) == stripped
+
+
+@pytest.mark.parametrize("ext", ["png", "webp"])
+def test_png_and_webp_metadata_filters(ext: str) -> None:
+    exif = Image.Exif()
+    exif[0x010F] = "PhoneMaker"
+    source = Image.new("RGBA", (40, 30), (10, 120, 200, 128))
+    buffer = io.BytesIO()
+    if ext == "png":
+        text = PngImagePlugin.PngInfo()
+        text.add_text("Author", "someone")
+        source.save(buffer, format="PNG", pnginfo=text, exif=exif.tobytes())
+    else:
+        source.save(buffer, format="WEBP", lossless=True, exif=exif.tobytes())
+    data = buffer.getvalue()
+
+    stripped = strip_in_chunks(data, ext)
+    assert len(stripped) < len(data)
+    with Image.open(io.BytesIO(stripped)) as clean:
+        clean.load()
+        assert not clean.getexif()
+        assert "Author" not in clean.info
+        assert clean.tobytes() == source.tobytes()
+
+
+def test_metadata_filter_keeps_unparseable_bytes() -> None:
+    data = b"\xff\xd8\x00not really a jpeg"
+    assert strip_in_chunks(data, "jpg") == data
+    assert strip_in_chunks(PNG_BYTES, "gif") == PNG_BYTES
+
+
 def test_upload_image(client: TestClient) -> None:
     csrf_token = authenticate(client)
 
@@ -48,3 +155,471 @@ def test_upload_image(client: TestClient) -> None:
     assert response.status_code == 201, response.text
     url = response.json()["url"]
     assert url.startswith("/media/")
+
+
+def test_uploaded_image_is_processed_into_variants(client: TestClient) -> None:
+    csrf_token = authenticate(client)
+    response = client.post(
+        "/api/media/upload",
+        headers={"X-CSRF-Token": csrf_token},
+        files={"file": ("photo.jpg", jpeg_with_exif(1600, 900), "image/jpeg")},
+    )
+    assert response.status_code == 201, response.text
+    url = response.json()["url"]
+    original = Path(settings.media_root) / url.removeprefix(
+        f"{settings.media_base_url}/"
+    )
+    # Metadata is stripped before hashing, so the served object is clean from the start;
+    # only the orientation is kept, since the original is never rotated.
+    stored_bytes = original.read_bytes()
+    assert original.stem == hashlib.sha256(stored_bytes).hexdigest()
+    with Image.open(original) as stored:
+        assert stored.size == (1600, 900)
+        assert dict(stored.getexif()) == {ORIENTATION: 6}
+
+    # Before the worker runs, the variant endpoint falls back to the original.
+    pending = client.get(
+        "/api/media/variant", params={"url": url, "width": 300}, follow_redirects=False
+    )
+    assert pending.status_code == 307
+    assert pending.headers["location"] == url
+
+    # The relay hands the recorded upload to the worker once the request commits.
+    assert len(queued_media_ids()) == 1
+    assert relay_outbox() == 1
+    assert worker.process_media_asset(queued_media_ids()[0]) is False
+
+    assert original.read_bytes() == stored_bytes
+    for width in (128, 512):
+        with Image.open(original.with_name(f"{original.stem}_{width}.webp")) as variant:
+            assert variant.format == "WEBP"
+            assert variant.width == width
+            assert not variant.getexif()
+    assert not original.with_name(f"{original.stem}_1024.webp").exists()
+    assert original.with_name(f"{original.stem}_900.webp").exists()
+
+    best = client.get(
+        "/api/media/variant", params={"url": url, "width": 300}, follow_redirects=False
+    )
+    assert best.headers["location"].endswith("_512.webp")
+
+    wishlist_id = client.get("/api/wishlists/mine").json()[0]["id"]
+    wish = client.post(
+        "/api/wishes",
+        json={"wishlist_id": wishlist_id, "title": "Photo frame", "image_url": url},
+        headers={"X-CSRF-Token": csrf_token},
+    ).json()
+    assert set(wish["image_variants"]) == {"128", "512", "900"}
+    assert wish["image_srcset"].startswith(wish["image_variants"]["128"] + " 128w, ")
+
+    listed = client.get("/api/wishes").json()["items"][0]
+    assert listed["image_variants"] == wish["image_variants"]
+    public = client.get("/api/users/media_user/wishlist").json()["wishes"][0]
+    assert public["image_variants"] == wish["image_variants"]
+
+
+def test_upload_rejects_bad_content_and_oversized_files(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    csrf_token = authenticate(client)
+    media_root = Path(settings.media_root)
+
+    spoofed = client.post(
+        "/api/media/upload",
+        headers={"X-CSRF-Token": csrf_token},
+        files={"file": ("avatar.png", b"<?php echo 'hi'; ?>" * 10, "image/png")},
+    )
+    assert spoofed.status_code == 400
+
+    # Declared body larger than the limit: refused before the multipart parser runs.
+    huge = client.post(
+        "/api/media/upload",
+        headers={"X-CSRF-Token": csrf_token},
+        files={
+            "file": (
+                "huge.png",
+                PNG_BYTES + b"\0" * (settings.media_max_mb * 1024 * 1024 + 1),
+                "image/png",
+            )
+        },
+    )
+    assert huge.status_code == 413
+
+    # The running size check while copying to disk.
+    monkeypatch.setattr(settings, "media_max_mb", 0)
+    too_big = client.post(
+        "/api/media/upload",
+        headers={"X-CSRF-Token": csrf_token},
+        files={"file": ("test.png", PNG_BYTES, "image/png")},
+    )
+    assert too_big.status_code == 413
+    assert list(media_root.iterdir()) == []
+
+
+def test_identical_uploads_are_deduplicated(client: TestClient) -> None:
+    csrf_token = authenticate(client)
+    urls = []
+    for name in ("first.png", "second.png"):
+        response = client.post(
+            "/api/media/upload",
+            headers={"X-CSRF-Token": csrf_token},
+            files={"file": (name, PNG_BYTES, "image/png")},
+        )
+        assert response.status_code == 201
+        urls.append(response.json()["url"])
+
+    digest = hashlib.sha256(PNG_BYTES).hexdigest()
+    assert urls == [f"/media/{digest[:2]}/{digest[2:4]}/{digest}.png"] * 2
+    stored = [path for path in Path(settings.media_root).rglob("*") if path.is_file()]
+    assert len(stored) == 1
+    assert len(queued_media_ids()) == 1
+
+
+def test_media_garbage_collection(client: TestClient) -> None:
+    from app.tests.conftest import TestingSessionLocal
+
+    csrf_token = authenticate(client)
+    uploaded = []
+    for size in ((600, 400), (700, 500)):
+        response = client.post(
+            "/api/media/upload",
+            headers={"X-CSRF-Token": csrf_token},
+            files={"file": ("photo.jpg", jpeg_with_exif(*size), "image/jpeg")},
+        )
+        uploaded.append(response.json()["url"])
+    for asset_id in queued_media_ids():
+        worker.process_media_asset(asset_id)
+    kept_url, orphan_url = uploaded
+
+    wishlist_id = client.get("/api/wishlists/mine").json()[0]["id"]
+    client.post(
+        "/api/wishes",
+        json={"wishlist_id": wishlist_id, "title": "Vase", "image_url": kept_url},
+        headers={"X-CSRF-Token": csrf_token},
+    )
+    legacy = Path(settings.media_root) / "0123456789abcdef0123456789abcdef.png"
+    legacy.write_bytes(PNG_BYTES)
+    stale_temp = Path(settings.media_root) / ".upload-abandoned"
+    stale_temp.write_bytes(b"partial")
+    # Not something uploads create, so it stays however old it is.
+    (Path(settings.media_root) / "robots.txt").write_text("User-agent: *\n")
+
+    with TestingSessionLocal() as session:
+        # Everything is inside the grace period, so nothing is swept yet.
+        assert media.collect_garbage(session) == 0
+        removed = media.collect_garbage(session, grace_seconds=-60)
+
+    remaining = {
+        path.name for path in Path(settings.media_root).rglob("*") if path.is_file()
+    }
+    kept_name = kept_url.rsplit("/", 1)[1]
+    kept_stem = kept_name.rsplit(".", 1)[0]
+    # EXIF orientation 6 turns 600x400 into a 400 px wide image.
+    assert remaining == {
+        kept_name,
+        f"{kept_stem}_128.webp",
+        f"{kept_stem}_400.webp",
+        "robots.txt",
+    }
+    # The orphan's original and two variants, the legacy file and the temp file.
+    assert removed == 5
+    assert (
+        client.get(
+            "/api/media/variant", params={"url": orphan_url, "width": 100}
+        ).status_code
+        == 404
+    )
+
+
+@pytest.fixture
+def s3_storage(monkeypatch: pytest.MonkeyPatch) -> Iterator[storage.S3Storage]:
+    """An S3 backend on moto's standalone server, a local stand-in for MinIO."""
+    moto_server = pytest.importorskip("moto.server")
+
+    server = moto_server.ThreadedMotoServer(
+        ip_address="127.0.0.1", port=0, verbose=False
+    )
+    server.start()
+    host, port = server.get_host_and_port()
+    endpoint = f"http://{host}:{port}"
+    monkeypatch.setattr(settings, "media_storage", "s3")
+    monkeypatch.setattr(settings, "s3_endpoint_url", endpoint)
+    monkeypatch.setattr(settings, "s3_access_key", "testing")
+    monkeypatch.setattr(settings, "s3_secret_key", "testing")
+    backend = storage.S3Storage()
+    backend._client.create_bucket(Bucket=settings.s3_bucket)
+    monkeypatch.setattr(storage, "_storage", backend)
+    try:
+        yield backend
+    finally:
+        # Backends are process-wide in moto; start every test with an empty bucket.
+        httpx.post(f"{endpoint}/moto-api/reset")
+        server.stop()
+
+
+def test_local_storage_has_no_direct_uploads(client: TestClient) -> None:
+    csrf_token = authenticate(client)
+    response = client.post(
+        "/api/media/presign",
+        headers={"X-CSRF-Token": csrf_token},
+        json={
+            "sha256": hashlib.sha256(PNG_BYTES).hexdigest(),
+            "size": len(PNG_BYTES),
+            "content_type": "image/png",
+        },
+    )
+    assert response.status_code == 501
+
+
+def test_s3_proxied_upload_and_processing(
+    client: TestClient, s3_storage: storage.S3Storage
+) -> None:
+    csrf_token = authenticate(client)
+    response = client.post(
+        "/api/media/upload",
+        headers={"X-CSRF-Token": csrf_token},
+        files={"file": ("photo.jpg", jpeg_with_exif(1600, 900), "image/jpeg")},
+    )
+    assert response.status_code == 201, response.text
+    url = response.json()["url"]
+    assert url.startswith(f"{settings.s3_endpoint_url}/{settings.s3_bucket}/")
+    assert list(Path(settings.media_root).iterdir()) == []
+
+    assert worker.process_media_asset(queued_media_ids()[0]) is True
+    key = s3_storage.key_for_url(url)
+    assert key is not None
+    stem = key.rsplit(".", 1)[0]
+    stored = {item.key for item in s3_storage.iter_objects()}
+    assert stored == {key, f"{stem}_128.webp", f"{stem}_512.webp", f"{stem}_900.webp"}
+    with Image.open(io.BytesIO(s3_storage.read(key))) as processed:
+        assert processed.size == (1600, 900)
+        assert dict(processed.getexif()) == {ORIENTATION: 6}
+
+    best = client.get(
+        "/api/media/variant", params={"url": url, "width": 300}, follow_redirects=False
+    )
+    assert best.headers["location"] == s3_storage.url_for(f"{stem}_512.webp")
+
+
+def test_s3_presigned_direct_upload(
+    client: TestClient, s3_storage: storage.S3Storage
+) -> None:
+    csrf_token = authenticate(client)
+    digest = hashlib.sha256(PNG_BYTES).hexdigest()
+    request = {"sha256": digest, "size": len(PNG_BYTES), "content_type": "image/png"}
+
+    presigned = client.post(
+        "/api/media/presign", headers={"X-CSRF-Token": csrf_token}, json=request
+    )
+    assert presigned.status_code == 200, presigned.text
+    body = presigned.json()
+    assert body["upload_url"] and body["method"] == "PUT"
+    # The declared size is part of the signature, so no other length is accepted.
+    signed = parse_qs(urlsplit(body["upload_url"]).query)["X-Amz-SignedHeaders"][0]
+    assert "content-length" in signed.split(";")
+    assert "Content-Length" not in body["headers"]
+    # Bytes go straight to the bucket, never through the API.
+    put = httpx.put(body["upload_url"], content=PNG_BYTES, headers=body["headers"])
+    assert put.status_code == 200, put.text
+
+    completed = client.post(
+        "/api/media/complete",
+        headers={"X-CSRF-Token": csrf_token},
+        json={"url": body["url"]},
+    )
+    assert completed.status_code == 201, completed.text
+    assert completed.json() == {"url": body["url"]}
+    assert len(queued_media_ids()) == 1
+
+    # The same bytes again: nothing to upload, and no second asset.
+    again = client.post(
+        "/api/media/presign", headers={"X-CSRF-Token": csrf_token}, json=request
+    ).json()
+    assert again == {
+        "url": body["url"],
+        "upload_url": None,
+        "method": "PUT",
+        "headers": {},
+        "expires_in": 0,
+    }
+    client.post(
+        "/api/media/complete",
+        headers={"X-CSRF-Token": csrf_token},
+        json={"url": body["url"]},
+    )
+    assert len(queued_media_ids()) == 1
+
+    missing = client.post(
+        "/api/media/complete",
+        headers={"X-CSRF-Token": csrf_token},
+        json={"url": s3_storage.url_for(f"00/11/0011{'a' * 60}.png")},
+    )
+    assert missing.status_code == 404
+
+
+def test_s3_complete_never_deletes_a_registered_object(
+    client: TestClient, s3_storage: storage.S3Storage, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    csrf_token = authenticate(client)
+    uploaded = client.post(
+        "/api/media/upload",
+        headers={"X-CSRF-Token": csrf_token},
+        files={"file": ("photo.jpg", jpeg_with_exif(600, 400), "image/jpeg")},
+    )
+    url = uploaded.json()["url"]
+    key = s3_storage.key_for_url(url)
+    assert key is not None
+
+    # Limits tightened after registration don't let a completion remove shared media.
+    monkeypatch.setattr(settings, "media_max_mb", 0)
+    completed = client.post(
+        "/api/media/complete", headers={"X-CSRF-Token": csrf_token}, json={"url": url}
+    )
+    assert completed.status_code == 201, completed.text
+    assert completed.json() == {"url": url}
+    assert s3_storage.exists(key)
+
+
+def test_s3_direct_upload_with_metadata_is_stored_stripped(
+    client: TestClient, s3_storage: storage.S3Storage
+) -> None:
+    csrf_token = authenticate(client)
+    payload = jpeg_with_exif(600, 400)
+    request = {
+        "sha256": hashlib.sha256(payload).hexdigest(),
+        "size": len(payload),
+        "content_type": "image/jpeg",
+    }
+    body = client.post(
+        "/api/media/presign", headers={"X-CSRF-Token": csrf_token}, json=request
+    ).json()
+    assert (
+        httpx.put(
+            body["upload_url"], content=payload, headers=body["headers"]
+        ).status_code
+        == 200
+    )
+
+    completed = client.post(
+        "/api/media/complete",
+        headers={"X-CSRF-Token": csrf_token},
+        json={"url": body["url"]},
+    )
+    assert completed.status_code == 201, completed.text
+    url = completed.json()["url"]
+    assert url != body["url"]
+    key = s3_storage.key_for_url(url)
+    assert key is not None
+    clean = s3_storage.read(key)
+    assert key.rsplit("/", 1)[-1] == f"{hashlib.sha256(clean).hexdigest()}.jpg"
+    with Image.open(io.BytesIO(clean)) as stored:
+        assert stored.size == (600, 400)
+        assert dict(stored.getexif()) == {ORIENTATION: 6}
+    # The uploaded object is left as it was, for garbage collection to remove.
+    uploaded_key = s3_storage.key_for_url(body["url"])
+    assert uploaded_key is not None and s3_storage.read(uploaded_key) == payload
+
+    assert worker.process_media_asset(queued_media_ids()[0]) is True
+    assert s3_storage.read(key) == clean
+
+
+def test_s3_complete_rejects_and_removes_bad_content(
+    client: TestClient, s3_storage: storage.S3Storage
+) -> None:
+    csrf_token = authenticate(client)
+    payload = b"<?php echo 'hi'; ?>" * 10
+    digest = hashlib.sha256(payload).hexdigest()
+    body = client.post(
+        "/api/media/presign",
+        headers={"X-CSRF-Token": csrf_token},
+        json={"sha256": digest, "size": len(payload), "content_type": "image/png"},
+    ).json()
+    assert (
+        httpx.put(
+            body["upload_url"], content=payload, headers=body["headers"]
+        ).status_code
+        == 200
+    )
+
+    rejected = client.post(
+        "/api/media/complete",
+        headers={"X-CSRF-Token": csrf_token},
+        json={"url": body["url"]},
+    )
+    assert rejected.status_code == 400
+    assert list(s3_storage.iter_objects()) == []
+
+    too_big = client.post(
+        "/api/media/presign",
+        headers={"X-CSRF-Token": csrf_token},
+        json={
+            "sha256": digest,
+            "size": settings.media_max_mb * 1024 * 1024 + 1,
+            "content_type": "image/png",
+        },
+    )
+    assert too_big.status_code == 413
+
+
+def test_s3_complete_rejects_and_removes_oversized_uploads(
+    client: TestClient,
+    s3_storage: storage.S3Storage,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    csrf_token = authenticate(client)
+    payload = jpeg_with_exif(600, 400)
+    key = media.content_path(hashlib.sha256(payload).hexdigest(), "jpg")
+    # Stored by a client that ignored the signed length, or under a larger limit.
+    s3_storage.save_bytes(key, payload)
+    monkeypatch.setattr(settings, "media_max_mb", 0)
+
+    completed = client.post(
+        "/api/media/complete",
+        headers={"X-CSRF-Token": csrf_token},
+        json={"url": s3_storage.url_for(key)},
+    )
+    assert completed.status_code == 413
+    assert list(s3_storage.iter_objects()) == []
+
+
+def test_s3_garbage_collection(
+    client: TestClient, s3_storage: storage.S3Storage
+) -> None:
+    from app.tests.conftest import TestingSessionLocal
+
+    csrf_token = authenticate(client)
+    response = client.post(
+        "/api/media/upload",
+        headers={"X-CSRF-Token": csrf_token},
+        files={"file": ("photo.jpg", jpeg_with_exif(600, 400), "image/jpeg")},
+    )
+    worker.process_media_asset(queued_media_ids()[0])
+    # A direct upload that was never completed.
+    abandoned = media.content_path(hashlib.sha256(PNG_BYTES).hexdigest(), "png")
+    s3_storage.save_bytes(abandoned, PNG_BYTES)
+    # Other objects sharing the bucket: under our prefix, and outside of it.
+    s3_storage.save_bytes("exports/report.csv", b"id\n")
+    s3_storage._client.put_object(
+        Bucket=s3_storage.bucket, Key="backups/db.sql", Body=b"--"
+    )
+    assert len(list(s3_storage.iter_objects())) == 5
+
+    with TestingSessionLocal() as session:
+        assert media.collect_garbage(session) == 0
+        assert media.collect_garbage(session, grace_seconds=-60) == 4
+    assert [item.key for item in s3_storage.iter_objects()] == ["exports/report.csv"]
+    assert s3_storage._client.head_object(
+        Bucket=s3_storage.bucket, Key="backups/db.sql"
+    )
+    assert (
+        client.get(
+            "/api/media/variant", params={"url": response.json()["url"], "width": 100}
+        ).status_code
+        == 404
+    )
+
+
+def test_s3_storage_requires_a_key_prefix(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "s3_key_prefix", "")
+    with pytest.raises(storage.StorageError):
+        storage.S3Storage(client=object())
@@ -3,23 +3,26 @@ from __future__ import annotations
 import hashlib
 import hmac
 import json
-from datetime import datetime, timezone
+from datetime import UTC, datetime
 
+import httpx
 from fastapi.testclient import TestClient
 
 BOT_TOKEN = "123456:TEST"
 
 
 def build_init_data(user_payload: dict) -> str:
-    auth_date = int(datetime.now(tz=timezone.utc).timestamp())
+    auth_date = int(datetime.now(tz=UTC).timestamp())
     data = {
         "auth_date": str(auth_date),
         "query_id": "AAEAAAE",
         "user": json.dumps(user_payload, separators=(",", ":")),
     }
     data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(data.items()))
-    secret_key = hmac.new("WebAppData".encode(), BOT_TOKEN.encode(), hashlib.sha256).digest()
-    hash_value = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    secret_key = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    hash_value = hmac.new(
+        secret_key, data_check_string.encode(), hashlib.sha256
+    ).hexdigest()
     data["hash"] = hash_value
     return "&".join(f"{k}={v}" for k, v in data.items())
 
@@ -34,6 +37,122 @@ def authenticate(client: TestClient) -> str:
 
 def test_trigger_notification(client: TestClient) -> None:
     csrf_token = authenticate(client)
-    response = client.post("/api/notifications/test", headers={"X-CSRF-Token": csrf_token})
+    response = client.post(
+        "/api/notifications/test", headers={"X-CSRF-Token": csrf_token}
+    )
     assert response.status_code == 202
     assert response.json()["detail"] == "Notification scheduled"
+
+
+def test_digest_collapses_edits_per_recipient(client: TestClient, monkeypatch) -> None:
+    from app import worker
+    from app.main import app
+    from app.models.notification import Notification
+    from app.services import notify
+    from app.tests.conftest import TestingSessionLocal, relay_outbox
+    from app.utils.redis import get_redis
+
+    sent_messages: list[tuple[int, str]] = []
+    failures = [httpx.ConnectError("telegram unreachable")]
+
+    def fake_send(chat_id, text, **kwargs):
+        if failures:
+            raise failures.pop()
+        sent_messages.append((chat_id, text))
+
+    monkeypatch.setattr(worker, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(worker.telegram_bot, "send_message", fake_send)
+
+    follower_csrf = authenticate(client)
+    with TestClient(app) as owner_client:
+        owner_payload = {"id": 77, "username": "digest_owner", "first_name": "Owner"}
+        owner_resp = owner_client.post(
+            "/api/auth/telegram", json={"init_data": build_init_data(owner_payload)}
+        )
+        owner_csrf = owner_resp.json()["csrf_token"]
+        assert (
+            client.post(
+                "/api/subscriptions/digest_owner",
+                headers={"X-CSRF-Token": follower_csrf},
+            ).status_code
+            == 201
+        )
+
+        wishlist_id = owner_client.get("/api/wishlists/mine").json()[0]["id"]
+        wish = owner_client.post(
+            "/api/wishes",
+            json={"wishlist_id": wishlist_id, "title": "Kettle"},
+            headers={"X-CSRF-Token": owner_csrf},
+        ).json()
+        for price in ("10.00", "12.00"):
+            owner_client.patch(
+                f"/api/wishes/{wish['id']}",
+                json={"price": price},
+                headers={"X-CSRF-Token": owner_csrf},
+            )
+    assert relay_outbox() == 3
+
+    def close_batch_windows() -> None:
+        for user_id in get_redis().zrange(notify.DIGEST_DUE_KEY, 0, -1):
+            get_redis().zadd(notify.DIGEST_DUE_KEY, {user_id: 0})
+
+    # A failed send puts the batch back instead of dropping it.
+    close_batch_windows()
+    assert worker.flush_digests() == 0
+    assert sent_messages == []
+    close_batch_windows()
+    assert worker.flush_digests() == 1
+    assert len(sent_messages) == 1
+    assert sent_messages[0][0] == 42
+    assert "12,00" in sent_messages[0][1]
+
+    with TestingSessionLocal() as session:
+        notifications = session.query(Notification).all()
+        assert len(notifications) == 3
+        assert all(item.is_sent for item in notifications)
+
+    assert worker.flush_digests() == 0
+
+
+def test_immediate_mode_enqueues_chunks(client: TestClient, monkeypatch) -> None:
+    from app import worker
+    from app.config import settings
+    from app.main import app
+    from app.tests.conftest import relay_outbox
+
+    chunks: list[list[int]] = []
+    monkeypatch.setattr(settings, "notify_batch_seconds", 0)
+    monkeypatch.setattr(settings, "notify_chunk_size", 2)
+    monkeypatch.setattr(worker.send_notification_batch, "delay", chunks.append)
+
+    owner_payload = {"id": 500, "username": "bulk_owner", "first_name": "Bulk"}
+    owner_csrf = client.post(
+        "/api/auth/telegram", json={"init_data": build_init_data(owner_payload)}
+    ).json()["csrf_token"]
+    for follower_id in (501, 502, 503):
+        with TestClient(app) as follower_client:
+            follower_payload = {
+                "id": follower_id,
+                "username": f"follower_{follower_id}",
+            }
+            resp = follower_client.post(
+                "/api/auth/telegram",
+                json={"init_data": build_init_data(follower_payload)},
+            )
+            follower_csrf = resp.json()["csrf_token"]
+            follow = follower_client.post(
+                "/api/subscriptions/bulk_owner", headers={"X-CSRF-Token": follower_csrf}
+            )
+            assert follow.status_code == 201
+
+    wishlist_id = client.get("/api/wishlists/mine").json()[0]["id"]
+    response = client.post(
+        "/api/wishes",
+        json={"wishlist_id": wishlist_id, "title": "Bulk wish"},
+        headers={"X-CSRF-Token": owner_csrf},
+    )
+    assert response.status_code == 201
+    assert chunks == []
+    relay_outbox()
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert len({notification_id for chunk in chunks for notification_id in chunk}) == 3
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from typing import NoReturn, cast
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils import rate_limit as rate_limit_module
+from app.utils.rate_limit import rate_limit
+
+
+@pytest.fixture
+def limited_app(client: TestClient) -> TestClient:
+    # ``client`` wires the fake Redis in; the limiter is exercised on its own app.
+    rate_limit_module._blocked.clear()
+    app = FastAPI()
+
+    @app.get("/limited", dependencies=[Depends(rate_limit("test", limit=3, window=60))])
+    def limited() -> dict[str, str]:
+        return {"status": "ok"}
+
+    return TestClient(app)
+
+
+def test_rate_limit_headers_and_retry_after(limited_app: TestClient) -> None:
+    remaining = []
+    for _ in range(3):
+        response = limited_app.get("/limited")
+        assert response.status_code == 200
+        assert response.headers["X-RateLimit-Limit"] == "3"
+        remaining.append(response.headers["X-RateLimit-Remaining"])
+    assert remaining == ["2", "1", "0"]
+
+    refused = limited_app.get("/limited")
+    assert refused.status_code == 429
+    # One request's worth of budget (60s / 3) comes back after ~20 seconds.
+    assert 19 <= int(refused.headers["Retry-After"]) <= 20
+    assert refused.headers["X-RateLimit-Remaining"] == "0"
+
+
+def test_blocked_clients_do_not_reach_redis(
+    limited_app: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    for _ in range(4):
+        limited_app.get("/limited")
+
+    def unreachable() -> NoReturn:
+        raise AssertionError("Redis consulted for a client already refused")
+
+    monkeypatch.setattr(rate_limit_module, "_gcra", unreachable)
+    assert limited_app.get("/limited").status_code == 429
+
+
+def test_rate_limit_key_expires(limited_app: TestClient) -> None:
+    from app.utils.redis import get_redis
+
+    limited_app.get("/limited")
+    ttl = cast(int, get_redis().pttl("rl:test:testclient"))
+    # Expires once the bucket has refilled: no key outlives its window.
+    assert 0 < ttl <= 20_000
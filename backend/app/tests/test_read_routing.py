@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app import db
+from app.config import settings
+from app.main import app
+from app.services import user_cache, usernames
+from app.tests.conftest import TestingAsyncSessionLocal, TestingSessionLocal
+from app.tests.test_media import authenticate
+from app.utils.redis import get_redis
+
+
+@pytest.fixture
+def replica(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> Iterator[None]:
+    """Route reads for real, to an empty SQLite file standing in for a stale replica."""
+    path = tmp_path / "replica.db"
+    replica_engine = create_engine(f"sqlite+pysqlite:///{path}")
+    db.Base.metadata.create_all(bind=replica_engine)
+    replica_async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}", poolclass=NullPool
+    )
+
+    monkeypatch.setattr(settings, "postgres_replica_host", "replica")
+    monkeypatch.setattr(db, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(db, "AsyncSessionLocal", TestingAsyncSessionLocal)
+    monkeypatch.setattr(db, "replica_engine", replica_engine)
+    monkeypatch.setattr(db, "replica_async_engine", replica_async_engine)
+    monkeypatch.setattr(db, "ReplicaSessionLocal", sessionmaker(bind=replica_engine))
+    monkeypatch.setattr(
+        db, "AsyncReplicaSessionLocal", async_sessionmaker(bind=replica_async_engine)
+    )
+    monkeypatch.setattr(db, "_replica_lag", db._ReplicaLag())
+    for dependency in (db.get_read_db, db.get_async_read_db):
+        monkeypatch.delitem(app.dependency_overrides, dependency)
+    yield
+    replica_engine.dispose()
+
+
+def _wish_titles(client: TestClient) -> list[str]:
+    return [wish["title"] for wish in client.get("/api/wishes").json()["items"]]
+
+
+def test_reads_follow_writes_then_move_to_replica(
+    client: TestClient, replica: None
+) -> None:
+    csrf_token = authenticate(client)
+    wishlist_id = client.get("/api/wishlists/mine").json()[0]["id"]
+    created = client.post(
+        "/api/wishes",
+        json={"wishlist_id": wishlist_id, "title": "Teapot"},
+        headers={"X-CSRF-Token": csrf_token},
+    )
+    assert settings.primary_cookie_name in created.cookies
+
+    # Right after the write the client is pinned to the primary and sees its wish.
+    assert _wish_titles(client) == ["Teapot"]
+    assert client.get("/api/users/media_user").status_code == 200
+
+    # Once the window is over, reads go to the (here: empty) replica.
+    client.cookies.delete(settings.primary_cookie_name)
+    assert _wish_titles(client) == []
+    # Profiles are cached by username; drop them to see which database answers.
+    usernames.reset()
+    user_cache.reset()
+    get_redis().flushall()
+    assert client.get("/api/users/media_user").status_code == 404
+
+
+def test_lagging_replica_falls_back_to_primary(
+    client: TestClient, replica: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    csrf_token = authenticate(client)
+    wishlist_id = client.get("/api/wishlists/mine").json()[0]["id"]
+    client.post(
+        "/api/wishes",
+        json={"wishlist_id": wishlist_id, "title": "Teapot"},
+        headers={"X-CSRF-Token": csrf_token},
+    )
+    client.cookies.delete(settings.primary_cookie_name)
+
+    async def lagging() -> float:
+        return settings.replica_max_lag_seconds + 10
+
+    monkeypatch.setattr(db, "replica_lag_seconds_async", lagging)
+    monkeypatch.setattr(
+        db, "replica_lag_seconds", lambda: settings.replica_max_lag_seconds + 10
+    )
+    assert _wish_titles(client) == ["Teapot"]
+    assert client.get("/api/users/media_user").status_code == 200
+
+
+def test_forged_primary_cookie_is_ignored(client: TestClient, replica: None) -> None:
+    authenticate(client)
+    client.cookies.delete(settings.primary_cookie_name)
+    client.cookies.set(settings.primary_cookie_name, "99999999999")
+    assert client.get("/api/users/media_user").status_code == 404
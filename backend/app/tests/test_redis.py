@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import fakeredis
+import pytest
+import redis
+
+from app.utils import redis as redis_utils
+
+
+def test_blocking_pool_reports_usage_and_timeouts(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    pool = redis_utils.InstrumentedBlockingConnectionPool(
+        connection_class=fakeredis.FakeConnection,
+        server=fakeredis.FakeServer(),
+        max_connections=2,
+        timeout=0.05,
+    )
+    client = redis.Redis(connection_pool=pool)
+    monkeypatch.setattr(redis_utils, "_redis_client", client)
+    client.set("key", "value")
+
+    held = [pool.get_connection(), pool.get_connection()]
+    with pytest.raises(redis.ConnectionError):
+        client.get("key")
+    usage = redis_utils.pool_stats()["sync"]
+    assert usage["max_connections"] == 2
+    assert usage["in_use"] == 2 and usage["idle"] == 0
+    assert usage["timeouts"] == 1
+    assert usage["wait_ms_max"] >= 50
+
+    for connection in held:
+        pool.release(connection)
+    assert client.get("key") == b"value"
+    assert redis_utils.pool_stats()["sync"]["checkouts"] == 5
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import json
+from urllib.parse import parse_qs
+
+import fakeredis
+import httpx
+import pytest
+
+from app.services.telegram_bot import (
+    SharedTokenBucket,
+    TelegramRateLimitedError,
+    TelegramSender,
+    TokenBucket,
+)
+from app.utils import redis as redis_utils
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def mock_telegram(
+    flood_waits: dict[int, list[int]]
+) -> tuple[httpx.MockTransport, list[int]]:
+    """Minimal Bot API stand-in: answers 429 with queued retry_after values first."""
+    delivered: list[int] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        chat_id = int(parse_qs(request.content.decode())["chat_id"][0])
+        pending = flood_waits.get(chat_id) or []
+        if pending:
+            retry_after = pending.pop(0)
+            body = {
+                "ok": False,
+                "error_code": 429,
+                "parameters": {"retry_after": retry_after},
+            }
+            return httpx.Response(429, content=json.dumps(body))
+        delivered.append(chat_id)
+        return httpx.Response(
+            200, json={"ok": True, "result": {"chat": {"id": chat_id}}}
+        )
+
+    return httpx.MockTransport(handler), delivered
+
+
+def test_sender_honours_retry_after_and_rate_limits() -> None:
+    clock = FakeClock()
+    transport, delivered = mock_telegram({10: [3], 20: [1, 1, 1, 1]})
+    sender = TelegramSender(
+        api_base="https://telegram.test/botTOKEN",
+        client=httpx.Client(transport=transport),
+        per_chat_interval=1.0,
+        max_retries=2,
+        concurrency=1,
+        clock=clock,
+        sleep=clock.sleep,
+        global_bucket=TokenBucket(30.0, clock=clock, sleep=clock.sleep),
+    )
+
+    assert sender.send_message(10, "hello")["ok"] is True
+    # The flood wait pauses the whole sender for retry_after seconds.
+    assert clock.now >= 3
+
+    results = sender.send_many([10, 30, 20, 30], "digest")
+    assert set(results) == {10, 20, 30}
+    assert isinstance(results[20], TelegramRateLimitedError)
+    assert delivered == [10, 10, 30]
+
+    # A second message to the same chat waits for its per-chat slot.
+    before = clock.now
+    sender.send_message(30, "again")
+    assert clock.now - before >= 1.0 - 1e-9
+
+
+class ThrottledError(Exception):
+    pass
+
+
+def refuse_wait(seconds: float) -> None:
+    raise ThrottledError(seconds)
+
+
+def test_shared_bucket_is_one_budget_across_processes(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(
+        redis_utils, "_redis_client", fakeredis.FakeRedis(decode_responses=True)
+    )
+    # Two senders in different processes draw from the same Redis key.
+    first, second = (
+        SharedTokenBucket("rl:telegram:test", 2.0, sleep=refuse_wait) for _ in range(2)
+    )
+    first.acquire()
+    second.acquire()
+    with pytest.raises(ThrottledError):
+        first.acquire()
+
+    # A flood wait hit by one process holds back the others too.
+    paused, other = (
+        SharedTokenBucket("rl:telegram:paused", 10.0, sleep=refuse_wait)
+        for _ in range(2)
+    )
+    paused.pause(5)
+    with pytest.raises(ThrottledError) as waited:
+        other.acquire()
+    assert waited.value.args[0] > 4.9
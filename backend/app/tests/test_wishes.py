@@ -3,29 +3,37 @@ from __future__ import annotations
 import hashlib
 import hmac
 import json
-from datetime import datetime, timezone
+from datetime import UTC, datetime
 from decimal import Decimal
 
+import pytest
 from fastapi.testclient import TestClient
 
+from app.models.enums import WishlistVisibility
+from app.utils.pagination import encode_cursor
+
 BOT_TOKEN = "123456:TEST"
 
 
 def build_init_data(user_payload: dict) -> str:
-    auth_date = int(datetime.now(tz=timezone.utc).timestamp())
+    auth_date = int(datetime.now(tz=UTC).timestamp())
     data = {
         "auth_date": str(auth_date),
         "query_id": "AAEAAAE",
         "user": json.dumps(user_payload, separators=(",", ":")),
     }
     data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(data.items()))
-    secret_key = hmac.new("WebAppData".encode(), BOT_TOKEN.encode(), hashlib.sha256).digest()
-    hash_value = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    secret_key = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    hash_value = hmac.new(
+        secret_key, data_check_string.encode(), hashlib.sha256
+    ).hexdigest()
     data["hash"] = hash_value
     return "&".join(f"{k}={v}" for k, v in data.items())
 
 
-def authenticate(client: TestClient, user_id: int = 1, username: str = "wishlist_owner") -> str:
+def authenticate(
+    client: TestClient, user_id: int = 1, username: str = "wishlist_owner"
+) -> str:
     payload = {
         "id": user_id,
         "username": username,
@@ -92,3 +100,477 @@ def test_wish_crud_flow(client: TestClient) -> None:
     list_response_after = client.get("/api/wishes")
     assert list_response_after.status_code == 200
     assert list_response_after.json()["total"] == 0
+
+
+def test_wish_cursor_pagination(client: TestClient) -> None:
+    csrf_token = authenticate(client)
+    wishlist_id = client.get("/api/wishlists/mine").json()[0]["id"]
+
+    prices = ["30.00", None, "10.00", "20.00", None]
+    for index, price in enumerate(prices):
+        response = client.post(
+            "/api/wishes",
+            json={"wishlist_id": wishlist_id, "title": f"Wish {index}", "price": price},
+            headers={"X-CSRF-Token": csrf_token},
+        )
+        assert response.status_code == 201
+
+    for sort in ("position", "price"):
+        first_page = client.get(
+            "/api/wishes", params={"sort": sort, "per_page": 2}
+        ).json()
+        assert first_page["total"] == len(prices)
+        seen = [item["id"] for item in first_page["items"]]
+        cursor = first_page["next_cursor"]
+        while cursor:
+            page = client.get(
+                "/api/wishes", params={"sort": sort, "per_page": 2, "cursor": cursor}
+            ).json()
+            assert page["total"] is None
+            seen.extend(item["id"] for item in page["items"])
+            cursor = page["next_cursor"]
+        assert len(seen) == len(set(seen)) == len(prices)
+
+    price_order = client.get(
+        "/api/wishes", params={"sort": "price", "per_page": 100}
+    ).json()["items"]
+    assert [item["price"] for item in price_order][:3] == ["10.00", "20.00", "30.00"]
+
+    bad_cursor = client.get(
+        "/api/wishes", params={"sort": "price", "cursor": "not-a-cursor"}
+    )
+    assert bad_cursor.status_code == 400
+    # Well-formed cursors with values the sort column can't hold are rejected too.
+    for sort, value in (
+        ("price", "abc"),
+        ("position", [1]),
+        ("priority", "urgent"),
+        ("created_at", 10**30),
+    ):
+        tampered = encode_cursor(sort, value, 1)
+        assert (
+            client.get(
+                "/api/wishes", params={"sort": sort, "cursor": tampered}
+            ).status_code
+            == 400
+        )
+
+
+def test_wish_write_goes_through_outbox(client: TestClient) -> None:
+    from app import worker
+    from app.models.event import Event, EventAction
+    from app.models.notification import Notification
+    from app.tests.conftest import TestingSessionLocal, relay_outbox
+
+    csrf_token = authenticate(client)
+    wishlist_id = client.get("/api/wishlists/mine").json()[0]["id"]
+    created = client.post(
+        "/api/wishes",
+        json={"wishlist_id": wishlist_id, "title": "Lamp"},
+        headers={"X-CSRF-Token": csrf_token},
+    ).json()
+    client.patch(
+        f"/api/wishes/{created['id']}",
+        json={"price": "15.50"},
+        headers={"X-CSRF-Token": csrf_token},
+    )
+
+    with TestingSessionLocal() as session:
+        recorded = session.query(Event).order_by(Event.id).all()
+        assert [event.action for event in recorded] == [
+            EventAction.CREATE,
+            EventAction.UPDATE,
+        ]
+        assert recorded[1].diff == {"price": "15.50"}
+        assert all(event.dispatched_at is None for event in recorded)
+        assert session.query(Notification).count() == 0
+
+    assert client.get("/api/debug/outbox").json()["pending"] == 2
+    assert relay_outbox() == 2
+    assert relay_outbox() == 0
+    assert client.get("/api/debug/outbox").json()["pending"] == 0
+
+    with TestingSessionLocal() as session:
+        events = session.query(Event).all()
+        assert all(event.dispatched_at and event.processed_at for event in events)
+    # Redelivery of an already applied event is a no-op.
+    assert worker.expand_wish_event(recorded[0].id) == 0
+
+
+def test_debug_endpoints_need_the_operator_token_in_production(
+    client: TestClient, monkeypatch
+) -> None:
+    from app.config import settings
+
+    authenticate(client)
+    monkeypatch.setattr(settings, "env", "production")
+    monkeypatch.setattr(settings, "operator_token", "s3cret")
+    for path in ("outbox", "user-cache", "redis", "db-pool"):
+        # A user session alone is not enough.
+        assert client.get(f"/api/debug/{path}").status_code == 403
+        assert (
+            client.get(
+                f"/api/debug/{path}", headers={"X-Operator-Token": "guess"}
+            ).status_code
+            == 403
+        )
+        client.cookies.clear()
+        assert (
+            client.get(
+                f"/api/debug/{path}", headers={"X-Operator-Token": "s3cret"}
+            ).status_code
+            == 200
+        )
+        authenticate(client)
+
+
+def test_failed_event_expansion_is_not_marked_processed(
+    client: TestClient, monkeypatch
+) -> None:
+    from app import worker
+    from app.models.event import Event
+    from app.models.notification import Notification
+    from app.tests.conftest import TestingSessionLocal, relay_outbox
+
+    authenticate(client)
+    follower_csrf = authenticate(client, user_id=2, username="follower")
+    assert (
+        client.post(
+            "/api/subscriptions/wishlist_owner",
+            headers={"X-CSRF-Token": follower_csrf},
+        ).status_code
+        == 201
+    )
+    csrf_token = authenticate(client)
+    wishlist_id = client.get("/api/wishlists/mine").json()[0]["id"]
+    client.post(
+        "/api/wishes",
+        json={"wishlist_id": wishlist_id, "title": "Lamp"},
+        headers={"X-CSRF-Token": csrf_token},
+    )
+
+    fan_out = worker.timeline.fan_out
+
+    def database_error(*args, **kwargs):
+        raise ConnectionError("database unavailable")
+
+    monkeypatch.setattr(worker.timeline, "fan_out", database_error)
+    with pytest.raises(ConnectionError):
+        relay_outbox()
+    with TestingSessionLocal() as session:
+        event = session.query(Event).one()
+        assert event.dispatched_at is not None
+        assert event.processed_at is None
+        assert session.query(Notification).count() == 0
+
+    # Out of retries: the event goes back to the relay instead of getting stuck.
+    monkeypatch.setattr(worker.expand_wish_event, "max_retries", 0)
+    with pytest.raises(ConnectionError):
+        worker.expand_wish_event(event.id)
+    with TestingSessionLocal() as session:
+        event = session.get(Event, event.id)
+        assert event.dispatched_at is None
+        assert event.processed_at is None
+
+    # The next delivery expands the event, and notifications are only dispatched
+    # once they are committed.
+    monkeypatch.setattr(worker.timeline, "fan_out", fan_out)
+    dispatched: list[int] = []
+
+    def dispatch(notifications, wish_id):
+        with TestingSessionLocal() as session:
+            ids = [notification.id for notification in notifications]
+            assert session.query(Notification).filter(Notification.id.in_(ids)).count()
+            assert session.get(Event, event.id).processed_at is not None
+        dispatched.extend(ids)
+
+    monkeypatch.setattr(worker, "_dispatch_notifications", dispatch)
+    assert relay_outbox() == 1
+    assert len(dispatched) == 1
+
+
+def test_wish_enrichment_fills_missing_fields(client: TestClient, monkeypatch) -> None:
+    import httpx
+
+    from app import worker
+    from app.models.event import Event, EventAction
+    from app.services import link_preview
+    from app.tests.conftest import TestingSessionLocal, relay_outbox
+
+    page = (
+        '<html><head><meta property="og:title" content="Shop title">'
+        '<meta property="og:description" content="From the shop">'
+        '<meta property="og:image" content="https://cdn.example.com/kettle.jpg"></head></html>'
+    )
+    upstream_calls: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        upstream_calls.append(str(request.url))
+        return httpx.Response(200, text=page, headers={"Content-Type": "text/html"})
+
+    monkeypatch.setattr(
+        link_preview,
+        "_sync_client",
+        httpx.Client(transport=httpx.MockTransport(handler)),
+    )
+
+    csrf_token = authenticate(client)
+    wishlist_id = client.get("/api/wishlists/mine").json()[0]["id"]
+    created_ids = []
+    for title in ("Kettle", "Second kettle"):
+        response = client.post(
+            "/api/wishes",
+            params={"enrich": "true"},
+            json={
+                "wishlist_id": wishlist_id,
+                "title": title,
+                "url": "https://shop.example.com/kettle",
+            },
+            headers={"X-CSRF-Token": csrf_token},
+        )
+        assert response.status_code == 201
+        assert response.json()["image_url"] is None
+        created_ids.append(response.json()["id"])
+    client.post(
+        "/api/wishes",
+        json={
+            "wishlist_id": wishlist_id,
+            "title": "Manual",
+            "url": "https://shop.example.com/kettle",
+        },
+        headers={"X-CSRF-Token": csrf_token},
+    )
+    # Requested in the write transaction, fetched once the relay publishes it.
+    with TestingSessionLocal() as session:
+        requested = (
+            session.query(Event.entity_id)
+            .filter(Event.action == EventAction.ENRICH)
+            .order_by(Event.id)
+        )
+        assert [entity_id for (entity_id,) in requested] == created_ids
+    assert upstream_calls == []
+    relay_outbox()
+    assert len(upstream_calls) == 1
+
+    items = {
+        item["id"]: item
+        for item in client.get("/api/wishes", params={"sort": "position"}).json()[
+            "items"
+        ]
+    }
+    enriched = items[created_ids[0]]
+    assert enriched["title"] == "Kettle"
+    assert enriched["description"] == "From the shop"
+    assert enriched["image_url"] == "https://cdn.example.com/kettle.jpg"
+    # Nothing left to fill, so a repeated job is a no-op.
+    assert worker.enrich_wish_preview(created_ids[0]) is False
+
+
+def test_public_wishlist_and_profile_revalidate_with_etag(client: TestClient) -> None:
+    csrf_token = authenticate(client)
+    headers = {"X-CSRF-Token": csrf_token}
+    wishlist_id = client.get("/api/wishlists/mine").json()[0]["id"]
+
+    first = client.get("/api/users/wishlist_owner/wishlist")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"].startswith("public")
+
+    cached = client.get(
+        "/api/users/wishlist_owner/wishlist", headers={"If-None-Match": f"W/{etag}"}
+    )
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+
+    wish_id = client.post(
+        "/api/wishes",
+        json={"wishlist_id": wishlist_id, "title": "Lamp"},
+        headers=headers,
+    ).json()["id"]
+    changed = client.get(
+        "/api/users/wishlist_owner/wishlist", headers={"If-None-Match": etag}
+    )
+    assert changed.status_code == 200
+    assert [wish["title"] for wish in changed.json()["wishes"]] == ["Lamp"]
+
+    client.post(
+        "/api/wishes/reorder", json=[{"id": wish_id, "position": 7}], headers=headers
+    )
+    reordered = client.get(
+        "/api/users/wishlist_owner/wishlist",
+        headers={"If-None-Match": changed.headers["ETag"]},
+    )
+    assert reordered.status_code == 200
+    assert reordered.json()["wishes"][0]["position"] == 7
+
+    profile = client.get("/api/users/wishlist_owner")
+    assert profile.json()["display_name"] == "Owner User"
+    profile_etag = profile.headers["ETag"]
+    assert (
+        client.get(
+            "/api/users/wishlist_owner", headers={"If-None-Match": profile_etag}
+        ).status_code
+        == 304
+    )
+
+    client.patch("/api/me", json={"display_name": "Renamed"}, headers=headers)
+    renamed = client.get(
+        "/api/users/wishlist_owner", headers={"If-None-Match": profile_etag}
+    )
+    assert renamed.status_code == 200
+    assert renamed.json()["display_name"] == "Renamed"
+
+
+def test_public_wishlist_page_is_cached_until_a_write(client: TestClient) -> None:
+    import asyncio
+
+    from app.models.wish import Wish
+    from app.services import wishlist_cache
+    from app.tests.conftest import TestingSessionLocal
+
+    csrf_token = authenticate(client)
+    headers = {"X-CSRF-Token": csrf_token}
+    wishlist = client.get("/api/wishlists/mine").json()[0]
+    wish_id = client.post(
+        "/api/wishes",
+        json={"wishlist_id": wishlist["id"], "title": "Scarf"},
+        headers=headers,
+    ).json()["id"]
+    assert (
+        client.get("/api/users/wishlist_owner/wishlist").json()["wishes"][0]["title"]
+        == "Scarf"
+    )
+
+    # Served from Redis: a change that skipped the version bump stays invisible.
+    with TestingSessionLocal() as session:
+        session.get(Wish, wish_id).title = "Hat"
+        session.commit()
+    assert (
+        client.get("/api/users/wishlist_owner/wishlist").json()["wishes"][0]["title"]
+        == "Scarf"
+    )
+
+    client.patch(
+        f"/api/wishes/{wish_id}", json={"description": "Wool"}, headers=headers
+    )
+    fresh = client.get("/api/users/wishlist_owner/wishlist").json()["wishes"][0]
+    assert (fresh["title"], fresh["description"]) == ("Hat", "Wool")
+
+    # A render of an older version can't overwrite the tombstone of a newer one.
+    owner_id = wishlist["owner_id"]
+    wishlist_cache.invalidate({owner_id: 100})
+    renders: list[int] = []
+
+    async def render(version: int) -> wishlist_cache.CachedPage:
+        renders.append(version)
+        await asyncio.sleep(0.1)
+        return wishlist_cache.CachedPage(
+            owner_id, wishlist["id"], version, WishlistVisibility.PUBLIC, b"{}"
+        )
+
+    async def concurrent(version: int) -> list:
+        return await asyncio.gather(
+            *(wishlist_cache.fetch(owner_id, lambda: render(version)) for _ in range(5))
+        )
+
+    assert {page.version for page in asyncio.run(concurrent(99))} == {99}
+    assert len(renders) == 5  # nothing could be stored, so every waiter rendered itself
+    renders.clear()
+    assert {page.version for page in asyncio.run(concurrent(100))} == {100}
+    assert renders == [100]
+
+
+def test_wishlist_revalidation_after_a_cache_miss_skips_rendering(
+    client: TestClient,
+) -> None:
+    import asyncio
+
+    from app.services import wishlist_cache
+    from app.utils.redis import get_redis
+
+    csrf_token = authenticate(client)
+    owner_id = client.get("/api/wishlists/mine").json()[0]["owner_id"]
+    etag = client.get("/api/users/wishlist_owner/wishlist").headers["ETag"]
+
+    get_redis().delete(wishlist_cache.cache_key(owner_id))
+    revalidated = client.get(
+        "/api/users/wishlist_owner/wishlist", headers={"If-None-Match": etag}
+    )
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+    # Answered from the version alone: no page was rendered into the cache.
+    assert asyncio.run(wishlist_cache.get(owner_id)) is None
+
+    assert client.get("/api/users/wishlist_owner/wishlist").status_code == 200
+    assert asyncio.run(wishlist_cache.get(owner_id)) is not None
+    # The shared page is the first wishlist, so a new one leaves it cached.
+    created = client.post(
+        "/api/wishlists",
+        json={"title": "Second"},
+        headers={"X-CSRF-Token": csrf_token},
+    )
+    assert created.status_code == 201
+    page = asyncio.run(wishlist_cache.get(owner_id))
+    assert page is not None and page.etag == etag
+
+    # Without a cached page, the create leaves a tombstone at its version.
+    get_redis().delete(wishlist_cache.cache_key(owner_id))
+    client.post(
+        "/api/wishlists",
+        json={"title": "Third"},
+        headers={"X-CSRF-Token": csrf_token},
+    )
+    assert get_redis().get(wishlist_cache.cache_key(owner_id)) == "1\n"
+
+
+def test_wish_search(client: TestClient) -> None:
+    from sqlalchemy import select
+    from sqlalchemy.dialects import postgresql
+
+    from app.models.wish import Wish
+    from app.services import wish_search
+
+    csrf_token = authenticate(client)
+    wishlist_id = client.get("/api/wishlists/mine").json()[0]["id"]
+    for title, description in (
+        ("Чайник", "Электрический"),
+        ("Tea set", "Porcelain kettle"),
+        ("Lamp", None),
+    ):
+        client.post(
+            "/api/wishes",
+            json={
+                "wishlist_id": wishlist_id,
+                "title": title,
+                "description": description,
+            },
+            headers={"X-CSRF-Token": csrf_token},
+        )
+
+    # SQLite has no full-text search: q is a substring match and relevance isn't
+    # available.
+    for q, titles in (
+        ("KETTLE", ["Tea set"]),
+        ("айник", ["Чайник"]),
+        ("a", ["Tea set", "Lamp"]),
+    ):
+        params = {"q": q, "sort": "position", "per_page": 1}
+        found = client.get("/api/wishes", params=params).json()
+        seen = [item["title"] for item in found["items"]]
+        while found["next_cursor"]:
+            found = client.get(
+                "/api/wishes", params={**params, "cursor": found["next_cursor"]}
+            ).json()
+            seen.extend(item["title"] for item in found["items"])
+        assert seen == titles
+    relevance = client.get("/api/wishes", params={"q": "a", "sort": "relevance"})
+    assert relevance.json()["total"] == 2
+
+    clause, rank = wish_search.full_text("чайник")
+    sql = str(
+        select(Wish.id, rank).where(clause).compile(dialect=postgresql.dialect())
+    ).replace("%%", "%")
+    assert "wishes.search_vector @@ (websearch_to_tsquery(" in sql
+    assert "<% wishes.title" in sql
+    assert "ts_rank_cd(wishes.search_vector" in sql
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import hashlib
+
+from fastapi import Request, Response, status
+
+from app.config import settings
+
+
+def strong_etag(*parts: object) -> str:
+    return '"' + ".".join(str(part) for part in parts) + '"'
+
+
+def content_etag(body: bytes) -> str:
+    return strong_etag(hashlib.blake2b(body, digest_size=16).hexdigest())
+
+
+def cache_control(public: bool) -> str:
+    """Public pages may sit in nginx's micro-cache; anything else stays private."""
+    if public:
+        return (
+            "public, max-age=0, must-revalidate, "
+            f"s-maxage={settings.public_cache_seconds}"
+        )
+    return "private, no-cache"
+
+
+def matches(request: Request, etag: str) -> bool:
+    """``If-None-Match`` check; weak comparison, as gzip in nginx weakens our tags."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in {
+        candidate.strip().removeprefix("W/") for candidate in header.split(",")
+    }
+
+
+def not_modified(etag: str, cache_control_value: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": cache_control_value},
+    )
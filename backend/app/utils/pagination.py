@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+
+from fastapi import HTTPException, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+def to_micros(value: datetime) -> int:
+    """Exact integer microseconds since the epoch; naive values are treated as UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return to_micros(value)
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def encode_cursor(key: str, value: Any, last_id: int) -> str:
+    """Opaque keyset cursor for rows ordered by ``(key, id)``."""
+    raw = json.dumps(
+        {"k": key, "v": _dump_value(value), "id": last_id}, separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: str, key: str, parse: Callable[[Any], Any] | None = None
+) -> tuple[Any, int]:
+    """Return the ``(value, id)`` pair of a cursor issued for ``key``.
+
+    ``parse`` converts the value back to the sort column's type; a value it
+    rejects makes the cursor invalid like any other tampering.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if data["k"] != key:
+            raise ValueError("cursor issued for another ordering")
+        value = data["v"] if parse is None else parse(data["v"])
+        return value, int(data["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError, ArithmeticError) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        ) from exc
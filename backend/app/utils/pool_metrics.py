@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import time
+
+
+class PoolMetrics:
+    """Checkout counters for sizing a pool: how often and how long callers waited."""
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, started: float, timed_out: bool) -> None:
+        waited = time.perf_counter() - started
+        self.checkouts += 1
+        self.timeouts += timed_out
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            "checkouts": float(self.checkouts),
+            "timeouts": float(self.timeouts),
+            "wait_ms_avg": (
+                self.wait_seconds_total * 1000 / self.checkouts
+                if self.checkouts
+                else 0.0
+            ),
+            "wait_ms_max": self.wait_seconds_max * 1000,
+        }
@@ -1,23 +1,106 @@
 from __future__ import annotations
 
-from fastapi import HTTPException, Request, status
+import math
+import time
+from collections.abc import Callable
+from typing import cast
+
+from fastapi import HTTPException, Request, Response, status
+from loguru import logger
+from redis import Redis
+from redis.commands.core import Script
+from redis.exceptions import RedisError
 
 from app.utils.redis import get_redis
+from app.utils.ttl_cache import TTLCache
+
+# GCRA: the key holds the theoretical arrival time (TAT) of the next request in
+# milliseconds. A request is allowed while it arrives no earlier than TAT minus
+# the burst tolerance; the key expires once the bucket would be full again.
+# Server time keeps every app node on one clock; all in a single round trip.
+GCRA_SCRIPT = """
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+  tat = now
+end
+local new_tat = tat + emission
+local allow_at = new_tat - tolerance
+if now < allow_at then
+  return {0, 0, allow_at - now, tat - now}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+return {1, math.floor((now - allow_at) / emission), 0, new_tat - now}
+"""
+
+# Clients already told to back off are refused here until Retry-After passes.
+_blocked: TTLCache[str, float] = TTLCache(maxsize=10_000, ttl=3600)
+
+_redis_client: Redis | None = None
+_script: Script | None = None
+
+
+def _gcra() -> Script:
+    global _redis_client, _script
+    redis = get_redis()
+    if _script is None or redis is not _redis_client:
+        _redis_client, _script = redis, redis.register_script(GCRA_SCRIPT)
+    return _script
+
 
+def _limited(limit: int, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Rate limit exceeded. Please slow down.",
+        headers={
+            "Retry-After": str(max(1, math.ceil(retry_after))),
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Remaining": "0",
+            "X-RateLimit-Reset": str(max(1, math.ceil(retry_after))),
+        },
+    )
 
-def rate_limit(scope: str, limit: int = 30, window: int = 60):
-    def dependency(request: Request) -> None:
-        redis = get_redis()
+
+def rate_limit(
+    scope: str, limit: int = 30, window: int = 60
+) -> Callable[[Request, Response], None]:
+    """Allow ``limit`` requests per ``window`` seconds, smoothly refilled (GCRA).
+
+    Unlike a fixed window, a burst of ``limit`` requests cannot be repeated
+    right after a window edge. If Redis is unavailable requests are let through.
+    """
+    emission_ms = window * 1000 / limit
+    tolerance_ms = emission_ms * limit
+
+    def dependency(request: Request, response: Response) -> None:
         user = getattr(request.state, "user", None)
-        identifier = getattr(user, "id", None) or request.client.host or "anonymous"
+        host = request.client.host if request.client else None
+        identifier = getattr(user, "id", None) or host or "anonymous"
         key = f"rl:{scope}:{identifier}"
-        current = redis.incr(key)
-        if current == 1:
-            redis.expire(key, window)
-        if current > limit:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Rate limit exceeded. Please slow down.",
+
+        blocked_until = _blocked.get(key)
+        if blocked_until is not None and blocked_until > time.monotonic():
+            raise _limited(limit, blocked_until - time.monotonic())
+
+        try:
+            # The script replies with four Lua integers.
+            reply = cast(
+                list[int], _gcra()(keys=[key], args=[emission_ms, tolerance_ms])
             )
+            allowed, remaining, retry_after_ms, reset_ms = reply
+        except RedisError as exc:
+            logger.warning("Rate limiter unavailable for {}: {}", key, exc)
+            return
+        if not allowed:
+            retry_after = retry_after_ms / 1000
+            _blocked.set(key, time.monotonic() + retry_after)
+            raise _limited(limit, retry_after)
+
+        response.headers["X-RateLimit-Limit"] = str(limit)
+        response.headers["X-RateLimit-Remaining"] = str(remaining)
+        response.headers["X-RateLimit-Reset"] = str(math.ceil(reset_ms / 1000))
 
     return dependency
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import time
+from http.cookies import SimpleCookie
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def pinned_to_primary(connection: HTTPConnection) -> bool:
+    """Whether this client wrote so recently that a replica may not have it yet."""
+    raw = connection.cookies.get(settings.primary_cookie_name)
+    try:
+        until = float(raw) if raw else 0.0
+    except ValueError:
+        return False
+    now = time.time()
+    # A value further out than one window was not set by us; ignore it.
+    return now < until <= now + settings.read_your_writes_seconds + 1
+
+
+def _primary_cookie() -> str:
+    window = settings.read_your_writes_seconds
+    cookie: SimpleCookie = SimpleCookie()
+    name = settings.primary_cookie_name
+    cookie[name] = str(int(time.time()) + window)
+    cookie[name]["max-age"] = window
+    cookie[name]["path"] = "/"
+    cookie[name]["httponly"] = True
+    cookie[name]["samesite"] = "lax"
+    if settings.is_prod:
+        cookie[name]["secure"] = True
+    return cookie.output(header="").strip()
+
+
+class ReadYourWritesMiddleware:
+    """Pin a client's reads to the primary for a short window after it writes.
+
+    Every successful unsafe request sets a short-lived cookie; read-only
+    dependencies see it and skip the replica, so users always read their own
+    changes. The cookie travels with the client, so any API node honours it.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                MutableHeaders(scope=message).append("set-cookie", _primary_cookie())
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
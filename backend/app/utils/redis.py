@@ -1,14 +1,144 @@
 from __future__ import annotations
 
+import time
+from typing import Any, cast
+
 import redis
+import redis.asyncio as aioredis
+from redis.asyncio.connection import AbstractConnection
+from redis.connection import Connection
 
 from app.config import settings
+from app.utils.pool_metrics import PoolMetrics
+
+NO_CONNECTION = "No connection available."
+
+
+class InstrumentedBlockingConnectionPool(redis.BlockingConnectionPool):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.metrics = PoolMetrics()
+        super().__init__(*args, **kwargs)
+
+    def get_connection(self, *args: Any, **kwargs: Any) -> Connection:
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return cast(Connection, super().get_connection(*args, **kwargs))
+        except redis.ConnectionError as exc:
+            timed_out = str(exc) == NO_CONNECTION
+            raise
+        finally:
+            self.metrics.record(started, timed_out)
+
+    def usage(self) -> dict[str, float]:
+        idle = sum(1 for connection in list(self.pool.queue) if connection is not None)
+        created = len(self._connections)
+        return {
+            "max_connections": float(self.max_connections),
+            "created": float(created),
+            "in_use": float(created - idle),
+            "idle": float(idle),
+            **self.metrics.as_dict(),
+        }
+
+
+class InstrumentedAsyncBlockingConnectionPool(aioredis.BlockingConnectionPool):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.metrics = PoolMetrics()
+        super().__init__(*args, **kwargs)
+
+    async def get_connection(self, *args: Any, **kwargs: Any) -> AbstractConnection:
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return cast(
+                AbstractConnection, await super().get_connection(*args, **kwargs)
+            )
+        except redis.ConnectionError as exc:
+            timed_out = str(exc) == NO_CONNECTION
+            raise
+        finally:
+            self.metrics.record(started, timed_out)
+
+    def usage(self) -> dict[str, float]:
+        in_use = len(self._in_use_connections)
+        idle = len(self._available_connections)
+        return {
+            "max_connections": float(self.max_connections),
+            "created": float(in_use + idle),
+            "in_use": float(in_use),
+            "idle": float(idle),
+            **self.metrics.as_dict(),
+        }
+
+
+def _pool_options(decode_responses: bool) -> dict[str, Any]:
+    return {
+        "max_connections": settings.redis_max_connections,
+        # How long a caller waits for a free connection before failing.
+        "timeout": settings.redis_pool_timeout_seconds,
+        "socket_timeout": settings.redis_socket_timeout_seconds,
+        "socket_connect_timeout": settings.redis_socket_connect_timeout_seconds,
+        "health_check_interval": settings.redis_health_check_interval_seconds,
+        "decode_responses": decode_responses,
+    }
+
 
 _redis_client: redis.Redis | None = None
+_binary_client: redis.Redis | None = None
+_async_client: aioredis.Redis | None = None
 
 
 def get_redis() -> redis.Redis:
+    """Shared client for structured data (sets, counters, queues); replies are str."""
     global _redis_client
     if _redis_client is None:
-        _redis_client = redis.Redis.from_url(settings.redis_url, decode_responses=True)
+        pool = InstrumentedBlockingConnectionPool.from_url(
+            settings.redis_url, **_pool_options(True)
+        )
+        _redis_client = redis.Redis(connection_pool=pool)
     return _redis_client
+
+
+def get_binary_redis() -> redis.Redis:
+    """Shared client for cached payloads; replies are raw bytes, nothing decoded."""
+    global _binary_client
+    if _binary_client is None:
+        pool = InstrumentedBlockingConnectionPool.from_url(
+            settings.redis_url, **_pool_options(False)
+        )
+        _binary_client = redis.Redis(connection_pool=pool)
+    return _binary_client
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Binary-safe client for async routes, so cache reads need no worker thread."""
+    global _async_client
+    if _async_client is None:
+        pool = InstrumentedAsyncBlockingConnectionPool.from_url(
+            settings.redis_url, **_pool_options(False)
+        )
+        _async_client = aioredis.Redis(connection_pool=pool)
+    return _async_client
+
+
+async def close_async_redis() -> None:
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def pool_stats() -> dict[str, dict[str, float]]:
+    """Connection usage and checkout waits of every pool this process has opened."""
+    clients = {"sync": _redis_client, "binary": _binary_client, "async": _async_client}
+    stats: dict[str, dict[str, float]] = {}
+    for name, client in clients.items():
+        pool = getattr(client, "connection_pool", None)
+        if isinstance(
+            pool,
+            InstrumentedBlockingConnectionPool
+            | InstrumentedAsyncBlockingConnectionPool,
+        ):
+            stats[name] = pool.usage()
+    return stats
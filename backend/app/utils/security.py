@@ -2,18 +2,20 @@ from __future__ import annotations
 
 import hashlib
 import hmac
-from typing import Optional
 
-from fastapi import Cookie, Depends, HTTPException, Request, status
+from fastapi import Cookie, Depends, Header, HTTPException, Request, status
 from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.config import settings
-from app.db import get_db
-from app.models.user import User
+from app.db import get_async_db, get_db
+from app.services import user_cache
+from app.services.user_cache import CachedUser
 
 SESSION_SALT = "wishlist-session"
 CSRF_SALT = "wishlist-csrf"
+OPERATOR_TOKEN_HEADER = "X-Operator-Token"
 
 
 def _session_serializer() -> URLSafeTimedSerializer:
@@ -30,13 +32,19 @@ def verify_session_token(token: str, max_age: int = 60 * 60 * 24 * 30) -> int:
     try:
         data = serializer.loads(token, max_age=max_age)
     except SignatureExpired as exc:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Session expired") from exc
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Session expired"
+        ) from exc
     except BadSignature as exc:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid session") from exc
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid session"
+        ) from exc
 
     user_id = data.get("user_id")
     if not user_id:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid session payload")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid session payload"
+        )
     return int(user_id)
 
 
@@ -57,15 +65,19 @@ def validate_csrf_token(session_token: str, csrf_token: str) -> bool:
 def get_current_user(
     request: Request,
     db: Session = Depends(get_db),
-    session_token: Optional[str] = Cookie(None, alias=settings.session_cookie_name),
-) -> User:
+    session_token: str | None = Cookie(None, alias=settings.session_cookie_name),
+) -> CachedUser:
     if not session_token:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated"
+        )
 
     user_id = verify_session_token(session_token)
-    user = db.get(User, user_id)
+    user = user_cache.get_user(db, user_id)
     if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
+        )
     request.state.session_token = session_token
     request.state.user = user
     return user
@@ -74,15 +86,54 @@ def get_current_user(
 def get_optional_user(
     request: Request,
     db: Session = Depends(get_db),
-    session_token: Optional[str] = Cookie(None, alias=settings.session_cookie_name),
-) -> User | None:
+    session_token: str | None = Cookie(None, alias=settings.session_cookie_name),
+) -> CachedUser | None:
     if not session_token:
         return None
     try:
         user_id = verify_session_token(session_token)
     except HTTPException:
         return None
-    user = db.get(User, user_id)
+    user = user_cache.get_user(db, user_id)
+    if user:
+        request.state.session_token = session_token
+        request.state.user = user
+    return user
+
+
+async def get_current_user_async(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    session_token: str | None = Cookie(None, alias=settings.session_cookie_name),
+) -> CachedUser:
+    if not session_token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated"
+        )
+
+    user_id = verify_session_token(session_token)
+    user = await user_cache.get_user_async(db, user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
+        )
+    request.state.session_token = session_token
+    request.state.user = user
+    return user
+
+
+async def get_optional_user_async(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    session_token: str | None = Cookie(None, alias=settings.session_cookie_name),
+) -> CachedUser | None:
+    if not session_token:
+        return None
+    try:
+        user_id = verify_session_token(session_token)
+    except HTTPException:
+        return None
+    user = await user_cache.get_user_async(db, user_id)
     if user:
         request.state.session_token = session_token
         request.state.user = user
@@ -96,13 +147,42 @@ def csrf_protect(request: Request) -> None:
     if not session_token:
         session_token = request.cookies.get(settings.session_cookie_name)
     if not session_token:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated"
+        )
 
     header_token = request.headers.get(settings.csrf_header_name)
     cookie_token = request.cookies.get(settings.csrf_cookie_name)
 
     if not header_token or not cookie_token:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Missing CSRF token")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Missing CSRF token"
+        )
+
+    if not (
+        validate_csrf_token(session_token, header_token)
+        and header_token == cookie_token
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid CSRF token"
+        )
 
-    if not (validate_csrf_token(session_token, header_token) and header_token == cookie_token):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid CSRF token")
+
+def operator_protect(
+    request: Request,
+    db: Session = Depends(get_db),
+    session_token: str | None = Cookie(None, alias=settings.session_cookie_name),
+    operator_token: str | None = Header(None, alias=OPERATOR_TOKEN_HEADER),
+) -> None:
+    """Operator-only endpoints: the operator token, or any session outside prod."""
+    if (
+        operator_token
+        and settings.operator_token
+        and hmac.compare_digest(operator_token, settings.operator_token)
+    ):
+        return
+    if settings.is_prod:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Operator token required"
+        )
+    get_current_user(request, db, session_token)
@@ -1,16 +1,38 @@
 from __future__ import annotations
 
-from collections.abc import Iterable
+from collections.abc import Iterable, Sequence
+from datetime import UTC, datetime
 from decimal import Decimal, InvalidOperation
 from html import escape
+from typing import Any, cast
 
+import httpx
 from celery import Celery
+from loguru import logger
+from sqlalchemy import CursorResult, func, select, update
 from sqlalchemy.orm import Session, selectinload
 
 from app.config import settings
 from app.db import SessionLocal
+from app.models.enums import NotificationType
+from app.models.event import Event, EventAction, EventEntity
+from app.models.media import MediaAsset
 from app.models.notification import Notification
-from app.services import notify, telegram_bot
+from app.models.user import User
+from app.models.wish import Wish
+from app.models.wishlist import Wishlist
+from app.services import (
+    images,
+    link_preview,
+    media,
+    notify,
+    outbox,
+    telegram_bot,
+    timeline,
+    wishlist_cache,
+    wishlist_versions,
+)
+from app.services.storage import get_storage
 
 PRIORITY_LABELS: dict[str, str] = {
     "low": "Низкий",
@@ -68,9 +90,124 @@ celery_app.conf.update(
     accept_content=["json"],
     result_serializer="json",
     beat_scheduler="celery.beat:PersistentScheduler",
+    beat_schedule={
+        "notifications-flush-digests": {
+            "task": "notifications.flush_digests",
+            "schedule": float(settings.notify_flush_interval_seconds),
+        },
+        "media-collect-garbage": {
+            "task": "media.collect_garbage",
+            "schedule": float(settings.media_gc_interval_seconds),
+        },
+    },
 )
 
 
+def _format_message(payload: dict) -> str:
+    title = payload.get("title") or DEFAULT_NOTIFICATION_TITLE
+    owner = payload.get("owner", {})
+    display_name = owner.get("display_name") or ""
+    deep_link = payload.get("deep_link")
+    priority = payload.get("priority")
+    status = payload.get("status")
+    price = payload.get("price")
+    url = payload.get("url")
+    tags = payload.get("tags", [])
+    description = payload.get("description") or ""
+    wishlist = payload.get("wishlist") or {}
+    wishlist_title = wishlist.get("title")
+
+    message_lines: list[str] = []
+    if display_name:
+        message_lines.append(f"Обновления от <b>{escape(display_name)}</b>")
+    else:
+        message_lines.append(DEFAULT_OWNER_LINE)
+
+    if wishlist_title:
+        message_lines.append(f"<b>Список:</b> {escape(str(wishlist_title))}")
+
+    safe_title = escape(str(title))
+    message_lines.append(f"<b>Желание:</b> {safe_title}")
+
+    if description:
+        safe_description = escape(str(description)).replace("\n", "<br/>")
+        message_lines.append(f"<b>Описание:</b> {safe_description}")
+
+    localized_priority = _localize(PRIORITY_LABELS, priority)
+    if localized_priority:
+        message_lines.append(f"<b>Приоритет:</b> {escape(localized_priority)}")
+
+    localized_status = _localize(STATUS_LABELS, status)
+    if localized_status:
+        message_lines.append(f"<b>Статус:</b> {escape(localized_status)}")
+
+    formatted_price = _format_price(price)
+    if formatted_price:
+        message_lines.append(f"<b>Цена:</b> {formatted_price}")
+
+    if isinstance(tags, list | tuple | set):
+        sanitized_tags = _sanitize_tags(tags)
+    else:
+        sanitized_tags = []
+    if sanitized_tags:
+        message_lines.append("<b>Теги:</b> " + ", ".join(sanitized_tags))
+
+    if url:
+        escaped_url = escape(str(url))
+        message_lines.append(
+            f'<b>Ссылка:</b> <a href="{escaped_url}">{escaped_url}</a>'
+        )
+
+    if deep_link:
+        escaped_deep_link = escape(str(deep_link))
+        message_lines.append(
+            "<b>Открыть мини-приложение:</b> "
+            f'<a href="{escaped_deep_link}">{escaped_deep_link}</a>'
+        )
+
+    return "\n".join(message_lines)
+
+
+def _format_digest(payloads: list[dict]) -> str:
+    if len(payloads) == 1:
+        return _format_message(payloads[0])
+
+    # Group wishes by owner, keeping the order in which owners first appear.
+    groups: dict[str, list[dict]] = {}
+    for payload in payloads[: settings.notify_digest_max_items]:
+        owner = payload.get("owner") or {}
+        groups.setdefault(owner.get("display_name") or "", []).append(payload)
+
+    message_lines: list[str] = []
+    for display_name, items in groups.items():
+        if message_lines:
+            message_lines.append("")
+        if display_name:
+            message_lines.append(f"Обновления от <b>{escape(display_name)}</b>")
+        else:
+            message_lines.append(DEFAULT_OWNER_LINE)
+        for payload in items:
+            line = (
+                f"• {escape(str(payload.get('title') or DEFAULT_NOTIFICATION_TITLE))}"
+            )
+            formatted_price = _format_price(payload.get("price"))
+            if formatted_price:
+                line += f" — {formatted_price}"
+            message_lines.append(line)
+        deep_link = items[-1].get("deep_link")
+        if deep_link:
+            escaped_deep_link = escape(str(deep_link))
+            message_lines.append(
+                "<b>Открыть мини-приложение:</b> "
+                f'<a href="{escaped_deep_link}">{escaped_deep_link}</a>'
+            )
+
+    hidden = len(payloads) - settings.notify_digest_max_items
+    if hidden > 0:
+        message_lines.append(f"…и ещё {hidden}")
+    return "\n".join(message_lines)
+
+
 @celery_app.task(name="notifications.send")
 def send_notification(notification_id: int) -> None:
     session: Session = SessionLocal()
@@ -86,67 +223,285 @@ def send_notification(notification_id: int) -> None:
         if not user.tg_user_id:
             return
 
-        payload = notification.payload or {}
-        title = payload.get("title") or DEFAULT_NOTIFICATION_TITLE
-        owner = payload.get("owner", {})
-        display_name = owner.get("display_name") or ""
-        deep_link = payload.get("deep_link")
-        priority = payload.get("priority")
-        status = payload.get("status")
-        price = payload.get("price")
-        url = payload.get("url")
-        tags = payload.get("tags", [])
-        description = payload.get("description") or ""
-        wishlist = payload.get("wishlist") or {}
-        wishlist_title = wishlist.get("title")
-
-        message_lines: list[str] = []
-        if display_name:
-            message_lines.append(f"Обновления от <b>{escape(display_name)}</b>")
-        else:
-            message_lines.append(DEFAULT_OWNER_LINE)
+        text = _format_message(notification.payload or {})
+        telegram_bot.send_message(chat_id=int(user.tg_user_id), text=text)
+        notify.mark_sent(session, notification)
+        session.commit()
+    finally:
+        session.close()
+
+
+@celery_app.task(name="notifications.send_batch")
+def send_notification_batch(notification_ids: list[int]) -> int:
+    """Deliver a chunk of notifications with one session and one bulk update."""
+    session: Session = SessionLocal()
+    delivered: list[int] = []
+    try:
+        notifications = session.scalars(
+            select(Notification)
+            .options(selectinload(Notification.user))
+            .where(
+                Notification.id.in_(notification_ids), Notification.is_sent.is_(False)
+            )
+        ).all()
+        for notification in notifications:
+            user = notification.user
+            if not user or not user.tg_user_id:
+                continue
+            try:
+                telegram_bot.send_message(
+                    chat_id=int(user.tg_user_id),
+                    text=_format_message(notification.payload or {}),
+                )
+            except Exception as exc:  # keep delivering the rest of the chunk
+                logger.warning(
+                    "Notification {} delivery failed: {}", notification.id, exc
+                )
+                continue
+            delivered.append(notification.id)
+        notify.mark_sent_many(session, delivered)
+        session.commit()
+    finally:
+        session.close()
+    return len(delivered)
+
 
-        if wishlist_title:
-            message_lines.append(f"<b>Список:</b> {escape(str(wishlist_title))}")
+@celery_app.task(name="notifications.flush_digests")
+def flush_digests() -> int:
+    """Send one digest message per recipient whose batch window has closed."""
+    session: Session = SessionLocal()
+    sent = 0
+    try:
+        for user_id in notify.due_digest_recipients():
+            latest, collected_ids = notify.claim_digest(user_id)
+            if not collected_ids:
+                continue
+            user = session.get(User, user_id)
+            notifications = session.scalars(
+                select(Notification)
+                .where(Notification.id.in_(latest.values()))
+                .order_by(Notification.id)
+            ).all()
+            if user and user.tg_user_id and notifications:
+                text = _format_digest([item.payload or {} for item in notifications])
+                try:
+                    telegram_bot.send_message(chat_id=int(user.tg_user_id), text=text)
+                except (telegram_bot.TelegramRateLimitedError, httpx.HTTPError) as exc:
+                    # Transient: the batch goes back, to retry after another window.
+                    logger.warning(
+                        "Digest delivery failed for user {}, requeued: {}", user_id, exc
+                    )
+                    notify.requeue_digest(user_id, latest, collected_ids)
+                    continue
+                except Exception as exc:  # keep flushing the remaining recipients
+                    logger.warning(
+                        "Digest delivery failed for user {}: {}", user_id, exc
+                    )
+                    continue
+                sent += 1
+            notify.mark_sent_many(session, collected_ids)
+            session.commit()
+    finally:
+        session.close()
+    return sent
 
-        safe_title = escape(str(title))
-        message_lines.append(f"<b>Желание:</b> {safe_title}")
 
-        if description:
-            safe_description = escape(str(description)).replace("\n", "<br/>")
-            message_lines.append(f"<b>Описание:</b> {safe_description}")
+def _dispatch_notifications(
+    notifications: Sequence[notify.QueuedNotification], wish_id: int
+) -> None:
+    if not notifications:
+        return
+    if settings.notify_batch_seconds > 0:
+        notify.queue_for_digest(notifications, wish_id)
+        return
+    ids = [notification.id for notification in notifications]
+    for start in range(0, len(ids), settings.notify_chunk_size):
+        send_notification_batch.delay(ids[start : start + settings.notify_chunk_size])
 
-        localized_priority = _localize(PRIORITY_LABELS, priority)
-        if localized_priority:
-            message_lines.append(f"<b>Приоритет:</b> {escape(localized_priority)}")
 
-        localized_status = _localize(STATUS_LABELS, status)
-        if localized_status:
-            message_lines.append(f"<b>Статус:</b> {escape(localized_status)}")
+EVENT_NOTIFICATION_TYPES: dict[EventAction, NotificationType] = {
+    EventAction.CREATE: NotificationType.WISH_CREATED,
+    EventAction.UPDATE: NotificationType.WISH_UPDATED,
+}
 
-        formatted_price = _format_price(price)
-        if formatted_price:
-            message_lines.append(f"<b>Цена:</b> {formatted_price}")
 
-        if isinstance(tags, (list, tuple, set)):
-            sanitized_tags = _sanitize_tags(tags)
-        else:
-            sanitized_tags = []
-        if sanitized_tags:
-            message_lines.append("<b>Теги:</b> " + ", ".join(sanitized_tags))
+@celery_app.task(
+    name="events.expand_wish",
+    bind=True,
+    max_retries=10,
+    acks_late=True,
+    reject_on_worker_lost=True,
+)
+def expand_wish_event(self: Any, event_id: int) -> int:
+    """Expand a wish outbox event into follower notifications and timeline entries.
 
-        if url:
-            escaped_url = escape(str(url))
-            message_lines.append(f'<b>Ссылка:</b> <a href="{escaped_url}">{escaped_url}</a>')
+    The event is marked processed in the transaction that inserts the
+    notifications, and they are handed to the senders only once it commits. A
+    failure rolls both back, and the retry (or the redelivery after a lost
+    worker) expands the event again; once retries run out, the event goes back
+    to the relay rather than staying dispatched but never processed.
+    """
+    session: Session = SessionLocal()
+    try:
+        try:
+            expanded = _expand_wish_event(session, event_id)
+        except Exception as exc:
+            session.rollback()
+            if self.request.retries >= self.max_retries:
+                outbox.release(session, event_id)
+                session.commit()
+                logger.error("Giving event {} back to the relay: {}", event_id, exc)
+                raise
+            raise self.retry(exc=exc, countdown=settings.outbox_retry_seconds) from exc
+    finally:
+        session.close()
+    if expanded is None:
+        return 0
+    notifications, wish_id = expanded
+    _dispatch_notifications(notifications, wish_id)
+    return len(notifications)
 
-        if deep_link:
-            escaped_deep_link = escape(str(deep_link))
-            message_lines.append(
-                f'<b>Открыть мини-приложение:</b> <a href="{escaped_deep_link}">{escaped_deep_link}</a>'
-            )
 
-        telegram_bot.send_message(chat_id=int(user.tg_user_id), text="\n".join(message_lines))
-        notify.mark_sent(session, notification)
+def _expand_wish_event(
+    session: Session, event_id: int
+) -> tuple[Sequence[notify.QueuedNotification], int] | None:
+    """Apply an event and commit; the notifications to dispatch, if any."""
+    # The relay publishes at least once; only the first delivery is applied.
+    if not outbox.mark_processed(session, event_id):
+        session.rollback()
+        return None
+    event = session.get(Event, event_id)
+    if not event or event.entity != EventEntity.WISH:
+        session.commit()
+        return None
+    notification_type = EVENT_NOTIFICATION_TYPES.get(event.action)
+    wish = session.get(
+        Wish,
+        event.entity_id,
+        options=(selectinload(Wish.wishlist).selectinload(Wishlist.owner),),
+    )
+    if (
+        notification_type is None
+        or not wish
+        or wish.wishlist.visibility not in timeline.FEED_VISIBILITIES
+    ):
         session.commit()
+        return None
+
+    notifications = notify.create_notifications(session, wish, notification_type)
+    timeline.fan_out(session, wish)
+    session.commit()
+    return notifications, wish.id
+
+
+def needs_enrichment(wish: Wish) -> bool:
+    return bool(wish.url) and not (wish.title and wish.description and wish.image_url)
+
+
+@celery_app.task(name="wishes.enrich_preview", bind=True, max_retries=10)
+def enrich_wish_preview(self: Any, wish_id: int) -> bool:
+    """Fill a wish's empty title, description and image from its URL's preview."""
+    session: Session = SessionLocal()
+    try:
+        wish = session.get(Wish, wish_id)
+        if not wish or not wish.url or not needs_enrichment(wish):
+            return False
+        url, wishlist_id = wish.url, wish.wishlist_id
+        # No transaction stays open while the upstream page is fetched.
+        session.rollback()
+
+        try:
+            preview = link_preview.fetch_preview(url)
+        except link_preview.DomainBusyError as exc:
+            raise self.retry(
+                exc=exc, countdown=settings.link_preview_busy_retry_seconds
+            ) from exc
+        except link_preview.LinkPreviewError:
+            return False
+
+        image_url = str(preview.image) if preview.image else None
+        fields = {
+            "title": preview.title[:255] if preview.title else None,
+            "description": preview.description,
+            "image_url": image_url if image_url and len(image_url) <= 512 else None,
+        }
+        # Only empty columns are filled, even if the owner edited the wish meanwhile.
+        values = {
+            name: func.coalesce(func.nullif(getattr(Wish, name), ""), value)
+            for name, value in fields.items()
+            if value
+        }
+        if not values:
+            return False
+        result = cast(
+            CursorResult[Any],
+            session.execute(
+                update(Wish).where(Wish.id == wish_id, Wish.url == url)
+                # Enrichment is not an owner edit; keep updated_at and the feed order.
+                .values(updated_at=Wish.updated_at, **values)
+            ),
+        )
+        changed = (
+            wishlist_versions.bump(session, [wishlist_id])
+            if result.rowcount == 1
+            else {}
+        )
+        session.commit()
+        wishlist_cache.invalidate(changed)
+        return result.rowcount == 1
+    finally:
+        session.close()
+
+
+@celery_app.task(name="media.process_image")
+def process_media_asset(asset_id: int) -> bool:
+    """Record the resized WebP variants of an uploaded image.
+
+    The uploaded object itself is never rewritten: it is content-addressed and
+    served as immutable, and metadata was stripped before it was hashed.
+    """
+    session: Session = SessionLocal()
+    try:
+        asset = session.get(MediaAsset, asset_id)
+        if not asset or asset.processed_at:
+            return False
+        storage = get_storage()
+        key = storage.key_for_url(asset.url)
+        if key is None or not storage.exists(key):
+            return False
+        directory, _, filename = key.rpartition("/")
+        try:
+            processed = images.process_image(storage.read(key), filename)
+        except images.ImageProcessingError as exc:
+            logger.warning("Media asset {} processing failed: {}", asset_id, exc)
+            return False
+        base_url = asset.url.rsplit("/", 1)[0]
+        variants: dict[str, str] = {}
+        for size, (variant_name, data) in processed.variants.items():
+            storage.save_bytes(
+                f"{directory}/{variant_name}" if directory else variant_name, data
+            )
+            variants[str(size)] = f"{base_url}/{variant_name}"
+        asset.width = processed.width
+        asset.height = processed.height
+        asset.variants = variants
+        asset.processed_at = datetime.now(UTC)
+        changed = wishlist_versions.bump_for_media_url(session, asset.url)
+        session.commit()
+        wishlist_cache.invalidate(changed)
+        return True
+    finally:
+        session.close()
+
+
+@celery_app.task(name="media.collect_garbage")
+def collect_media_garbage() -> int:
+    """Remove uploaded media no wish, avatar or cover references anymore."""
+    session: Session = SessionLocal()
+    try:
+        removed = media.collect_garbage(session)
     finally:
         session.close()
+    if removed:
+        logger.info("Media garbage collection removed {} files", removed)
+    return removed
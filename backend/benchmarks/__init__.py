@@ -0,0 +1,4 @@
+"""Standalone performance benchmarks.
+
+Run from ``backend/`` with ``python -m benchmarks.<name>``.
+"""
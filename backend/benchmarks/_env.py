@@ -0,0 +1,9 @@
+from __future__ import annotations
+
+import os
+
+# Benchmarks import application modules, which require these settings.
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("CSRF_SECRET", "bench-csrf")
+os.environ.setdefault("BOT_TOKEN", "123456:BENCH")
+os.environ.setdefault("POSTGRES_HOST", "localhost")
@@ -0,0 +1,129 @@
+"""Link preview cost per page: full download + parse vs streaming <head> parse.
+
+    python -m benchmarks.link_preview_parse --corpus ~/saved-retailer-pages --runs 20
+
+``--corpus`` is a directory of ``*.html`` pages saved from retailer sites
+(browser "Save page as, HTML only"). Without one, synthetic pages of a few
+sizes are generated. Each page is served in 16 KiB chunks through
+``httpx.MockTransport`` so only parsing and decoding are measured; the
+report shows time per page, peak Python allocations (tracemalloc) and how
+many body bytes were actually pulled from the stream.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import httpx
+
+from app.services import link_preview
+from benchmarks import _env  # noqa: F401
+
+CHUNK_SIZE = 16 * 1024
+
+
+def synthetic_corpus() -> dict[str, bytes]:
+    head = (
+        '<html><head><meta charset="{charset}"><title>Кофемашина</title>'
+        '<meta property="og:title" content="Кофемашина Delonghi">'
+        '<meta property="og:description" content="Автоматическая кофемашина">'
+        '<meta property="og:image" content="/img/coffee.jpg">'
+        "{scripts}</head><body>"
+    )
+    scripts = "<script>window.__STATE__ = {};</script>" * 200
+    review = "<div class=review><p>Отличная кофемашина, рекомендую всем.</p></div>"
+    pages = {}
+    for name, charset, body_size in (
+        ("small-utf8", "utf-8", 50 * 1024),
+        ("medium-utf8", "utf-8", 1024 * 1024),
+        ("large-cp1251", "windows-1251", 5 * 1024 * 1024),
+    ):
+        html = head.format(charset=charset, scripts=scripts)
+        html += review * (body_size // len(review.encode())) + "</body></html>"
+        pages[name] = html.encode(charset)
+    return pages
+
+
+def load_corpus(directory: Path) -> dict[str, bytes]:
+    return {path.stem: path.read_bytes() for path in sorted(directory.glob("*.html"))}
+
+
+def _transport(page: bytes, pulled: list[int]) -> httpx.MockTransport:
+    async def body() -> AsyncIterator[bytes]:
+        for offset in range(0, len(page), CHUNK_SIZE):
+            chunk = page[offset : offset + CHUNK_SIZE]
+            pulled[0] += len(chunk)
+            yield chunk
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200, headers={"Content-Type": "text/html"}, content=body()
+        )
+
+    return httpx.MockTransport(handler)
+
+
+async def _full_download(client: httpx.AsyncClient, url: str) -> None:
+    # The pre-streaming fetcher: read and decode the whole body, then parse it.
+    response = await client.get(url)
+    link_preview.extract_preview(response.text, url)
+
+
+async def _streaming(client: httpx.AsyncClient, url: str) -> None:
+    link_preview._client = client
+    entry = await link_preview._fetch(url)
+    assert entry["status"] == "ok"
+
+
+async def measure(strategy, page: bytes, runs: int) -> tuple[float, int, int]:
+    url = "https://shop.example.com/product"
+    pulled = [0]
+    async with httpx.AsyncClient(transport=_transport(page, pulled)) as client:
+        await strategy(client, url)
+        pulled[0] = 0
+        tracemalloc.start()
+        started = time.perf_counter()
+        for _ in range(runs):
+            await strategy(client, url)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed / runs, peak, pulled[0] // runs
+
+
+async def run(corpus: dict[str, bytes], runs: int) -> None:
+    print(
+        f"{'page':<24}{'size':>10}  {'strategy':<10}{'ms/page':>10}"
+        f"{'peak KiB':>12}{'read KiB':>12}"
+    )
+    for name, page in corpus.items():
+        for label, strategy in (("full", _full_download), ("streaming", _streaming)):
+            per_page, peak, pulled = await measure(strategy, page, runs)
+            print(
+                f"{name[:23]:<24}{len(page) // 1024:>8}Ki  {label:<10}"
+                f"{per_page * 1000:>10.2f}{peak // 1024:>12}{pulled // 1024:>12}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--corpus", type=Path, default=None, help="Directory of saved *.html pages"
+    )
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    if not corpus:
+        parser.error(f"no *.html pages in {args.corpus}")
+    asyncio.run(run(corpus, args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Concurrent load against a running API: requests/sec and latency percentiles.
+
+    python -m benchmarks.load_test --base-url http://localhost:8000 --user-id 1 \\
+        --path /api/feed --path /api/wishes --path /api/users/alice/wishlist \\
+        --concurrency 500 --duration 30
+
+Each of ``--concurrency`` workers keeps one request in flight for
+``--duration`` seconds over a shared keep-alive pool, cycling through the
+given paths. ``--user-id`` signs a session cookie with the local
+``SECRET_KEY``, which must match the server's. Run it once against the
+sync routes and once against the async ones on the same Postgres stack;
+the sqlite test setup says nothing about pool behaviour under load.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+from collections import Counter
+
+import httpx
+
+from app.config import settings
+from app.utils.security import create_session_token
+from benchmarks import _env  # noqa: F401
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def _worker(
+    client: httpx.AsyncClient,
+    paths: itertools.cycle,
+    deadline: float,
+    latencies: list[float],
+    errors: list[str],
+) -> None:
+    while time.perf_counter() < deadline:
+        path = next(paths)
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+        except httpx.HTTPError as exc:
+            errors.append(type(exc).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors.append(str(response.status_code))
+
+
+async def run_load(
+    base_url: str,
+    paths: list[str],
+    concurrency: int,
+    duration: float,
+    user_id: int | None,
+) -> None:
+    cookies = {}
+    if user_id is not None:
+        cookies[settings.session_cookie_name] = create_session_token(user_id)
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+    latencies: list[float] = []
+    errors: list[str] = []
+    path_cycle = itertools.cycle(paths)
+
+    async with httpx.AsyncClient(
+        base_url=base_url, cookies=cookies, limits=limits, timeout=httpx.Timeout(30.0)
+    ) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(
+            *(
+                _worker(client, path_cycle, deadline, latencies, errors)
+                for _ in range(concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - started
+
+    print(f"concurrency={concurrency} duration={elapsed:.1f}s paths={','.join(paths)}")
+    print(f"  requests   {len(latencies):>10}")
+    print(f"  errors     {len(errors):>10}  {dict(Counter(errors))}")
+    print(f"  rps        {len(latencies) / elapsed:>10.1f}")
+    if latencies:
+        print(f"  mean       {statistics.fmean(latencies) * 1000:>10.1f} ms")
+        for label, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            print(
+                f"  {label}        {percentile(latencies, fraction) * 1000:>10.1f} ms"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument(
+        "--path",
+        action="append",
+        dest="paths",
+        help="Repeatable; defaults to /api/feed",
+    )
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument(
+        "--user-id", type=int, default=None, help="Authenticate as this user id"
+    )
+    args = parser.parse_args()
+    asyncio.run(
+        run_load(
+            args.base_url,
+            args.paths or ["/api/feed"],
+            args.concurrency,
+            args.duration,
+            args.user_id,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Notification fan-out cost: per-follower ORM objects vs INSERT ... SELECT.
+
+    python -m benchmarks.notify_fanout --followers 1000 10000 100000
+    python -m benchmarks.notify_fanout --database-url postgresql+psycopg://...
+
+Defaults to an in-memory SQLite database; point it at a scratch Postgres
+database for production-like numbers (the schema is created and dropped).
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.pool import StaticPool
+
+from app.models import Base, Notification, Subscription, User, Wish, Wishlist
+from app.models.enums import NotificationType, WishPriority, WishStatus
+from app.services import notify
+from benchmarks import _env  # noqa: F401
+
+
+def _legacy_create_notifications(session: Session, wish: Wish) -> int:
+    """The previous implementation: one ORM object per follower."""
+    owner = wish.wishlist.owner
+    subscriptions = session.scalars(
+        select(Subscription).where(Subscription.target_user_id == owner.id)
+    ).all()
+    payload = notify._wish_payload(wish)
+    for sub in subscriptions:
+        session.add(
+            Notification(
+                user_id=sub.follower_id,
+                type=NotificationType.WISH_CREATED.value,
+                payload=payload,
+                is_sent=False,
+            )
+        )
+    session.flush()
+    return len(subscriptions)
+
+
+def _seed(session: Session, followers: int) -> int:
+    session.execute(delete(Notification))
+    session.execute(delete(Subscription))
+    session.execute(delete(Wish))
+    session.execute(delete(Wishlist))
+    session.execute(delete(User))
+    owner = User(tg_user_id="owner", tg_username="owner", display_name="Owner")
+    session.add(owner)
+    session.flush()
+    wishlist = Wishlist(owner_id=owner.id, title="Bench")
+    session.add(wishlist)
+    session.flush()
+    wish = Wish(
+        wishlist_id=wishlist.id,
+        title="Bench wish",
+        priority=WishPriority.MEDIUM,
+        status=WishStatus.PLANNED,
+        tags=["bench"],
+    )
+    session.add(wish)
+    session.execute(
+        insert(User),
+        [
+            {"tg_user_id": f"f{i}", "display_name": f"Follower {i}", "locale": "en"}
+            for i in range(followers)
+        ],
+    )
+    session.execute(
+        insert(Subscription).from_select(
+            ["follower_id", "target_user_id"],
+            select(User.id, owner.id).where(User.id != owner.id),
+        )
+    )
+    session.commit()
+    return wish.id
+
+
+def _time(session: Session, wish_id: int, legacy: bool) -> float:
+    session.execute(delete(Notification))
+    session.commit()
+    wish = session.scalar(
+        select(Wish)
+        .where(Wish.id == wish_id)
+        .options(selectinload(Wish.wishlist).selectinload(Wishlist.owner))
+    )
+    started = time.perf_counter()
+    if legacy:
+        _legacy_create_notifications(session, wish)
+    else:
+        notify.create_notifications(session, wish, NotificationType.WISH_CREATED)
+    session.commit()
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--followers", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--database-url", default="sqlite+pysqlite:///:memory:")
+    args = parser.parse_args()
+
+    engine_kwargs = {}
+    if args.database_url.startswith("sqlite"):
+        engine_kwargs = {
+            "connect_args": {"check_same_thread": False},
+            "poolclass": StaticPool,
+        }
+    engine = create_engine(args.database_url, **engine_kwargs)
+    Base.metadata.create_all(engine)
+    try:
+        print(
+            f"{'followers':>10} {'orm objects':>12} "
+            f"{'insert-select':>14} {'speedup':>8}"
+        )
+        for followers in args.followers:
+            with Session(engine, expire_on_commit=False) as session:
+                wish_id = _seed(session, followers)
+                legacy = _time(session, wish_id, legacy=True)
+                bulk = _time(session, wish_id, legacy=False)
+            print(
+                f"{followers:>10} {legacy:>11.3f}s "
+                f"{bulk:>13.3f}s {legacy / bulk:>7.1f}x"
+            )
+    finally:
+        Base.metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Messages/sec against a local mock Bot API: per-message clients vs the pooled sender.
+
+    python -m benchmarks.telegram_send --messages 500
+
+The mock answers every ``sendMessage`` over HTTP/1.1 keep-alive after an
+optional artificial latency. Rate limits are lifted for the throughput runs so
+the numbers reflect connection handling; ``--limited`` adds a run with the
+production limits to show the sender staying under the global cap.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from app.services.telegram_bot import TelegramSender, TokenBucket
+from benchmarks import _env  # noqa: F401
+
+
+class _MockBotApi(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server naming
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if self.latency:
+            time.sleep(self.latency)
+        body = json.dumps({"ok": True, "result": {}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002
+        return
+
+
+def start_mock_server(latency: float) -> tuple[ThreadingHTTPServer, str]:
+    _MockBotApi.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MockBotApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/bot123456:BENCH"
+
+
+def bench_per_message_client(api_base: str, messages: int) -> float:
+    started = time.perf_counter()
+    for chat_id in range(messages):
+        with httpx.Client(timeout=10.0) as client:
+            client.post(
+                f"{api_base}/sendMessage", data={"chat_id": chat_id, "text": "bench"}
+            )
+    return messages / (time.perf_counter() - started)
+
+
+def bench_sender(
+    api_base: str, messages: int, global_rate: float, per_chat_interval: float
+) -> float:
+    # One process, so a local bucket stands in for the Redis-shared one.
+    sender = TelegramSender(
+        api_base=api_base,
+        per_chat_interval=per_chat_interval,
+        global_bucket=TokenBucket(global_rate),
+    )
+    started = time.perf_counter()
+    sender.send_many(range(messages), "bench")
+    elapsed = time.perf_counter() - started
+    sender.close()
+    return messages / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument(
+        "--latency", type=float, default=0.005, help="mock server latency, seconds"
+    )
+    parser.add_argument(
+        "--limited", action="store_true", help="also run with production rate limits"
+    )
+    args = parser.parse_args()
+
+    server, api_base = start_mock_server(args.latency)
+    try:
+        per_message = bench_per_message_client(api_base, args.messages)
+        print(f"per-message httpx.Client : {per_message:8.1f} msg/s")
+        pooled = bench_sender(api_base, args.messages, 1e9, 0.0)
+        print(f"pooled TelegramSender    : {pooled:8.1f} msg/s")
+        if args.limited:
+            limited = bench_sender(api_base, args.messages, 25.0, 1.0)
+            print(f"pooled, production limits: {limited:8.1f} msg/s")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
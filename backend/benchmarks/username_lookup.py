@@ -0,0 +1,142 @@
+"""Profile-link resolution: lower(username) lookups with and without expression indexes.
+
+    python -m benchmarks.username_lookup --users 1000000
+    python -m benchmarks.username_lookup --database-url postgresql+psycopg://...
+
+Times the OR-of-lower() query on a table without the 0006 indexes (a full
+scan), with them, and ``services.usernames.resolve`` with a warm cache.
+Defaults to an in-memory SQLite database; point it at a scratch Postgres
+database for production-like numbers (the schema is created and dropped).
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+import fakeredis
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.models import Base, User
+from app.services import user_cache, usernames
+from app.utils import redis as redis_utils
+from benchmarks import _env  # noqa: F401
+
+INDEXES = ("ix_users_tg_username_lower", "ix_users_custom_username_lower")
+BATCH = 50_000
+
+
+def _seed(engine, users: int) -> None:
+    with engine.begin() as connection:
+        for start in range(0, users, BATCH):
+            rows = []
+            for i in range(start, min(start + BATCH, users)):
+                # Half Telegram handles, half custom ones, stored with mixed case.
+                handle = f"User_{i}"
+                rows.append(
+                    {
+                        "tg_user_id": str(i),
+                        "tg_username": handle if i % 2 else None,
+                        "custom_username": None if i % 2 else handle.lower(),
+                        "display_name": handle,
+                        "locale": "en",
+                    }
+                )
+            connection.execute(insert(User), rows)
+
+
+def _set_indexes(engine, present: bool) -> None:
+    with engine.begin() as connection:
+        for index in User.__table__.indexes:
+            if index.name in INDEXES:
+                connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+                if present:
+                    index.create(connection)
+        if engine.dialect.name == "postgresql":
+            connection.execute(text("ANALYZE users"))
+
+
+def _plan(engine, name: str) -> str:
+    query = usernames._lookup(name).compile(
+        engine, compile_kwargs={"literal_binds": True}
+    )
+    prefix = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+    with engine.connect() as connection:
+        rows = connection.execute(text(f"{prefix} {query}")).all()
+    return " | ".join(str(row[-1]) for row in rows)
+
+
+def _time_query(engine, names: list[str]) -> float:
+    with Session(engine) as session:
+        started = time.perf_counter()
+        for name in names:
+            assert session.scalar(usernames._lookup(name)) is not None
+        return (time.perf_counter() - started) / len(names)
+
+
+def _time_resolver(engine, names: list[str]) -> float:
+    with Session(engine) as session:
+        for name in names:
+            usernames.resolve(session, name)
+        started = time.perf_counter()
+        for name in names:
+            assert usernames.resolve(session, name) is not None
+        return (time.perf_counter() - started) / len(names)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument(
+        "--scan-lookups", type=int, default=20, help="Lookups timed without indexes"
+    )
+    parser.add_argument("--database-url", default="sqlite+pysqlite:///:memory:")
+    args = parser.parse_args()
+
+    engine_kwargs = {}
+    if args.database_url.startswith("sqlite"):
+        engine_kwargs = {
+            "connect_args": {"check_same_thread": False},
+            "poolclass": StaticPool,
+        }
+    engine = create_engine(args.database_url, **engine_kwargs)
+    # Caches stay in process: the local tier serves the warm lookups anyway.
+    redis_utils._binary_client = fakeredis.FakeRedis()
+    Base.metadata.create_all(engine)
+    try:
+        started = time.perf_counter()
+        _seed(engine, args.users)
+        print(f"seeded {args.users} users in {time.perf_counter() - started:.1f}s")
+        names = [f"user_{random.randrange(args.users)}" for _ in range(args.lookups)]
+
+        _set_indexes(engine, present=False)
+        print(f"plan without indexes: {_plan(engine, names[0])}")
+        scan = _time_query(engine, names[: args.scan_lookups])
+
+        started = time.perf_counter()
+        _set_indexes(engine, present=True)
+        print(f"built expression indexes in {time.perf_counter() - started:.1f}s")
+        print(f"plan with indexes:    {_plan(engine, names[0])}")
+        indexed = _time_query(engine, names)
+
+        user_cache.reset()
+        usernames.reset()
+        cached = _time_resolver(engine, names)
+
+        print(f"{'lookup':>18} {'per call':>12} {'speedup':>9}")
+        for label, seconds in (
+            ("full scan", scan),
+            ("expression index", indexed),
+            ("cached resolver", cached),
+        ):
+            print(f"{label:>18} {seconds * 1000:>10.3f}ms {scan / seconds:>8.0f}x")
+    finally:
+        Base.metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
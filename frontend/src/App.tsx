@@ -2,6 +2,7 @@ import { useCallback, useEffect, useMemo, useState, type ReactNode } from "react
 import { useTranslation } from "react-i18next";
 
 import type { FeedItem, Subscription, WishStatus, Priority, Wish, Wishlist, PublicUser, LinkPreview, User } from "./api/types";
+import { uploadImage } from "./api/media";
 import { BottomSheet } from "./components/BottomSheet";
 import { Layout } from "./components/Layout";
 import { EmptyState } from "./components/EmptyState";
@@ -156,10 +157,7 @@ export const App: React.FC = () => {
     try {
       let imageUrl: string | undefined;
       if (form.imageFile) {
-        const formData = new FormData();
-        formData.append("file", form.imageFile);
-        const uploadResponse = await api.post<{ url: string }>("/media/upload", formData);
-        imageUrl = uploadResponse.data.url;
+        imageUrl = await uploadImage(api, form.imageFile);
       }
 
       const payload = {
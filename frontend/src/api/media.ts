@@ -0,0 +1,54 @@
+import axios, { AxiosInstance } from "axios";
+
+interface PresignResponse {
+  url: string;
+  upload_url: string | null;
+  method: string;
+  headers: Record<string, string>;
+}
+
+const sha256Hex = async (file: Blob): Promise<string> => {
+  const digest = await crypto.subtle.digest("SHA-256", await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, "0")).join("");
+};
+
+const uploadThroughApi = async (api: AxiosInstance, file: File): Promise<string> => {
+  const formData = new FormData();
+  formData.append("file", file);
+  const response = await api.post<{ url: string }>("/media/upload", formData);
+  return response.data.url;
+};
+
+// Uploads straight to object storage when the backend hands out presigned URLs,
+// otherwise (local storage, no WebCrypto) through the API as multipart.
+export const uploadImage = async (api: AxiosInstance, file: File): Promise<string> => {
+  if (typeof crypto === "undefined" || !crypto.subtle) {
+    return uploadThroughApi(api, file);
+  }
+  let presigned: PresignResponse;
+  try {
+    const response = await api.post<PresignResponse>("/media/presign", {
+      sha256: await sha256Hex(file),
+      size: file.size,
+      content_type: file.type,
+    });
+    presigned = response.data;
+  } catch (error) {
+    if (axios.isAxiosError(error) && (error.response?.status === 501 || error.response?.status === 422)) {
+      return uploadThroughApi(api, file);
+    }
+    throw error;
+  }
+  if (presigned.upload_url) {
+    const stored = await fetch(presigned.upload_url, {
+      method: presigned.method,
+      headers: presigned.headers,
+      body: file,
+    });
+    if (!stored.ok) {
+      throw new Error(`Upload failed with status ${stored.status}`);
+    }
+  }
+  const completed = await api.post<{ url: string }>("/media/complete", { url: presigned.url });
+  return completed.data.url;
+};
@@ -30,6 +30,8 @@ export interface Wish {
   url?: string | null;
   price?: string | null;
   image_url?: string | null;
+  image_variants?: Record<string, string>;
+  image_srcset?: string | null;
   tags: string[];
   priority: Priority;
   status: WishStatus;
@@ -51,16 +53,19 @@ export interface WishFilters {
   tags?: string[];
   price_min?: number;
   price_max?: number;
-  sort?: "created_at" | "priority" | "price" | "position";
+  sort?: "relevance" | "created_at" | "priority" | "price" | "position";
   page?: number;
   per_page?: number;
+  cursor?: string;
+  include_total?: boolean;
 }
 
 export interface Paginated<T> {
   items: T[];
-  total: number;
+  total?: number | null;
   page: number;
   per_page: number;
+  next_cursor?: string | null;
 }
 
 export interface Subscription {
@@ -3,6 +3,7 @@ import dayjs from "dayjs";
 import { useTranslation } from "react-i18next";
 
 import type { Wish } from "../api/types";
+import { bestImageUrl } from "../lib/images";
 import { PriorityBadge } from "./PriorityBadge";
 import { IconEdit } from "./icons";
 
@@ -32,7 +33,7 @@ export const WishCard: React.FC<WishCardProps> = ({ wish, onEdit, onDelete, onTo
           height: 80,
           borderRadius: "18px",
           background: wish.image_url
-            ? `url(${wish.image_url}) center/cover`
+            ? `url(${bestImageUrl(wish, 80)}) center/cover`
             : "linear-gradient(135deg, rgba(42,99,246,0.12), rgba(180,70,226,0.12))",
           flexShrink: 0,
         }}
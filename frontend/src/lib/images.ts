@@ -0,0 +1,16 @@
+import type { Wish } from "../api/types";
+
+// Smallest processed variant covering `cssPixels` on this screen, else the original.
+export const bestImageUrl = (wish: Wish, cssPixels: number): string | null | undefined => {
+  const variants = wish.image_variants;
+  if (!variants || Object.keys(variants).length === 0) {
+    return wish.image_url;
+  }
+  const ratio = typeof window === "undefined" ? 1 : window.devicePixelRatio || 1;
+  const target = cssPixels * ratio;
+  const sized = Object.entries(variants)
+    .map(([width, url]) => [Number(width), url] as const)
+    .sort((a, b) => a[0] - b[0]);
+  const match = sized.find(([width]) => width >= target) ?? sized[sized.length - 1];
+  return match[1];
+};
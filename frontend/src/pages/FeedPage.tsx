@@ -8,6 +8,7 @@ import "dayjs/locale/ru";
 import type { FeedItem } from "../api/types";
 import { EmptyState } from "../components/EmptyState";
 import { PriorityBadge } from "../components/PriorityBadge";
+import { bestImageUrl } from "../lib/images";
 
 dayjs.extend(relativeTime);
 dayjs.extend(localizedFormat);
@@ -105,7 +106,9 @@ export const FeedPage: React.FC<FeedPageProps> = ({ feed, t }) => {
             <div className="feed-card__body">
               {item.wish.image_url && (
                 <img
-                  src={item.wish.image_url}
+                  src={bestImageUrl(item.wish, 96) ?? undefined}
+                  srcSet={item.wish.image_srcset ?? undefined}
+                  sizes="96px"
                   alt={translate("feed.image_alt", { title: item.wish.title })}
                   className="feed-card__image"
                   loading="lazy"